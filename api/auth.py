@@ -1,13 +1,19 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from fastapi import HTTPException,status
 from datetime import datetime, timedelta, timezone
 from jose import JWTError, jwt
 from passlib.context import CryptContext
+from .local_cache import TTLCache, MISSING
+from .config import BCRYPT_ROUNDS, PASSWORD_HASH_WORKERS, PASSWORD_HASH_MAX_PENDING, USER_CACHE_SIZE, USER_CACHE_TTL
 
 SECRET_KEY = "video_manage"
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=BCRYPT_ROUNDS)
 
 def verify_password(plain_password, hashed_password):
     return pwd_context.verify(plain_password, hashed_password)
@@ -15,6 +21,36 @@ def verify_password(plain_password, hashed_password):
 def get_password_hash(password):
     return pwd_context.hash(password)
 
+# bcrypt is CPU bound (about 250 ms at cost 12) but releases the GIL, so a few dedicated
+# threads keep it off the event loop without competing with the shared threadpool
+# that file I/O uses. Logins beyond the queue limit are refused rather than piling up.
+password_executor = ThreadPoolExecutor(max_workers=PASSWORD_HASH_WORKERS, thread_name_prefix="password-hash")
+pending_jobs = 0
+pending_lock = threading.Lock()
+
+async def run_password_job(func, *args):
+    global pending_jobs
+    with pending_lock:
+        if pending_jobs >= PASSWORD_HASH_MAX_PENDING:
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Too many concurrent logins, retry shortly",
+                headers={"Retry-After": "1"},
+            )
+        pending_jobs += 1
+    try:
+        return await asyncio.wrap_future(password_executor.submit(func, *args))
+    finally:
+        with pending_lock:
+            pending_jobs -= 1
+
+async def hash_password(password: str) -> str:
+    return await run_password_job(get_password_hash, password)
+
+# Returns (valid, new_hash); new_hash is set when the stored hash uses an outdated cost
+async def verify_and_rehash(plain_password: str, hashed_password: str):
+    return await run_password_job(pwd_context.verify_and_update, plain_password, hashed_password)
+
 def create_access_token(data: dict, expires_delta: timedelta = None):
     to_encode = data.copy()
     if expires_delta:
@@ -27,13 +63,28 @@ def create_access_token(data: dict, expires_delta: timedelta = None):
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
+# Payloads of tokens whose signature was already checked. A token never changes,
+# so only its expiry has to be re-checked on a hit.
+token_cache = TTLCache(maxsize=USER_CACHE_SIZE, ttl=USER_CACHE_TTL)
+
+def invalid_token():
+    return HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Invalid token",
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+
 def decode_token(token: str):
+    payload = token_cache.get(token)
+    if payload is not MISSING:
+        if payload.get("exp", 0) <= time.time():
+            token_cache.delete(token)
+            raise invalid_token()
+        return payload
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        return payload
-    except JWTError as e:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Invalid token",
-            headers={"WWW-Authenticate": "Bearer"},
-        )
\ No newline at end of file
+    except JWTError:
+        raise invalid_token()
+    if "exp" in payload:
+        token_cache.set(token, payload)
+    return payload
\ No newline at end of file
@@ -0,0 +1,70 @@
+import os
+from sqlalchemy import update, delete
+from sqlalchemy.orm import Session
+from .models import Blob
+from .storage import storage, storage_for
+
+
+# Content-addressed key of a file, sharded by the first two byte pairs of its hash
+# (ab/cd/abcd...) so no directory grows past a few thousand entries
+def blob_key(content_hash: str) -> str:
+    return f"{content_hash[:2]}/{content_hash[2:4]}/{content_hash}"
+
+def blob_path(content_hash: str) -> str:
+    return storage.location(blob_key(content_hash))
+
+
+# Upload a finished temp file to remote storage before its reference is taken, so the
+# database transaction in add_blob does not wait on the network. Run it off the event loop.
+# Returns whether the blob is stored, to pass to add_blob as `staged`.
+# Local storage needs nothing here: add_blob moves the file with a rename.
+def stage_blob(temp_file: str, content_hash: str) -> bool:
+    key = blob_key(content_hash)
+    if not storage.remote:
+        return False
+    if not storage.exists(key):
+        storage.put(temp_file, key)
+    return True
+
+
+# Take one reference to the blob with this hash, given a just-written temp file with its content.
+# A duplicate drops the temp file and reuses the stored one; returns the blob location.
+# The reference-count write comes first so the database write lock orders concurrent
+# add/release calls on the same hash before any file is stored or deleted.
+# The caller commits, normally together with the video row pointing at the blob.
+# It makes no network calls: remote blobs must be staged first (see stage_blob).
+def add_blob(db: Session, temp_file: str, content_hash: str, size: int, staged: bool = False) -> str:
+    key = blob_key(content_hash)
+    referenced = db.execute(
+        update(Blob).where(Blob.content_hash == content_hash).values(ref_count=Blob.ref_count + 1)
+    ).rowcount
+    # A referenced or staged blob is stored; otherwise the file is renamed into local storage
+    if not referenced and not staged:
+        storage.put(temp_file, key)
+    if os.path.exists(temp_file):
+        os.remove(temp_file)
+
+    location = storage.location(key)
+    if not referenced:
+        db.add(Blob(content_hash=content_hash, path=location, size=size, ref_count=1))
+        db.flush()
+    return location
+
+# Drop one reference to a blob. Returns whether a blob is stored under this hash (False for
+# files from before content addressing) and, with the last reference, the location of its file.
+# The caller deletes that file with delete_blob_file only after the transaction commits, so a
+# rollback never leaves a row pointing at a missing file and no network call holds the write lock.
+def release_blob(db: Session, content_hash: str) -> tuple[bool, str | None]:
+    referenced = db.execute(
+        update(Blob).where(Blob.content_hash == content_hash).values(ref_count=Blob.ref_count - 1)
+    ).rowcount
+    if not referenced:
+        return False, None
+    orphan = db.execute(
+        delete(Blob).where(Blob.content_hash == content_hash, Blob.ref_count <= 0).returning(Blob.path)
+    ).scalar()
+    return True, orphan
+
+def delete_blob_file(location: str | None):
+    if location:
+        storage_for(location).delete(location)
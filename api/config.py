@@ -0,0 +1,236 @@
+import os
+
+# Database connection string (overridable for tests and benchmarks)
+DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./videos.db")
+
+# Async driver URL used by request handlers; defaults to aiosqlite on the same database
+ASYNC_DATABASE_URL = os.getenv(
+    "ASYNC_DATABASE_URL", DATABASE_URL.replace("sqlite://", "sqlite+aiosqlite://", 1)
+)
+
+# Connection pool for the async engine
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", 10))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", 20))
+DB_POOL_TIMEOUT = int(os.getenv("DB_POOL_TIMEOUT", 30))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", 3600))
+
+# SQLite pragmas applied to every new connection (empty value leaves the SQLite default)
+SQLITE_JOURNAL_MODE = os.getenv("SQLITE_JOURNAL_MODE", "WAL")
+SQLITE_SYNCHRONOUS = os.getenv("SQLITE_SYNCHRONOUS", "NORMAL")
+SQLITE_MMAP_SIZE = os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024))
+SQLITE_CACHE_SIZE = os.getenv("SQLITE_CACHE_SIZE", "-65536")  # negative: KiB, so 64 MiB
+SQLITE_BUSY_TIMEOUT = os.getenv("SQLITE_BUSY_TIMEOUT", "5000")  # milliseconds
+
+# Funnel small writes (block/unblock) through one writer thread that commits them in batches
+SQLITE_WRITE_BATCHING = os.getenv("SQLITE_WRITE_BATCHING", "0") == "1"
+SQLITE_WRITE_BATCH_SIZE = int(os.getenv("SQLITE_WRITE_BATCH_SIZE", 256))
+SQLITE_WRITE_BATCH_WAIT = float(os.getenv("SQLITE_WRITE_BATCH_WAIT", 0.002))  # seconds
+
+# Directory where uploaded videos are stored
+UPLOAD_DIR = os.getenv("UPLOAD_DIR", "uploads")
+
+# Size of each chunk read from the request and written to disk (bytes)
+UPLOAD_CHUNK_SIZE = int(os.getenv("UPLOAD_CHUNK_SIZE", 1024 * 1024))
+
+# Maximum accepted upload size in bytes (0 disables the limit)
+UPLOAD_MAX_SIZE = int(os.getenv("UPLOAD_MAX_SIZE", 10 * 1024 * 1024 * 1024))
+
+# Largest accepted part of a resumable upload session (bytes)
+UPLOAD_PART_MAX_SIZE = int(os.getenv("UPLOAD_PART_MAX_SIZE", 512 * 1024 * 1024))
+
+# Highest part number accepted in a resumable upload session
+UPLOAD_MAX_PARTS = int(os.getenv("UPLOAD_MAX_PARTS", 10000))
+
+# Resumable upload sessions with no part written for this many seconds are removed (0 keeps them)
+UPLOAD_SESSION_TTL = int(os.getenv("UPLOAD_SESSION_TTL", 24 * 60 * 60))
+
+# Transcode uploads to H.264/AAC .mp4 in background workers
+TRANSCODE_ENABLED = os.getenv("TRANSCODE_ENABLED", "1") == "1"
+
+# Number of ffmpeg processes allowed to run at the same time
+TRANSCODE_CONCURRENCY = int(os.getenv("TRANSCODE_CONCURRENCY", max(1, (os.cpu_count() or 2) // 2)))
+
+# ffmpeg executable and encoder settings used by the transcode workers
+FFMPEG_BINARY = os.getenv("FFMPEG_BINARY", "ffmpeg")
+TRANSCODE_VIDEO_CODEC = os.getenv("TRANSCODE_VIDEO_CODEC", "libx264")
+TRANSCODE_AUDIO_CODEC = os.getenv("TRANSCODE_AUDIO_CODEC", "aac")
+TRANSCODE_PRESET = os.getenv("TRANSCODE_PRESET", "veryfast")
+
+# Seconds before a single transcode job is killed
+TRANSCODE_TIMEOUT = int(os.getenv("TRANSCODE_TIMEOUT", 3600))
+
+# Resubmit videos left queued or processing by the previous run when the app starts.
+# api.server does it in the first worker it forks only, so each job is queued once.
+TRANSCODE_REQUEUE_ON_START = os.getenv("TRANSCODE_REQUEUE_ON_START", "1") == "1"
+
+# How download bodies are produced: "auto" uses the server's zero-copy ASGI
+# extensions (pathsend / zerocopysend) when offered and reads the file on a worker
+# thread otherwise; "sendfile", "mmap" and "read" force a single strategy
+DOWNLOAD_MODE = os.getenv("DOWNLOAD_MODE", "auto")
+
+# Bytes sent per ASGI body message when the server cannot send the file itself
+DOWNLOAD_CHUNK_SIZE = int(os.getenv("DOWNLOAD_CHUNK_SIZE", 256 * 1024))
+
+# posix_fadvise hint for downloaded files: sequential, willneed, normal or none
+DOWNLOAD_FADVISE = os.getenv("DOWNLOAD_FADVISE", "sequential")
+
+# Bytes asked to be read ahead of the current position while streaming
+DOWNLOAD_READAHEAD = int(os.getenv("DOWNLOAD_READAHEAD", 8 * 1024 * 1024))
+
+# In-process block-status cache in front of Redis: entry count and seconds an entry lives
+BLOCK_CACHE_SIZE = int(os.getenv("BLOCK_CACHE_SIZE", 100000))
+BLOCK_CACHE_TTL = float(os.getenv("BLOCK_CACHE_TTL", 30))
+
+# Seconds a block status lives in Redis. A write lost while Redis was unreachable can leave a
+# stale value behind at worst this long; expired keys are refilled from the database.
+BLOCK_STATUS_REDIS_TTL = int(os.getenv("BLOCK_STATUS_REDIS_TTL", 3600))
+
+# Redis pub/sub channel used to invalidate block-status entries across workers
+BLOCK_CACHE_CHANNEL = os.getenv("BLOCK_CACHE_CHANNEL", "video_block_status")
+
+# Redis connection; REDIS_URL, when set, takes precedence over host/port/db
+REDIS_URL = os.getenv("REDIS_URL")
+REDIS_HOST = os.getenv("REDIS_HOST", "localhost")
+REDIS_PORT = int(os.getenv("REDIS_PORT", 6379))
+REDIS_DB = int(os.getenv("REDIS_DB", 0))
+
+# "redis" for a real server, "memory" for the built-in in-process stand-in,
+# "fakeredis" for the fakeredis package (tests and benchmarks without a server)
+REDIS_BACKEND = os.getenv("REDIS_BACKEND", "redis")
+
+# Connection pool size and socket timeouts (seconds)
+REDIS_MAX_CONNECTIONS = int(os.getenv("REDIS_MAX_CONNECTIONS", 50))
+REDIS_SOCKET_TIMEOUT = float(os.getenv("REDIS_SOCKET_TIMEOUT", 0.5))
+REDIS_CONNECT_TIMEOUT = float(os.getenv("REDIS_CONNECT_TIMEOUT", 0.5))
+
+# Stop calling Redis after this many consecutive failures, and retry after the cooldown (seconds)
+REDIS_BREAKER_THRESHOLD = int(os.getenv("REDIS_BREAKER_THRESHOLD", 5))
+REDIS_BREAKER_COOLDOWN = float(os.getenv("REDIS_BREAKER_COOLDOWN", 10))
+
+# bcrypt work factor for new password hashes; stored hashes of a different cost are rehashed on login
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", 12))
+
+# Threads hashing and verifying passwords, and how many logins may wait for one before getting 503
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", max(1, min(4, (os.cpu_count() or 2) // 2))))
+PASSWORD_HASH_MAX_PENDING = int(os.getenv("PASSWORD_HASH_MAX_PENDING", 64))
+
+# In-process caches of authenticated users and verified tokens, so token checks skip the
+# users table and the JWT signature check. Role changes made through invalidate_user
+# apply at once in this worker, elsewhere within the TTL.
+USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", 10000))
+USER_CACHE_TTL = float(os.getenv("USER_CACHE_TTL", 30))
+
+# Ids per UPDATE statement of a bulk block/unblock, and the most ids one call may change
+BULK_BLOCK_BATCH_SIZE = int(os.getenv("BULK_BLOCK_BATCH_SIZE", 1000))
+BULK_BLOCK_MAX_IDS = int(os.getenv("BULK_BLOCK_MAX_IDS", 100000))
+
+# Where video files live: "local" (UPLOAD_DIR) or "s3" (any S3-compatible object store)
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "local")
+
+# S3 bucket and key prefix; credentials come from the usual AWS_* variables.
+# Set S3_ENDPOINT_URL for MinIO or another S3-compatible server.
+S3_BUCKET = os.getenv("S3_BUCKET", "videos")
+S3_PREFIX = os.getenv("S3_PREFIX", "")
+S3_ENDPOINT_URL = os.getenv("S3_ENDPOINT_URL")
+S3_REGION = os.getenv("S3_REGION", "us-east-1")
+
+# Files above the threshold are sent as multipart uploads of S3_MULTIPART_CHUNK_SIZE parts
+S3_MULTIPART_THRESHOLD = int(os.getenv("S3_MULTIPART_THRESHOLD", 64 * 1024 * 1024))
+S3_MULTIPART_CHUNK_SIZE = int(os.getenv("S3_MULTIPART_CHUNK_SIZE", 64 * 1024 * 1024))
+S3_MAX_CONCURRENCY = int(os.getenv("S3_MAX_CONCURRENCY", 8))
+
+# Lifetime in seconds of the presigned URLs downloads are redirected to
+S3_PRESIGN_EXPIRES = int(os.getenv("S3_PRESIGN_EXPIRES", 300))
+
+# Probe duration, codecs, resolution and bitrate of ready videos and render a thumbnail
+METADATA_ENABLED = os.getenv("METADATA_ENABLED", "1") == "1"
+FFPROBE_BINARY = os.getenv("FFPROBE_BINARY", "ffprobe")
+
+# Probe worker threads, and how many finished jobs each writes back in one transaction
+METADATA_CONCURRENCY = int(os.getenv("METADATA_CONCURRENCY", 2))
+METADATA_BATCH_SIZE = int(os.getenv("METADATA_BATCH_SIZE", 32))
+METADATA_BATCH_WAIT = float(os.getenv("METADATA_BATCH_WAIT", 0.05))
+METADATA_TIMEOUT = int(os.getenv("METADATA_TIMEOUT", 120))
+
+# Thumbnail width in pixels, and where in the video it is taken (fraction of the duration)
+THUMBNAIL_WIDTH = int(os.getenv("THUMBNAIL_WIDTH", 320))
+THUMBNAIL_POSITION = float(os.getenv("THUMBNAIL_POSITION", 0.1))
+
+# Package ready videos as multi-rendition HLS for streaming (off by default: it costs one encode per rendition)
+PACKAGING_ENABLED = os.getenv("PACKAGING_ENABLED", "0") == "1"
+PACKAGING_CONCURRENCY = int(os.getenv("PACKAGING_CONCURRENCY", 1))
+PACKAGING_TIMEOUT = int(os.getenv("PACKAGING_TIMEOUT", 7200))
+
+# Where packages are written, one directory per content hash
+HLS_DIR = os.getenv("HLS_DIR", os.path.join(UPLOAD_DIR, "hls"))
+
+# Renditions as height:kbps pairs; those taller than the source are skipped
+HLS_RENDITIONS = os.getenv("HLS_RENDITIONS", "1080:5000,720:2800,480:1400,360:800")
+HLS_SEGMENT_SECONDS = int(os.getenv("HLS_SEGMENT_SECONDS", 6))
+
+# Cache-Control of rendition playlists and segments, whose URLs carry the content hash and never change.
+# Private by default so shared caches cannot keep serving a video after it is blocked.
+HLS_CACHE_CONTROL = os.getenv("HLS_CACHE_CONTROL", "private, max-age=31536000, immutable")
+
+# Packages and video-to-package mappings kept in memory by each worker
+HLS_INDEX_SIZE = int(os.getenv("HLS_INDEX_SIZE", 1000))
+HLS_INDEX_TTL = float(os.getenv("HLS_INDEX_TTL", 30))
+
+# Per-route latency histograms, database and Redis timings, served at /metrics in Prometheus format
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "1") == "1"
+
+# Let a request ask for a sampling profile with an "X-Profile: 1" header (needs pyinstrument).
+# Reports are written to PROFILE_DIR; keep this off in production.
+PROFILER_ENABLED = os.getenv("PROFILER_ENABLED", "0") == "1"
+PROFILER_INTERVAL = float(os.getenv("PROFILER_INTERVAL", 0.001))
+PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
+
+# Token-bucket rate limits, shared through Redis (each worker falls back to its own buckets
+# while Redis is unavailable). Rates are per second; bursts are bucket sizes.
+# Clients are keyed by the user id of a valid bearer token, otherwise by IP address.
+RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "1") == "1"
+SIGNIN_RATE_LIMIT = float(os.getenv("SIGNIN_RATE_LIMIT", 1))
+SIGNIN_RATE_BURST = int(os.getenv("SIGNIN_RATE_BURST", 10))
+DOWNLOAD_RATE_LIMIT = float(os.getenv("DOWNLOAD_RATE_LIMIT", 10))
+DOWNLOAD_RATE_BURST = int(os.getenv("DOWNLOAD_RATE_BURST", 50))
+
+# Downloads of any one video across all clients; 0 disables
+VIDEO_DOWNLOAD_RATE_LIMIT = float(os.getenv("VIDEO_DOWNLOAD_RATE_LIMIT", 0))
+VIDEO_DOWNLOAD_RATE_BURST = int(os.getenv("VIDEO_DOWNLOAD_RATE_BURST", 200))
+
+# Bytes per second per client across all its downloads; 0 disables. Shaped downloads are
+# sent in DOWNLOAD_CHUNK_SIZE pieces by the app instead of by the server's sendfile.
+DOWNLOAD_BANDWIDTH_LIMIT = int(os.getenv("DOWNLOAD_BANDWIDTH_LIMIT", 0))
+DOWNLOAD_BANDWIDTH_BURST = int(os.getenv("DOWNLOAD_BANDWIDTH_BURST", 4 * DOWNLOAD_CHUNK_SIZE))
+
+# Use the first X-Forwarded-For address as the client IP (only behind a trusted proxy)
+RATE_LIMIT_TRUST_FORWARDED = os.getenv("RATE_LIMIT_TRUST_FORWARDED", "0") == "1"
+
+# Buckets kept by the in-process fallback; the least recently used are dropped beyond this
+RATE_LIMIT_LOCAL_KEYS = int(os.getenv("RATE_LIMIT_LOCAL_KEYS", 100000))
+
+# Create missing tables, columns, indexes and the search index when api.models is imported.
+# The production server (api.server) imports the app once before forking its workers, so
+# this runs once per start rather than per worker; set 0 to skip it once the schema is current.
+DB_CREATE_SCHEMA = os.getenv("DB_CREATE_SCHEMA", "1") == "1"
+
+# Production server (python -m api.server): worker processes forked from one preloaded app,
+# sharing one listening socket. 0 workers means one per CPU core available to the process.
+SERVER_HOST = os.getenv("SERVER_HOST", "0.0.0.0")
+SERVER_PORT = int(os.getenv("SERVER_PORT", 8000))
+SERVER_WORKERS = int(os.getenv("SERVER_WORKERS", 0))
+
+# Seconds a stopping worker keeps serving in-flight requests (downloads included) before cutting them off
+SHUTDOWN_TIMEOUT = float(os.getenv("SHUTDOWN_TIMEOUT", 30))
+
+# Local hot-file tier for downloads (see edge_cache): copies of the most requested videos in a
+# directory on fast local disk or tmpfs, e.g. /dev/shm/video-cache. Empty disables it.
+EDGE_CACHE_DIR = os.getenv("EDGE_CACHE_DIR", "")
+EDGE_CACHE_SIZE = int(os.getenv("EDGE_CACHE_SIZE", 1024 * 1024 * 1024))  # bytes
+EDGE_CACHE_POLICY = os.getenv("EDGE_CACHE_POLICY", "lru")  # lru or lfu
+
+# Requests a worker serves from storage before copying the video into the cache (1: on the first)
+EDGE_CACHE_PROMOTE_AFTER = int(os.getenv("EDGE_CACHE_PROMOTE_AFTER", 3))
+
+# Videos each worker keeps hit and miss counts for; the least recently requested are dropped
+EDGE_CACHE_STATS_SIZE = int(os.getenv("EDGE_CACHE_STATS_SIZE", 10000))
@@ -1,19 +1,23 @@
+from typing import NamedTuple
 from fastapi import Depends, HTTPException, status,FastAPI
 from .auth import decode_token
 from .models import User
-from .models import SessionLocal
-from sqlalchemy.orm import Session
-from fastapi.security import OAuth2PasswordBearer
+from .models import AsyncSessionLocal
+from .local_cache import TTLCache, MISSING
+from .config import USER_CACHE_SIZE, USER_CACHE_TTL
+from .services import VideoService
+from sqlalchemy.ext.asyncio import AsyncSession
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 
 app = FastAPI()
 
-def get_db():
-    db = SessionLocal()
-    try:
+# One async session per request, returned to the pool when the request ends
+async def get_db():
+    async with AsyncSessionLocal() as db:
         yield db
-    finally:
-        db.close()
+
+def get_video_service(db: AsyncSession = Depends(get_db)):
+    return VideoService(db)
 
 
 # Define how to retrieve the token
@@ -23,7 +27,32 @@ oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 async def token(form_data: OAuth2PasswordRequestForm = Depends()):
     return {'access_token' : form_data.username + 'token'}
 
-def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+# What authenticated routes know about the caller; a plain record, so it can be cached
+class CurrentUser(NamedTuple):
+    id: int
+    username: str
+    email: str
+    is_admin: bool
+    is_active: bool
+
+# Users by id; a hit answers the request without touching the database
+user_cache = TTLCache(maxsize=USER_CACHE_SIZE, ttl=USER_CACHE_TTL)
+
+# Call after changing a user's role, active flag or deleting them
+def invalidate_user(user_id: int):
+    user_cache.delete(user_id)
+
+async def load_current_user(db: AsyncSession, user_id: int):
+    user = user_cache.get(user_id)
+    if user is MISSING:
+        row = await db.get(User, user_id)
+        user = row and CurrentUser(row.id, row.username, row.email, bool(row.is_admin), row.is_active is not False)
+        # Unknown ids are not cached, so a newly created user is seen at once
+        if user:
+            user_cache.set(user_id, user)
+    return user
+
+async def get_current_user(token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_db)):
     payload = decode_token(token)
     if payload is None:
         raise HTTPException(
@@ -31,8 +60,11 @@ def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(
             detail="Could not validate credentials",
             headers={"WWW-Authenticate": "Bearer"},
         )
-    user = db.query(User).filter(User.id == payload.get("sub")).first()
-    if user is None:
+    try:
+        user = await load_current_user(db, int(payload.get("sub")))
+    except (TypeError, ValueError):
+        user = None
+    if user is None or not user.is_active:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Could not validate user",
@@ -40,7 +72,7 @@ def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(
         )
     return user
 
-def admin_only(current_user: User = Depends(get_current_user)):
+def admin_only(current_user: CurrentUser = Depends(get_current_user)):
     if not current_user.is_admin:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
@@ -0,0 +1,265 @@
+import os
+import time
+import queue
+import shutil
+import logging
+import threading
+from collections import OrderedDict
+from .config import (
+    EDGE_CACHE_DIR, EDGE_CACHE_SIZE, EDGE_CACHE_POLICY, EDGE_CACHE_PROMOTE_AFTER, EDGE_CACHE_STATS_SIZE,
+)
+
+logger = logging.getLogger(__name__)
+
+# A hit updates the copy's access time only when it is older than this, so the LRU
+# order has this resolution in seconds but most hits cost one stat and no write
+ACCESS_RESOLUTION = 10
+
+POLICIES = ("lru", "lfu")
+
+
+# Local hot-file tier in front of stored files: copies of the most requested videos in a
+# directory on fast disk or tmpfs, at <directory>/<video id>/<content hash>. A video is copied
+# in the background once a worker has served it `promote_after` times from storage. Beyond
+# `max_bytes` the least recently (lru) or least often (lfu) requested copies are deleted.
+# Copies keep the original's mtime, so Last-Modified and ETag are the same from either tier.
+# The workers of a node share the directory; request counts and promotions are per worker.
+class EdgeCache:
+    def __init__(self, directory: str = EDGE_CACHE_DIR, max_bytes: int = EDGE_CACHE_SIZE,
+                 policy: str = EDGE_CACHE_POLICY, promote_after: int = EDGE_CACHE_PROMOTE_AFTER,
+                 stats_size: int = EDGE_CACHE_STATS_SIZE):
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown EDGE_CACHE_POLICY {policy!r}")
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.policy = policy
+        self.promote_after = max(1, promote_after)
+        self.stats_size = stats_size
+        # [hits, misses, misses since last queued for copying] per video id, least recently requested first
+        self.files = OrderedDict()
+        self.counters = {"hits": 0, "misses": 0, "promotions": 0, "evictions": 0, "blocked_evictions": 0}
+        # Videos queued for copying, and those blocked while queued
+        self.pending = set()
+        self.cancelled = set()
+        self.jobs = queue.Queue()
+        self.worker = None
+        self.lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.directory) and self.max_bytes > 0
+
+    def entry_dir(self, video_id: int) -> str:
+        return os.path.join(self.directory, str(video_id))
+
+    def entry_path(self, video_id: int, content_hash: str) -> str:
+        return os.path.join(self.directory, str(video_id), content_hash)
+
+    # Count a request for the video. Returns True when a miss should queue a copy: the
+    # promote_after-th since the last copy, so an evicted video must earn its place again.
+    def record(self, video_id: int, hit: bool) -> bool:
+        with self.lock:
+            counts = self.files.pop(video_id, None) or [0, 0, 0]
+            self.files[video_id] = counts
+            if len(self.files) > self.stats_size:
+                self.files.popitem(last=False)
+            if hit:
+                counts[0] += 1
+                self.counters["hits"] += 1
+                return False
+            counts[1] += 1
+            counts[2] += 1
+            self.counters["misses"] += 1
+            if counts[2] < self.promote_after:
+                return False
+            counts[2] = 0
+            return True
+
+    # Path to serve a video from: its copy when there is one, otherwise `path`, queueing a copy
+    # once the video has missed often enough. Only videos with a content hash are cached, since
+    # the hash names the copy and a video whose content changes gets a new one.
+    def lookup(self, video_id: int, path: str, content_hash: str) -> str:
+        if not self.enabled or not content_hash:
+            return path
+        cached = self.entry_path(video_id, content_hash)
+        try:
+            stat_result = os.stat(cached)
+        except FileNotFoundError:
+            if self.record(video_id, hit=False):
+                self.submit(video_id, path, content_hash)
+            return path
+        self.record(video_id, hit=True)
+        now = time.time()
+        if self.policy == "lru" and now - stat_result.st_atime > ACCESS_RESOLUTION:
+            try:
+                os.utime(cached, ns=(time.time_ns(), stat_result.st_mtime_ns))
+            except FileNotFoundError:
+                return path
+        return cached
+
+    def start(self):
+        with self.lock:
+            if self.worker is None:
+                self.worker = threading.Thread(target=self.run, name="edge-cache", daemon=True)
+                self.worker.start()
+
+    def submit(self, video_id: int, path: str, content_hash: str):
+        with self.lock:
+            if video_id in self.pending:
+                return
+            self.pending.add(video_id)
+            self.cancelled.discard(video_id)
+        self.start()
+        self.jobs.put((video_id, path, content_hash))
+
+    def run(self):
+        while True:
+            video_id, path, content_hash = self.jobs.get()
+            try:
+                self.promote(video_id, path, content_hash)
+            except Exception:
+                logger.exception("Edge cache could not copy video %s", video_id)
+            finally:
+                with self.lock:
+                    self.pending.discard(video_id)
+                self.jobs.task_done()
+
+    # Copy a video into the cache, deleting other copies first until it fits
+    def promote(self, video_id: int, path: str, content_hash: str):
+        size = os.path.getsize(path)
+        if size > self.max_bytes:
+            return
+        if not self.make_room(size, keep=str(video_id)):
+            return
+        directory = self.entry_dir(video_id)
+        os.makedirs(directory, exist_ok=True)
+        # Copies of the video's earlier content, e.g. from before it was transcoded
+        for entry in os.scandir(directory):
+            if entry.name != content_hash:
+                remove_file(entry.path)
+
+        temp_path = os.path.join(directory, f".{content_hash}.{os.getpid()}.tmp")
+        try:
+            shutil.copyfile(path, temp_path)
+            os.utime(temp_path, ns=(time.time_ns(), os.stat(path).st_mtime_ns))
+            with self.lock:
+                # Blocked while being copied: the copy must not appear afterwards
+                if video_id in self.cancelled:
+                    self.cancelled.discard(video_id)
+                    return
+                os.replace(temp_path, self.entry_path(video_id, content_hash))
+                self.counters["promotions"] += 1
+        finally:
+            remove_file(temp_path)
+
+    # Copies in the shared directory as (video id, path, size, last access)
+    def entries(self) -> list:
+        entries = []
+        try:
+            video_dirs = list(os.scandir(self.directory))
+        except FileNotFoundError:
+            return entries
+        for video_dir in video_dirs:
+            if not video_dir.is_dir():
+                continue
+            try:
+                for entry in os.scandir(video_dir.path):
+                    if not entry.name.startswith("."):
+                        stat_result = entry.stat()
+                        entries.append((video_dir.name, entry.path, stat_result.st_size, stat_result.st_atime))
+            except FileNotFoundError:
+                continue
+        return entries
+
+    # Delete copies (never those of video `keep`) until `size` more bytes fit under max_bytes.
+    # Under lfu a copy is only given up for a video requested more often than it; returns
+    # False, deleting nothing, when `keep` should not be cached.
+    def make_room(self, size: int, keep: str) -> bool:
+        entries = self.entries()
+        used = sum(entry[2] for entry in entries)
+        if used + size <= self.max_bytes:
+            return True
+        if self.policy == "lfu":
+            with self.lock:
+                requests = {str(video_id): counts[0] + counts[1] for video_id, counts in self.files.items()}
+            order = sorted(entries, key=lambda entry: (requests.get(entry[0], 0), entry[3]))
+        else:
+            order = sorted(entries, key=lambda entry: entry[3])
+
+        victims = []
+        for entry in order:
+            if used + size <= self.max_bytes:
+                break
+            if entry[0] == keep:
+                continue
+            if self.policy == "lfu" and requests.get(entry[0], 0) >= requests.get(keep, 0):
+                return False
+            victims.append(entry)
+            used -= entry[2]
+        for _, path, _, _ in victims:
+            remove_file(path)
+            remove_empty_dir(os.path.dirname(path))
+        with self.lock:
+            self.counters["evictions"] += len(victims)
+        return True
+
+    # Delete the copies of these videos now; called when they are blocked
+    def evict(self, video_ids) -> int:
+        if not self.enabled:
+            return 0
+        with self.lock:
+            self.cancelled.update(video_id for video_id in video_ids if video_id in self.pending)
+        try:
+            cached = set(os.listdir(self.directory))
+        except FileNotFoundError:
+            return 0
+        evicted = 0
+        for video_id in video_ids:
+            if str(video_id) in cached:
+                shutil.rmtree(self.entry_dir(video_id), ignore_errors=True)
+                evicted += 1
+        with self.lock:
+            self.counters["blocked_evictions"] += evicted
+        return evicted
+
+    # Totals, and hits and misses of the `top` most requested videos
+    def stats(self, top: int = 100) -> dict:
+        entries = self.entries() if self.enabled else []
+        cached = {entry[0] for entry in entries}
+        with self.lock:
+            counters = dict(self.counters)
+            files = sorted(self.files.items(), key=lambda item: item[1][0] + item[1][1], reverse=True)[:top]
+            pending = len(self.pending)
+        lookups = counters["hits"] + counters["misses"]
+        return {
+            "enabled": self.enabled,
+            "policy": self.policy,
+            "promote_after": self.promote_after,
+            "max_bytes": self.max_bytes,
+            "used_bytes": sum(entry[2] for entry in entries),
+            "cached_files": len(entries),
+            "pending_copies": pending,
+            **counters,
+            "hit_rate": counters["hits"] / lookups if lookups else 0.0,
+            "files": [
+                {"video_id": video_id, "requests": hits + misses, "hits": hits, "misses": misses,
+                 "hit_rate": hits / (hits + misses), "cached": str(video_id) in cached}
+                for video_id, (hits, misses, _) in files
+            ],
+        }
+
+
+def remove_file(path: str):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+def remove_empty_dir(path: str):
+    try:
+        os.rmdir(path)
+    except OSError:
+        pass
+
+
+edge_cache = EdgeCache()
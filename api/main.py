@@ -1,14 +1,56 @@
-from fastapi import FastAPI,File, APIRouter, Depends, HTTPException, status
-from .services import VideoService, UploadFile
-from .dependencies import admin_only, get_db
-from sqlalchemy.orm import Session
-from .auth import create_access_token, verify_password, get_password_hash,ACCESS_TOKEN_EXPIRE_MINUTES
-from .models import User
-from .schemas import UserCreate, Token, UserLogin
-from fastapi.responses import JSONResponse,FileResponse
-from .redis_service import cache_block_status,is_video_blocked
+from fastapi import FastAPI,File, Depends, HTTPException, status, Path, Query, Request
+from .services import VideoService, UploadFile, SEARCH_FIELDS, SEARCH_PAGE_SIZE, SEARCH_MAX_PAGE_SIZE
+from .dependencies import admin_only, get_db, get_video_service
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from .auth import create_access_token, verify_and_rehash, hash_password,ACCESS_TOKEN_EXPIRE_MINUTES
+from .models import User, engine, async_engine
+from .schemas import UserCreate, Token, UserLogin, UploadSessionCreate, BulkBlockRequest, UploadResponse, SearchResponse, VideoStatusResponse
+from .serialization import video_as_dict
+from . import upload_sessions
+from .transcoder import transcode_queue, requeue_unfinished
+from . import transcoder
+from .media_info import metadata_queue
+from .packaging import packaging_queue, manifest_index, video_hashes, MEDIA_PLAYLIST
+from .local_cache import MISSING
+from .config import (
+    HLS_CACHE_CONTROL, METRICS_ENABLED, SIGNIN_RATE_LIMIT, SIGNIN_RATE_BURST,
+    DOWNLOAD_RATE_LIMIT, DOWNLOAD_RATE_BURST, VIDEO_DOWNLOAD_RATE_LIMIT, VIDEO_DOWNLOAD_RATE_BURST,
+    TRANSCODE_ENABLED, UPLOAD_MAX_SIZE,
+)
+from .rate_limit import rate_limit, bandwidth_throttle, limiter
+from . import metrics
+from .streaming import file_response, downloads_in_flight
+from .edge_cache import edge_cache
+from fastapi.responses import RedirectResponse,Response,ORJSONResponse
+from .storage import is_remote, storage_for
+from .redis_service import is_video_blocked,block_cache_stats,redis_breaker,lookup_stats
+from .redis_service import redis_client, guarded, close_redis, start_invalidation_listener
 from fastapi.security import OAuth2PasswordRequestForm
-from datetime import datetime, timedelta
+from datetime import timedelta
+from typing import Annotated
+from contextlib import asynccontextmanager
+from starlette.concurrency import run_in_threadpool
+
+# Per-worker setup and teardown. The engines and the Redis client connect lazily, so importing
+# the app does no network I/O and servers can fork workers from one preloaded copy (see api.server).
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Open the first database and Redis connections before taking traffic rather than on the first request
+    async with async_engine.connect() as conn:
+        await conn.exec_driver_sql("SELECT 1")
+    await guarded(redis_client.ping, command="ping")
+    # Start the thread pool that runs sync dependencies and file I/O
+    await run_in_threadpool(lambda: None)
+    start_invalidation_listener()
+    if TRANSCODE_ENABLED and transcoder.requeue_on_startup:
+        await run_in_threadpool(requeue_unfinished)
+    yield
+    # Runs once the server has let in-flight requests, downloads included, finish: uvicorn waits
+    # up to its timeout_graceful_shutdown (SHUTDOWN_TIMEOUT under api.server) before shutdown
+    await close_redis()
+    await async_engine.dispose()
+    engine.dispose()
 
 # Doc Customization
 app = FastAPI(
@@ -16,18 +58,58 @@ app = FastAPI(
     description="Fast api task",
     version="1.0.0",
     docs_url="/docs",        
-    redoc_url="/redoc"       
+    redoc_url="/redoc",
+    default_response_class=ORJSONResponse,
+    lifespan=lifespan,
 )
 
-video_service = VideoService()
+# Bytes of multipart framing (boundaries, part headers, form fields) allowed on top of UPLOAD_MAX_SIZE
+UPLOAD_FORM_OVERHEAD = 64 * 1024
+
+# Refuse /upload/ requests whose Content-Length is over the limit before anything reads them.
+# Starlette receives and spools the whole multipart body before the endpoint or any of its
+# dependencies run, so the size check while storing the file would come after it all arrived.
+# Chunked bodies have no length up front and are still checked while the file is stored.
+class UploadSizeLimit:
+    def __init__(self, app, paths=("/upload/",)):
+        self.app = app
+        self.paths = paths
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and UPLOAD_MAX_SIZE and scope["path"] in self.paths:
+            content_length = dict(scope["headers"]).get(b"content-length", b"")
+            if content_length.isdigit() and int(content_length) > UPLOAD_MAX_SIZE + UPLOAD_FORM_OVERHEAD:
+                response = ORJSONResponse(
+                    {"detail": f"Upload exceeds the maximum size of {UPLOAD_MAX_SIZE} bytes."},
+                    status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, headers={"connection": "close"},
+                )
+                return await response(scope, receive, send)
+        await self.app(scope, receive, send)
+
+app.add_middleware(UploadSizeLimit)
+if METRICS_ENABLED:
+    app.add_middleware(metrics.MetricsMiddleware)
+
+# Password checks per client, and downloads per client and per video
+signin_limit = rate_limit("signin", SIGNIN_RATE_LIMIT, SIGNIN_RATE_BURST)
+download_limit = rate_limit("download", DOWNLOAD_RATE_LIMIT, DOWNLOAD_RATE_BURST)
+video_download_limit = rate_limit("video_download", VIDEO_DOWNLOAD_RATE_LIMIT, VIDEO_DOWNLOAD_RATE_BURST, per_video=True)
+
+# Verify a login password, upgrading the stored hash when the bcrypt cost has changed
+async def check_password(db: AsyncSession, user: User, password: str) -> bool:
+    valid, new_hash = await verify_and_rehash(password, user.hashed_password)
+    if valid and new_hash:
+        user.hashed_password = new_hash
+        await db.commit()
+    return valid
 
 # Create jwt access token using credentials (username and password)
-@app.post('/token', response_model=Token)
-async def token(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
+@app.post('/token', response_model=Token, dependencies=[Depends(signin_limit)])
+async def token(form_data: OAuth2PasswordRequestForm = Depends(), db: AsyncSession = Depends(get_db)):
     # Query the user from the database using the provided username (form_data.username)
-    user = db.query(User).filter(User.username == form_data.username).first()
+    user = await db.scalar(select(User).where(User.username == form_data.username))
     
-    if not user or not verify_password(form_data.password, user.hashed_password):
+    if not user or not await check_password(db, user, form_data.password):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid credentials"
@@ -48,9 +130,9 @@ async def token(form_data: OAuth2PasswordRequestForm = Depends(), db: Session =
 
 # User signup
 @app.post("/signup/", response_model=Token)
-def register(user: UserCreate, db: Session = Depends(get_db)):
+async def register(user: UserCreate, db: AsyncSession = Depends(get_db)):
     # Check if the user already exists
-    existing_user = db.query(User).filter(User.email == user.email).first()
+    existing_user = await db.scalar(select(User).where(User.email == user.email))
     
     if existing_user:
         raise HTTPException(
@@ -58,8 +140,8 @@ def register(user: UserCreate, db: Session = Depends(get_db)):
             detail="User already registered!"
         )
     
-    # Hash the password before saving
-    hashed_password = get_password_hash(user.password)
+    # Hash the password before saving (bcrypt is CPU bound, keep it off the event loop)
+    hashed_password = await hash_password(user.password)
     
     # Create a new user instance, including the is_admin flag
     db_user = User(
@@ -70,8 +152,8 @@ def register(user: UserCreate, db: Session = Depends(get_db)):
     )
     
     db.add(db_user)
-    db.commit()
-    db.refresh(db_user)
+    await db.commit()
+    await db.refresh(db_user)
     
     # Create an access token for the new user
     token = create_access_token(data={"sub": db_user.id})
@@ -87,10 +169,10 @@ def register(user: UserCreate, db: Session = Depends(get_db)):
 
 
 # User signin
-@app.post("/signin/", response_model=Token)
-def login(user: UserLogin, db: Session = Depends(get_db)):
-    db_user = db.query(User).filter(User.username == user.username).first()
-    if not db_user or not verify_password(user.password, db_user.hashed_password):
+@app.post("/signin/", response_model=Token, dependencies=[Depends(signin_limit)])
+async def login(user: UserLogin, db: AsyncSession = Depends(get_db)):
+    db_user = await db.scalar(select(User).where(User.username == user.username))
+    if not db_user or not await check_password(db, db_user, user.password):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED, 
             detail="Invalid credentials"
@@ -104,10 +186,8 @@ def login(user: UserLogin, db: Session = Depends(get_db)):
         "token_type": "bearer"          
     }   
 
-# Upload video
-@app.post("/upload/", dependencies=[Depends(admin_only)])
-async def upload_video(file: UploadFile = File(...)):
-    video = await video_service.upload_video(file) 
+# Response body for a freshly uploaded video
+def uploaded_video_response(video):
     response = {
         "status": True,
         "data": {
@@ -115,46 +195,305 @@ async def upload_video(file: UploadFile = File(...)):
             "name": video.name,               
             "is_blocked": video.is_blocked,  
             "path": video.path,               
-            "id": video.id                    
+            "id": video.id,
+            "content_hash": video.content_hash,
+            "processing_status": video.status
         }
     }
-    return JSONResponse(response)
+    return ORJSONResponse(response)
+
+# Upload video; conversion to .mp4 runs in the background, higher priority first
+@app.post("/upload/", dependencies=[Depends(admin_only)], response_model=UploadResponse)
+async def upload_video(file: UploadFile = File(...), priority: int = 0, video_service: VideoService = Depends(get_video_service)):
+    video = await video_service.upload_video(file, priority) 
+    return uploaded_video_response(video)
+
+# Upload session ids are random hex strings; anything else never touches the filesystem
+UploadId = Annotated[str, Path(pattern="^[0-9a-f]{32}$")]
 
-# Search video using (size & name) query params
-@app.get("/search/", dependencies=[Depends(admin_only)])
-async def search_video(name: str = None, size: float = None):
-    video = video_service.search_videos(name, size)
-    response = {"status":True,"data":video}
+# Start a resumable upload session
+@app.post("/uploads/", dependencies=[Depends(admin_only)])
+async def create_upload_session(body: UploadSessionCreate):
+    session = upload_sessions.create_session(body.filename)
+    return {"status": True, "data": session}
+
+# Upload one numbered part of a session (raw request body); parts may be sent in parallel
+@app.put("/uploads/{upload_id}/parts/{part_number}/", dependencies=[Depends(admin_only)])
+async def upload_part(request: Request, upload_id: UploadId, part_number: int):
+    part = await upload_sessions.write_part(upload_id, part_number, request.stream())
+    return {"status": True, "data": part}
+
+# List the parts received so far, so clients can resume after a failure
+@app.get("/uploads/{upload_id}/", dependencies=[Depends(admin_only)])
+async def get_upload_session(upload_id: UploadId):
+    session = upload_sessions.load_session(upload_id)
+    session["parts"] = upload_sessions.list_parts(upload_id)
+    return {"status": True, "data": session}
+
+# Assemble the parts and create the video
+@app.post("/uploads/{upload_id}/complete/", dependencies=[Depends(admin_only)], response_model=UploadResponse)
+async def complete_upload_session(upload_id: UploadId, priority: int = 0, video_service: VideoService = Depends(get_video_service)):
+    video = await upload_sessions.complete_session(upload_id, video_service, priority)
+    return uploaded_video_response(video)
+
+# Abort a session and discard its parts
+@app.delete("/uploads/{upload_id}/", dependencies=[Depends(admin_only)])
+async def abort_upload_session(upload_id: UploadId):
+    upload_sessions.abort_session(upload_id)
+    return {"status": True}
+
+# Processing status of a video (queued, processing, ready or failed)
+@app.get("/videos/{video_id}/status/", dependencies=[Depends(admin_only)])
+async def video_status(video_id: int, video_service: VideoService = Depends(get_video_service)):
+    video = await video_service.get_video_by_id(video_id)
+    response = {
+        "status": True,
+        "data": {
+            "id": video.id,
+            "processing_status": video.status,
+            "detail": video.status_detail,
+            "queued_jobs": transcode_queue.pending(),
+            "duration": video.duration,
+            "video_codec": video.video_codec,
+            "audio_codec": video.audio_codec,
+            "width": video.width,
+            "height": video.height,
+            "bitrate": video.bitrate,
+            "has_thumbnail": video.thumbnail_path is not None,
+            "queued_metadata_jobs": metadata_queue.pending(),
+            "has_stream": bool(video.content_hash) and manifest_index.get(video.content_hash) is not None,
+            "queued_packaging_jobs": packaging_queue.pending(),
+        }
+    }
     return response
 
-# Block video by id
-@app.post("/block/{video_id}/")
-async def block_video(video_id: int):
-    video = video_service.block_video(video_id)
-    response = {"status":True,"data":video}
+# Thumbnail of a video, once the metadata workers have rendered it
+@app.get("/videos/{video_id}/thumbnail/")
+async def video_thumbnail(video_id: int, request: Request, video_service: VideoService = Depends(get_video_service)):
+    if await is_video_blocked(video_id, lambda: video_service.get_block_status(video_id)):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="This video is blocked."
+        )
+    video = await video_service.get_video_by_id(video_id)
+    if not video.thumbnail_path:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="No thumbnail for this video yet."
+        )
+    if is_remote(video.thumbnail_path):
+        url = storage_for(video.thumbnail_path).download_url(video.thumbnail_path)
+        return RedirectResponse(url, status_code=status.HTTP_307_TEMPORARY_REDIRECT)
+    return file_response(request, video.thumbnail_path)
+
+async def ensure_not_blocked(video_id: int, video_service: VideoService):
+    if await is_video_blocked(video_id, lambda: video_service.get_block_status(video_id)):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="This video is blocked."
+        )
+
+def no_stream():
+    return HTTPException(
+        status_code=status.HTTP_404_NOT_FOUND,
+        detail="No stream for this video yet."
+    )
+
+# Content hash of a video's current file, from memory when looked up recently
+async def current_hash(video_id: int, video_service: VideoService):
+    content_hash = video_hashes.get(video_id)
+    if content_hash is MISSING:
+        content_hash = (await video_service.get_video_by_id(video_id)).content_hash
+        video_hashes.set(video_id, content_hash)
+    return content_hash
+
+PLAYLIST_TYPE = "application/vnd.apple.mpegurl"
+
+# HLS master playlist. Its URL is stable, so it is revalidated on every use and
+# a block takes effect on the next fetch; the renditions it lists live under the content hash.
+@app.get("/videos/{video_id}/hls/master.m3u8")
+async def hls_master(video_id: int, video_service: VideoService = Depends(get_video_service)):
+    await ensure_not_blocked(video_id, video_service)
+    content_hash = await current_hash(video_id, video_service)
+    package = manifest_index.get(content_hash) if content_hash else None
+    if package is None:
+        raise no_stream()
+    return Response(package.master, media_type=PLAYLIST_TYPE, headers={"Cache-Control": "no-cache"})
+
+ContentHash = Annotated[str, Path(pattern="^[0-9a-f]{64}$")]
+Rendition = Annotated[str, Path(pattern="^v[0-9]+$")]
+
+# Rendition playlist or segment. The URL names the content hash, so the bytes behind it
+# never change and clients may cache them for good; only the video's current hash is served.
+@app.get("/videos/{video_id}/hls/{content_hash}/{rendition}/{name}")
+async def hls_file(video_id: int, content_hash: ContentHash, rendition: Rendition, name: str, request: Request,
+                   video_service: VideoService = Depends(get_video_service)):
+    await ensure_not_blocked(video_id, video_service)
+    if content_hash != await current_hash(video_id, video_service):
+        raise no_stream()
+    if name == MEDIA_PLAYLIST:
+        package = manifest_index.get(content_hash)
+        if package is None or rendition not in package.playlists:
+            raise no_stream()
+        return Response(package.playlists[rendition], media_type=PLAYLIST_TYPE,
+                        headers={"Cache-Control": HLS_CACHE_CONTROL})
+    path = manifest_index.segment_path(content_hash, rendition, name)
+    if path is None:
+        raise no_stream()
+    response = file_response(request, path)
+    response.headers["Cache-Control"] = HLS_CACHE_CONTROL
     return response
 
+# Search video using name, size range and keyset pagination query params.
+# Pass the returned next_cursor as cursor to get the following page.
+# The response model documents the shape; rows are returned as an ORJSONResponse
+# directly, skipping per-row validation.
+@app.get("/search/", dependencies=[Depends(admin_only)], response_model=SearchResponse)
+async def search_video(
+    name: str = None,
+    size: float = None,
+    min_size: float = Query(None, ge=0),
+    max_size: float = Query(None, ge=0),
+    min_duration: float = Query(None, ge=0, description="Seconds"),
+    max_duration: float = Query(None, ge=0, description="Seconds"),
+    min_width: int = Query(None, ge=0),
+    max_width: int = Query(None, ge=0),
+    min_height: int = Query(None, ge=0),
+    max_height: int = Query(None, ge=0),
+    min_bitrate: int = Query(None, ge=0, description="Bits per second"),
+    max_bitrate: int = Query(None, ge=0, description="Bits per second"),
+    codec: str = Query(None, description="Video codec, e.g. h264"),
+    cursor: int = Query(None, ge=0),
+    limit: int = Query(SEARCH_PAGE_SIZE, ge=1, le=SEARCH_MAX_PAGE_SIZE),
+    fields: str = Query(None, description="Comma separated columns to return, e.g. id,name,size"),
+    video_service: VideoService = Depends(get_video_service),
+):
+    selected = [field.strip() for field in fields.split(",") if field.strip()] if fields else None
+    unknown = set(selected or []) - set(SEARCH_FIELDS)
+    if unknown:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Unknown fields: {', '.join(sorted(unknown))}. Allowed: {', '.join(SEARCH_FIELDS)}"
+        )
+    video, next_cursor = await video_service.search_videos(
+        name, size, codec, cursor, limit, selected,
+        min_size=min_size, max_size=max_size, min_duration=min_duration, max_duration=max_duration,
+        min_width=min_width, max_width=max_width, min_height=min_height, max_height=max_height,
+        min_bitrate=min_bitrate, max_bitrate=max_bitrate,
+    )
+    response = {"status":True,"data":video,"next_cursor":next_cursor}
+    return ORJSONResponse(response)
+
+# Block or unblock many videos at once, by ids or by search filter
+async def bulk_block_status(request: BulkBlockRequest, is_blocked: bool, video_service: VideoService):
+    filters = request.filter.model_dump(exclude_none=True) if request.filter else None
+    result = await video_service.set_block_status_bulk(is_blocked, request.ids, filters)
+    return {"status": True, "data": result}
+
+@app.post("/block/bulk/", dependencies=[Depends(admin_only)])
+async def block_videos(request: BulkBlockRequest, video_service: VideoService = Depends(get_video_service)):
+    return await bulk_block_status(request, True, video_service)
+
+@app.post("/unblock/bulk/", dependencies=[Depends(admin_only)])
+async def unblock_videos(request: BulkBlockRequest, video_service: VideoService = Depends(get_video_service)):
+    return await bulk_block_status(request, False, video_service)
+
+
+# Block video by id
+@app.post("/block/{video_id}/", response_model=VideoStatusResponse)
+async def block_video(video_id: int, video_service: VideoService = Depends(get_video_service)):
+    video = await video_service.block_video(video_id)
+    response = {"status":True,"data":video_as_dict(video) if video else None}
+    return ORJSONResponse(response)
+
 
 # Unblock video by id
-@app.post("/unblock/{video_id}/")
-async def unblock_video(video_id: int):
-    video = video_service.unblock_video(video_id)
-    response = {"status":True,"data":video}
-    return response
+@app.post("/unblock/{video_id}/", response_model=VideoStatusResponse)
+async def unblock_video(video_id: int, video_service: VideoService = Depends(get_video_service)):
+    video = await video_service.unblock_video(video_id)
+    response = {"status":True,"data":video_as_dict(video) if video else None}
+    return ORJSONResponse(response)
+
+
+# Block-status cache hit rates and lookup latency for this worker
+@app.get("/stats/block-cache/", dependencies=[Depends(admin_only)])
+async def block_cache_statistics():
+    return {"status": True, "data": block_cache_stats()}
+
+# Edge cache totals and per-video hits and misses of this worker, most requested first
+@app.get("/stats/edge-cache/", dependencies=[Depends(admin_only)])
+async def edge_cache_statistics(top: int = Query(100, ge=1, le=10000)):
+    return {"status": True, "data": edge_cache.stats(top)}
+
+
+# Jobs waiting in each background queue
+@metrics.register_collector
+def queued_jobs():
+    return "background_jobs_queued", "gauge", "Jobs waiting per background queue.", {
+        (("queue", "transcode"),): transcode_queue.pending(),
+        (("queue", "metadata"),): metadata_queue.pending(),
+        (("queue", "packaging"),): packaging_queue.pending(),
+    }
+
+# Where block-status lookups were answered from
+@metrics.register_collector
+def block_lookups():
+    return "block_status_lookups_total", "counter", "Block-status lookups by answering tier.", {
+        (("tier", tier),): lookup_stats[tier] for tier in ("local", "redis", "database")
+    }
+
+@metrics.register_collector
+def rate_limit_rejections():
+    return "rate_limit_rejections_total", "counter", "Requests refused with 429, per limit.", {
+        (("limit", name),): count for name, count in limiter.rejections.items()
+    }
+
+@metrics.register_collector
+def edge_cache_lookups():
+    return "edge_cache_lookups_total", "counter", "Downloads served from the edge cache (hit) or storage (miss).", {
+        (("result", "hit"),): edge_cache.counters["hits"],
+        (("result", "miss"),): edge_cache.counters["misses"],
+    }
+
+@metrics.register_collector
+def redis_breaker_open():
+    return "redis_circuit_breaker_open", "gauge", "1 while Redis calls are skipped.", {
+        (): int(redis_breaker.state == "open"),
+    }
+
+@metrics.register_collector
+def active_downloads():
+    return "downloads_in_flight", "gauge", "Files this worker is sending.", {(): downloads_in_flight()}
+
+# Prometheus metrics of this worker process
+@app.get("/metrics", include_in_schema=False)
+async def metrics_endpoint():
+    if not METRICS_ENABLED:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Metrics are disabled.")
+    return Response(metrics.render(), media_type="text/plain; version=0.0.4")
 
 
 # Download video by ID
-@app.get("/download/{video_id}/")
-async def download_video(video_id: int):
-    # Check if the video is blocked from Redis cache
-    if is_video_blocked(video_id):
+@app.get("/download/{video_id}/", dependencies=[Depends(download_limit), Depends(video_download_limit)])
+async def download_video(video_id: int, request: Request, video_service: VideoService = Depends(get_video_service)):
+    # Check if the video is blocked (local cache, then Redis, then the database)
+    if await is_video_blocked(video_id, lambda: video_service.get_block_status(video_id)):
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="This video is blocked and cannot be downloaded."
         )
     
     # Get the video details from the database
-    video = video_service.get_video_by_id(video_id)
+    video = await video_service.get_video_by_id(video_id)
     
-    # Return the video file if it's not blocked
-    return FileResponse(video.path)
\ No newline at end of file
+    # Objects in remote storage are fetched from the store directly via a short-lived presigned URL
+    if is_remote(video.path):
+        url = storage_for(video.path).download_url(video.path, video.name)
+        return RedirectResponse(url, status_code=status.HTTP_307_TEMPORARY_REDIRECT)
+
+    # Return the video file if it's not blocked, honouring Range and conditional headers.
+    # Hot videos come from their copy in the edge cache, when it is enabled; the stored file
+    # is served instead if the copy is evicted before it is opened.
+    path = edge_cache.lookup(video.id, video.path, video.content_hash)
+    fallback_path = video.path if path != video.path else None
+    return file_response(request, path, video.content_hash, bandwidth_throttle(request), fallback_path)
\ No newline at end of file
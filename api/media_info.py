@@ -0,0 +1,164 @@
+import os
+import json
+import logging
+import queue
+import subprocess
+import threading
+import ffmpeg
+from sqlalchemy import update
+from .models import Video, SessionLocal
+from .storage import storage, storage_for, new_temp_path
+from .packaging import packaging_queue
+from .config import (
+    METADATA_ENABLED, FFPROBE_BINARY, FFMPEG_BINARY, METADATA_CONCURRENCY, METADATA_BATCH_SIZE,
+    METADATA_BATCH_WAIT, METADATA_TIMEOUT, THUMBNAIL_WIDTH, THUMBNAIL_POSITION,
+)
+
+logger = logging.getLogger(__name__)
+
+
+# ffprobe command line printing container and stream details as JSON
+def probe_command(path: str) -> list[str]:
+    return [FFPROBE_BINARY, "-v", "error", "-show_format", "-show_streams", "-of", "json", path]
+
+# ffmpeg command line rendering one frame at `offset` seconds, scaled to THUMBNAIL_WIDTH
+def thumbnail_command(source_path: str, output_path: str, offset: float) -> list[str]:
+    stream = (
+        ffmpeg.input(source_path, ss=round(offset, 3))
+        .filter("scale", THUMBNAIL_WIDTH, -2)
+        .output(output_path, vframes=1)
+    )
+    return stream.overwrite_output().compile(cmd=FFMPEG_BINARY)
+
+
+def to_number(value, kind):
+    try:
+        return kind(float(value))
+    except (TypeError, ValueError):
+        return None
+
+# Column values from ffprobe output; missing fields stay None
+def parse_probe(data: dict) -> dict:
+    streams = data.get("streams", [])
+    container = data.get("format", {})
+    video = next((s for s in streams if s.get("codec_type") == "video"), {})
+    audio = next((s for s in streams if s.get("codec_type") == "audio"), {})
+    return {
+        "duration": to_number(container.get("duration") or video.get("duration"), float),
+        "video_codec": video.get("codec_name"),
+        "audio_codec": audio.get("codec_name"),
+        "width": to_number(video.get("width"), int),
+        "height": to_number(video.get("height"), int),
+        "bitrate": to_number(container.get("bit_rate") or video.get("bit_rate"), int),
+    }
+
+
+# Thumbnails are stored by the video's content hash, so identical videos share one
+def thumbnail_key(content_hash: str) -> str:
+    return f"thumbnails/{content_hash[:2]}/{content_hash[2:4]}/{content_hash}.jpg"
+
+def make_thumbnail(source_path: str, content_hash: str, duration: float) -> str:
+    key = thumbnail_key(content_hash)
+    if storage.exists(key):
+        return storage.location(key)
+    output_path = new_temp_path(".jpg")
+    try:
+        subprocess.run(
+            thumbnail_command(source_path, output_path, (duration or 0) * THUMBNAIL_POSITION),
+            check=True, capture_output=True, timeout=METADATA_TIMEOUT,
+        )
+        return storage.put(output_path, key)
+    finally:
+        if os.path.exists(output_path):
+            os.remove(output_path)
+
+
+# Probe one video and render its thumbnail; returns the column values to store,
+# or None when the file cannot be probed. A failed thumbnail keeps the metadata.
+def extract(video_id: int, path: str, content_hash: str):
+    with storage_for(path).local_copy(path) as local_path:
+        try:
+            result = subprocess.run(
+                probe_command(local_path), check=True, capture_output=True, timeout=METADATA_TIMEOUT,
+            )
+            values = parse_probe(json.loads(result.stdout))
+        except (OSError, subprocess.SubprocessError, ValueError) as e:
+            logger.warning("Probing video %s failed: %s", video_id, e)
+            return None
+        try:
+            values["thumbnail_path"] = make_thumbnail(local_path, content_hash, values["duration"])
+        except (OSError, subprocess.SubprocessError) as e:
+            logger.warning("Thumbnail of video %s failed: %s", video_id, e)
+    return {"id": video_id, **values}
+
+
+# Pool of worker threads probing videos after upload, off the request path.
+# Each worker takes up to METADATA_BATCH_SIZE queued videos and writes their
+# results back with one executemany UPDATE in a single transaction; probed
+# videos then go on to packaging, which needs the source height.
+class MetadataQueue:
+    def __init__(self, concurrency: int = METADATA_CONCURRENCY, batch_size: int = METADATA_BATCH_SIZE,
+                 batch_wait: float = METADATA_BATCH_WAIT, handler=extract):
+        self.concurrency = concurrency
+        self.batch_size = batch_size
+        self.batch_wait = batch_wait
+        self.handler = handler
+        self.jobs = queue.Queue()
+        self.workers = []
+        self.lock = threading.Lock()
+
+    def start(self):
+        with self.lock:
+            while len(self.workers) < self.concurrency:
+                worker = threading.Thread(target=self.run, name=f"metadata-{len(self.workers)}", daemon=True)
+                worker.start()
+                self.workers.append(worker)
+
+    def submit(self, video_id: int, path: str, content_hash: str):
+        if not METADATA_ENABLED:
+            return
+        self.start()
+        self.jobs.put((video_id, path, content_hash))
+
+    def pending(self) -> int:
+        return self.jobs.qsize()
+
+    # Wait for one job, then take whatever else arrives within batch_wait
+    def collect(self) -> list:
+        batch = [self.jobs.get()]
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self.jobs.get(timeout=self.batch_wait))
+            except queue.Empty:
+                break
+        return batch
+
+    def run(self):
+        while True:
+            batch = self.collect()
+            rows, sources = [], {}
+            for video_id, path, content_hash in batch:
+                try:
+                    values = self.handler(video_id, path, content_hash)
+                except Exception:
+                    logger.exception("Metadata worker crashed on video %s", video_id)
+                    values = None
+                if values:
+                    rows.append(values)
+                    sources[video_id] = (path, content_hash)
+            try:
+                if rows:
+                    with SessionLocal() as db:
+                        db.execute(update(Video), rows)
+                        db.commit()
+                    for values in rows:
+                        packaging_queue.submit(values["id"], *sources[values["id"]],
+                                               values["height"], values["audio_codec"] is not None)
+            except Exception:
+                logger.exception("Storing metadata of %s videos failed", len(rows))
+            finally:
+                for _ in batch:
+                    self.jobs.task_done()
+
+
+metadata_queue = MetadataQueue()
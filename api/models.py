@@ -1,8 +1,15 @@
-from sqlalchemy import create_engine, Column, Integer, String, Float, Boolean
-from sqlalchemy.orm import declarative_base
+from sqlalchemy import create_engine, event, inspect, Column, Integer, String, Float, Boolean
+from sqlalchemy.orm import declarative_base, configure_mappers
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 from sqlalchemy.orm import sessionmaker
-
-DATABASE_URL = "sqlite:///./videos.db"
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from .search_index import ensure_search_index, has_search_index
+from .metrics import instrument_engine
+from .config import (
+    DATABASE_URL, ASYNC_DATABASE_URL, DB_CREATE_SCHEMA,
+    DB_POOL_SIZE, DB_MAX_OVERFLOW, DB_POOL_TIMEOUT, DB_POOL_RECYCLE,
+    SQLITE_JOURNAL_MODE, SQLITE_SYNCHRONOUS, SQLITE_MMAP_SIZE, SQLITE_CACHE_SIZE, SQLITE_BUSY_TIMEOUT,
+)
 
 Base = declarative_base()
 
@@ -23,12 +30,104 @@ class Video(Base):
 
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String, index=True)
-    size = Column(Float)
+    size = Column(Float, index=True)
     path = Column(String)
     is_blocked = Column(Integer, default=0)  
+    content_hash = Column(String, index=True)
+    # Processing state: queued, processing, ready or failed
+    status = Column(String, default="ready", server_default="ready", index=True)
+    status_detail = Column(String)
+    # Filled in by the metadata workers once the video is ready (see media_info)
+    duration = Column(Float, index=True)
+    video_codec = Column(String, index=True)
+    audio_codec = Column(String)
+    width = Column(Integer, index=True)
+    height = Column(Integer, index=True)
+    bitrate = Column(Integer, index=True)
+    thumbnail_path = Column(String)
+
+
+# A stored file, shared by every video with the same content hash (see blob_store)
+class Blob(Base):
+    __tablename__ = "blobs"
+
+    content_hash = Column(String, primary_key=True)
+    path = Column(String, nullable=False)
+    size = Column(Integer)
+    # Videos pointing at this file; it is deleted when the count drops to zero
+    ref_count = Column(Integer, nullable=False, default=0)
+
+
+# Set up the ORM mappings now rather than on the first query, so it happens once in a
+# preloaded app instead of in every worker's first request
+configure_mappers()
+
+
+# Add columns and indexes introduced after a table was first created
+def migrate_schema(bind):
+    inspector = inspect(bind)
+    for table in Base.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+        existing = {column["name"] for column in inspector.get_columns(table.name)}
+        with bind.begin() as conn:
+            for column in table.columns:
+                if column.name not in existing:
+                    column_type = column.type.compile(dialect=bind.dialect)
+                    ddl = f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}"
+                    if column.server_default is not None:
+                        ddl += f" DEFAULT '{column.server_default.arg}'"
+                    conn.exec_driver_sql(ddl)
+            for index in table.indexes:
+                index.create(bind=conn, checkfirst=True)
+
+# Bring the schema up to date; returns whether search can use the FTS index
+def init_schema(bind) -> bool:
+    Base.metadata.create_all(bind=bind)
+    migrate_schema(bind)
+    return ensure_search_index(bind)
+
+SQLITE_PRAGMAS = {
+    "busy_timeout": SQLITE_BUSY_TIMEOUT,
+    "journal_mode": SQLITE_JOURNAL_MODE,
+    "synchronous": SQLITE_SYNCHRONOUS,
+    "mmap_size": SQLITE_MMAP_SIZE,
+    "cache_size": SQLITE_CACHE_SIZE,
+}
+
+# Apply the SQLite performance profile to every connection an engine opens
+def use_sqlite_profile(sync_engine):
+    if sync_engine.dialect.name != "sqlite":
+        return
+
+    @event.listens_for(sync_engine, "connect")
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for pragma, value in SQLITE_PRAGMAS.items():
+            if value:
+                cursor.execute(f"PRAGMA {pragma}={value}")
+        cursor.close()
 
 # Create the database
 engine = create_engine(DATABASE_URL)
-Base.metadata.create_all(bind=engine)
+use_sqlite_profile(engine)
+instrument_engine(engine)
+# Schema changes take the database's write lock, so workers starting together would queue on it.
+# Servers that fork workers from a preloaded app do this once (see api.server); DB_CREATE_SCHEMA=0 skips it.
+SEARCH_INDEX_ENABLED = init_schema(engine) if DB_CREATE_SCHEMA else has_search_index(engine)
 
+# Synchronous sessions, used by background workers running in threads
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+# Async engine and sessions used by request handlers (one session per request)
+async_engine = create_async_engine(
+    ASYNC_DATABASE_URL,
+    poolclass=AsyncAdaptedQueuePool,
+    pool_size=DB_POOL_SIZE,
+    max_overflow=DB_MAX_OVERFLOW,
+    pool_timeout=DB_POOL_TIMEOUT,
+    pool_recycle=DB_POOL_RECYCLE,
+)
+use_sqlite_profile(async_engine.sync_engine)
+instrument_engine(async_engine.sync_engine)
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
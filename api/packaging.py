@@ -0,0 +1,219 @@
+import os
+import uuid
+import shutil
+import logging
+import mimetypes
+import queue
+import subprocess
+import threading
+from typing import NamedTuple
+import ffmpeg
+from .storage import storage_for
+from .local_cache import TTLCache, MISSING
+from .config import (
+    PACKAGING_ENABLED, PACKAGING_CONCURRENCY, PACKAGING_TIMEOUT, FFMPEG_BINARY, HLS_DIR,
+    HLS_RENDITIONS, HLS_SEGMENT_SECONDS, HLS_INDEX_SIZE, HLS_INDEX_TTL,
+    TRANSCODE_VIDEO_CODEC, TRANSCODE_AUDIO_CODEC, TRANSCODE_PRESET,
+)
+
+logger = logging.getLogger(__name__)
+
+# Not every platform's mime table knows the HLS types
+mimetypes.add_type("application/vnd.apple.mpegurl", ".m3u8")
+mimetypes.add_type("video/mp2t", ".ts")
+
+MASTER_PLAYLIST = "master.m3u8"
+MEDIA_PLAYLIST = "index.m3u8"
+
+
+# "1080:5000,720:2800" -> [(1080, 5000), (720, 2800)], tallest first
+def parse_renditions(spec: str) -> list[tuple[int, int]]:
+    renditions = []
+    for item in spec.split(","):
+        if item.strip():
+            height, kbps = item.split(":")
+            renditions.append((int(height), int(kbps)))
+    return sorted(renditions, reverse=True)
+
+RENDITIONS = parse_renditions(HLS_RENDITIONS)
+
+# Renditions no taller than the source; the smallest one is always kept
+def renditions_for(height) -> list[tuple[int, int]]:
+    if not height:
+        return RENDITIONS
+    fitting = [r for r in RENDITIONS if r[0] <= height]
+    return fitting or RENDITIONS[-1:]
+
+
+# Packages are stored by the video's content hash, so identical videos share one
+def package_dir(content_hash: str) -> str:
+    return os.path.join(HLS_DIR, content_hash[:2], content_hash[2:4], content_hash)
+
+# ffmpeg command line encoding every rendition in one pass, with keyframes forced on
+# segment boundaries so all renditions switch cleanly. Rendition i goes to v<i>/.
+def package_command(source_path: str, output_dir: str, renditions: list, has_audio: bool) -> list[str]:
+    source = ffmpeg.input(source_path)
+    split = source.video.filter_multi_output("split", len(renditions))
+    streams, options, stream_map = [], {}, []
+    for index, (height, kbps) in enumerate(renditions):
+        streams.append(split[index].filter("scale", -2, height))
+        options[f"b:v:{index}"] = f"{kbps}k"
+        if has_audio:
+            streams.append(source.audio)
+            stream_map.append(f"v:{index},a:{index}")
+        else:
+            stream_map.append(f"v:{index}")
+    if has_audio:
+        options["acodec"] = TRANSCODE_AUDIO_CODEC
+    stream = ffmpeg.output(
+        *streams,
+        os.path.join(output_dir, "v%v", MEDIA_PLAYLIST),
+        vcodec=TRANSCODE_VIDEO_CODEC,
+        preset=TRANSCODE_PRESET,
+        force_key_frames=f"expr:gte(t,n_forced*{HLS_SEGMENT_SECONDS})",
+        f="hls",
+        hls_time=HLS_SEGMENT_SECONDS,
+        hls_playlist_type="vod",
+        hls_segment_filename=os.path.join(output_dir, "v%v", "seg_%05d.ts"),
+        master_pl_name=MASTER_PLAYLIST,
+        var_stream_map=" ".join(stream_map),
+        **options,
+    )
+    return stream.overwrite_output().compile(cmd=FFMPEG_BINARY)
+
+
+# Write the package to a scratch directory and rename it into place, so readers
+# never see a half-written package. Packages are immutable once in place.
+def package(video_id: int, path: str, content_hash: str, height=None, has_audio: bool = True):
+    target = package_dir(content_hash)
+    if os.path.exists(target):
+        return target
+    scratch = os.path.join(HLS_DIR, ".tmp", uuid.uuid4().hex)
+    os.makedirs(scratch)
+    try:
+        with storage_for(path).local_copy(path) as local_path:
+            subprocess.run(
+                package_command(local_path, scratch, renditions_for(height), has_audio),
+                check=True, capture_output=True, timeout=PACKAGING_TIMEOUT,
+            )
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        try:
+            os.rename(scratch, target)
+        except OSError:
+            # Another worker packaged the same content first
+            if not os.path.exists(target):
+                raise
+    except (OSError, subprocess.SubprocessError) as e:
+        stderr = getattr(e, "stderr", None)
+        detail = stderr.decode(errors="replace")[-500:] if stderr else str(e)
+        logger.warning("Packaging video %s failed: %s", video_id, detail)
+        return None
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+    return target
+
+
+# One packaged video: playlist texts and the segment names each rendition may serve
+class Package(NamedTuple):
+    root: str
+    master: str
+    playlists: dict
+    segments: dict
+
+# Media lines of a playlist, i.e. everything that is not a tag or blank
+def playlist_entries(text: str) -> list[str]:
+    return [line.strip() for line in text.splitlines() if line.strip() and not line.startswith("#")]
+
+def load_package(content_hash: str):
+    root = package_dir(content_hash)
+    try:
+        with open(os.path.join(root, MASTER_PLAYLIST)) as master_file:
+            master = master_file.read()
+        playlists, segments = {}, {}
+        for entry in playlist_entries(master):
+            rendition = entry.split("/")[0]
+            with open(os.path.join(root, rendition, MEDIA_PLAYLIST)) as playlist_file:
+                playlists[rendition] = playlist_file.read()
+            segments[rendition] = frozenset(playlist_entries(playlists[rendition]))
+    except (OSError, ValueError):
+        return None
+    # Rendition playlists are served below the hash, so the master points there
+    lines = [f"{content_hash}/{line}" if line.strip() and not line.startswith("#") else line
+             for line in master.splitlines()]
+    return Package(root, "\n".join(lines) + "\n", playlists, segments)
+
+
+# Parsed packages by content hash. Packages never change once written, so entries
+# only leave by LRU eviction; missing packages are not cached, since one may appear
+# at any moment.
+class ManifestIndex:
+    def __init__(self, maxsize: int = HLS_INDEX_SIZE):
+        self.packages = TTLCache(maxsize, float("inf"))
+
+    def get(self, content_hash: str):
+        found = self.packages.get(content_hash)
+        if found is MISSING:
+            found = load_package(content_hash)
+            if found is not None:
+                self.packages.set(content_hash, found)
+        return found
+
+    # Path of a segment listed in the package's playlists, or None; names are
+    # checked against the index, so request paths never reach the filesystem
+    def segment_path(self, content_hash: str, rendition: str, name: str):
+        found = self.get(content_hash)
+        if found is None or name not in found.segments.get(rendition, ()):
+            return None
+        return os.path.join(found.root, rendition, name)
+
+    def clear(self):
+        self.packages.clear()
+
+    def stats(self) -> dict:
+        return self.packages.stats()
+
+
+manifest_index = ManifestIndex()
+
+# video id -> content hash it was last seen with, so segment requests skip the database.
+# Short-lived: a transcode moves the video to a new hash.
+video_hashes = TTLCache(HLS_INDEX_SIZE * 10, HLS_INDEX_TTL)
+
+
+# Pool of worker threads packaging probed videos, off the request path
+class PackagingQueue:
+    def __init__(self, concurrency: int = PACKAGING_CONCURRENCY, handler=package):
+        self.concurrency = concurrency
+        self.handler = handler
+        self.jobs = queue.Queue()
+        self.workers = []
+        self.lock = threading.Lock()
+
+    def start(self):
+        with self.lock:
+            while len(self.workers) < self.concurrency:
+                worker = threading.Thread(target=self.run, name=f"packaging-{len(self.workers)}", daemon=True)
+                worker.start()
+                self.workers.append(worker)
+
+    def submit(self, video_id: int, path: str, content_hash: str, height=None, has_audio: bool = True):
+        if not PACKAGING_ENABLED:
+            return
+        self.start()
+        self.jobs.put((video_id, path, content_hash, height, has_audio))
+
+    def pending(self) -> int:
+        return self.jobs.qsize()
+
+    def run(self):
+        while True:
+            job = self.jobs.get()
+            try:
+                self.handler(*job)
+            except Exception:
+                logger.exception("Packaging worker crashed on video %s", job[0])
+            finally:
+                self.jobs.task_done()
+
+
+packaging_queue = PackagingQueue()
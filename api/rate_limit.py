@@ -0,0 +1,157 @@
+import math
+import time
+import asyncio
+import threading
+from collections import OrderedDict, Counter
+from fastapi import HTTPException, Request, status
+from .auth import decode_token
+from .redis_service import redis_client, guarded
+from .config import (
+    REDIS_BACKEND, RATE_LIMIT_ENABLED, RATE_LIMIT_TRUST_FORWARDED, RATE_LIMIT_LOCAL_KEYS,
+    DOWNLOAD_BANDWIDTH_LIMIT, DOWNLOAD_BANDWIDTH_BURST,
+)
+
+# Token bucket in one Redis hash, refilled from the server clock so workers need not agree on time.
+# ARGV: rate per second, burst, cost, debt. Without debt a request is refused when the bucket
+# holds less than its cost; with debt it always goes through and the bucket may go negative,
+# which paces bandwidth instead of refusing. Returns {allowed, seconds to wait} (the wait as a
+# string, since Lua numbers come back as integers).
+TOKEN_BUCKET_SCRIPT = """
+local rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local cost = tonumber(ARGV[3])
+local clock = redis.call("TIME")
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local state = redis.call("HMGET", KEYS[1], "tokens", "updated")
+local tokens = tonumber(state[1]) or burst
+local updated = tonumber(state[2]) or now
+tokens = math.min(burst, tokens + math.max(0, now - updated) * rate)
+local allowed = 0
+local wait = 0
+if tokens >= cost or ARGV[4] == "1" then
+    allowed = 1
+    tokens = tokens - cost
+    if tokens < 0 then
+        wait = -tokens / rate
+    end
+else
+    wait = (cost - tokens) / rate
+end
+redis.call("HSET", KEYS[1], "tokens", tokens, "updated", now)
+redis.call("PEXPIRE", KEYS[1], math.ceil((burst + math.max(0, -tokens)) / rate * 1000) + 1000)
+return {allowed, tostring(wait)}
+"""
+
+KEY_PREFIX = "rate_limit:"
+
+
+# The same token buckets in this process, bounded to `maxsize` keys (least recently used dropped)
+class LocalBuckets:
+    def __init__(self, maxsize: int = RATE_LIMIT_LOCAL_KEYS):
+        self.maxsize = maxsize
+        self.buckets = OrderedDict()
+        self.lock = threading.Lock()
+
+    def take(self, key: str, rate: float, burst: float, cost: float = 1, debt: bool = False):
+        now = time.monotonic()
+        with self.lock:
+            tokens, updated = self.buckets.pop(key, (burst, now))
+            tokens = min(burst, tokens + (now - updated) * rate)
+            if tokens >= cost or debt:
+                allowed = True
+                tokens -= cost
+                wait = -tokens / rate if tokens < 0 else 0.0
+            else:
+                allowed = False
+                wait = (cost - tokens) / rate
+            self.buckets[key] = (tokens, now)
+            if len(self.buckets) > self.maxsize:
+                self.buckets.popitem(last=False)
+        return allowed, wait
+
+    def clear(self):
+        with self.lock:
+            self.buckets.clear()
+
+
+# Token buckets in Redis when there is a shared server, in this process otherwise.
+# A Redis error or open breaker falls back to the local buckets, so limits then apply
+# per worker rather than across all of them.
+class RateLimiter:
+    def __init__(self, client=None):
+        self.local = LocalBuckets()
+        self.script = client.register_script(TOKEN_BUCKET_SCRIPT) if client is not None else None
+        self.rejections = Counter()
+
+    # Take `cost` tokens from the bucket `key`; returns (allowed, seconds to wait)
+    async def take(self, key: str, rate: float, burst: float, cost: float = 1, debt: bool = False):
+        if self.script is not None:
+            result = await guarded(
+                lambda: self.script(keys=[KEY_PREFIX + key], args=[rate, burst, cost, int(debt)]),
+                command="rate_limit",
+            )
+            if result is not None:
+                return bool(int(result[0])), float(result[1])
+        return self.local.take(key, rate, burst, cost, debt)
+
+
+# The in-process backends are private to this worker, so the local buckets are the shared ones
+limiter = RateLimiter(redis_client if REDIS_BACKEND == "redis" else None)
+
+
+def client_ip(request: Request) -> str:
+    if RATE_LIMIT_TRUST_FORWARDED:
+        forwarded = request.headers.get("x-forwarded-for")
+        if forwarded:
+            return forwarded.split(",")[0].strip()
+    return request.client.host if request.client else "unknown"
+
+# The user id a valid bearer token names (the same user get_current_user would load),
+# otherwise the client's IP address. Decoded tokens are cached, so this skips the database;
+# invalid or expired tokens count as no token.
+def client_key(request: Request) -> str:
+    authorization = request.headers.get("authorization", "")
+    if authorization[:7].lower() == "bearer ":
+        try:
+            payload = decode_token(authorization[7:])
+        except HTTPException:
+            payload = None
+        if payload and payload.get("sub") is not None:
+            return f"user:{payload['sub']}"
+    return f"ip:{client_ip(request)}"
+
+
+def too_many_requests(wait: float):
+    return HTTPException(
+        status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+        detail="Too many requests, slow down.",
+        headers={"Retry-After": str(max(1, math.ceil(wait)))},
+    )
+
+# Route dependency allowing `rate` requests per second per client, in bursts of up to `burst`.
+# With `per_video`, the bucket is shared by every client requesting the same video instead.
+def rate_limit(name: str, rate: float, burst: int, per_video: bool = False):
+    async def check(request: Request):
+        if not RATE_LIMIT_ENABLED or rate <= 0:
+            return
+        subject = f"video:{request.path_params['video_id']}" if per_video else client_key(request)
+        allowed, wait = await limiter.take(f"{name}:{subject}", rate, burst)
+        if not allowed:
+            limiter.rejections[name] += 1
+            raise too_many_requests(wait)
+    return check
+
+
+# Waits before each chunk of a download so one client's downloads together stay
+# under DOWNLOAD_BANDWIDTH_LIMIT bytes per second; None when shaping is off
+def bandwidth_throttle(request: Request):
+    if not RATE_LIMIT_ENABLED or DOWNLOAD_BANDWIDTH_LIMIT <= 0:
+        return None
+    key = f"bandwidth:{client_key(request)}"
+    burst = max(DOWNLOAD_BANDWIDTH_BURST, 1)
+
+    async def throttle(size: int):
+        _, wait = await limiter.take(key, DOWNLOAD_BANDWIDTH_LIMIT, burst, size, debt=True)
+        if wait > 0:
+            await asyncio.sleep(wait)
+    return throttle
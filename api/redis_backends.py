@@ -0,0 +1,154 @@
+import time
+import redis
+import redis.asyncio
+from .config import (
+    REDIS_URL, REDIS_HOST, REDIS_PORT, REDIS_DB, REDIS_BACKEND,
+    REDIS_MAX_CONNECTIONS, REDIS_SOCKET_TIMEOUT, REDIS_CONNECT_TIMEOUT,
+)
+
+
+# Values come back as bytes, the way redis-py returns them without decode_responses
+def encode_value(value) -> bytes:
+    if isinstance(value, bytes):
+        return value
+    if isinstance(value, bool):
+        value = int(value)
+    return str(value).encode()
+
+
+# In-process stand-in for the subset of the redis.asyncio API the app uses.
+# Keys live in a dict on this process only, so there is nothing to invalidate across workers.
+class MemoryRedis:
+    def __init__(self):
+        self.data = {}
+        self.expires = {}
+
+    def live(self, key) -> bool:
+        expires_at = self.expires.get(key)
+        if expires_at is not None and expires_at <= time.monotonic():
+            self.data.pop(key, None)
+            self.expires.pop(key, None)
+        return key in self.data
+
+    def store(self, key, value, ex=None):
+        self.data[key] = encode_value(value)
+        if ex:
+            self.expires[key] = time.monotonic() + ex
+        else:
+            self.expires.pop(key, None)
+
+    async def ping(self) -> bool:
+        return True
+
+    async def get(self, key):
+        return self.data[key] if self.live(key) else None
+
+    # Seconds left before the key expires: -1 without an expiry, -2 when it does not exist
+    async def ttl(self, key) -> int:
+        if not self.live(key):
+            return -2
+        expires_at = self.expires.get(key)
+        return -1 if expires_at is None else max(0, round(expires_at - time.monotonic()))
+
+    async def mget(self, keys, *args):
+        keys = list(keys) if isinstance(keys, (list, tuple)) else [keys]
+        return [await self.get(key) for key in [*keys, *args]]
+
+    async def set(self, key, value, ex=None, nx=False):
+        if nx and self.live(key):
+            return None
+        self.store(key, value, ex)
+        return True
+
+    async def mset(self, mapping: dict):
+        for key, value in mapping.items():
+            self.store(key, value)
+        return True
+
+    async def delete(self, *keys) -> int:
+        deleted = sum(1 for key in keys if self.live(key))
+        for key in keys:
+            self.data.pop(key, None)
+            self.expires.pop(key, None)
+        return deleted
+
+    async def publish(self, channel, message) -> int:
+        return 0
+
+    async def flushdb(self):
+        self.data.clear()
+        self.expires.clear()
+        return True
+
+    def pipeline(self, transaction: bool = True):
+        return MemoryPipeline(self)
+
+    async def aclose(self):
+        pass
+
+
+# Buffers commands like a redis.asyncio pipeline and runs them on execute()
+class MemoryPipeline:
+    def __init__(self, client: MemoryRedis):
+        self.client = client
+        self.commands = []
+
+    def __getattr__(self, name):
+        command = getattr(self.client, name)
+
+        def buffer(*args, **kwargs):
+            self.commands.append((command, args, kwargs))
+            return self
+        return buffer
+
+    async def execute(self):
+        commands, self.commands = self.commands, []
+        return [await command(*args, **kwargs) for command, args, kwargs in commands]
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self.commands = []
+
+
+def connection_kwargs() -> dict:
+    if REDIS_URL:
+        return {}
+    return {"host": REDIS_HOST, "port": REDIS_PORT, "db": REDIS_DB}
+
+
+# Async client for the configured backend. Connections are opened lazily, so this
+# does no I/O; the blocking pool makes callers wait for a free connection rather
+# than opening more than REDIS_MAX_CONNECTIONS.
+def create_redis_client():
+    if REDIS_BACKEND == "memory":
+        return MemoryRedis()
+    if REDIS_BACKEND == "fakeredis":
+        try:
+            from fakeredis.aioredis import FakeRedis
+        except ImportError as e:
+            raise RuntimeError("REDIS_BACKEND=fakeredis requires the fakeredis package") from e
+        return FakeRedis()
+    if REDIS_BACKEND != "redis":
+        raise ValueError(f"Unknown REDIS_BACKEND {REDIS_BACKEND!r}")
+
+    options = {
+        "max_connections": REDIS_MAX_CONNECTIONS,
+        "timeout": REDIS_CONNECT_TIMEOUT,
+        "socket_timeout": REDIS_SOCKET_TIMEOUT,
+        "socket_connect_timeout": REDIS_CONNECT_TIMEOUT,
+    }
+    if REDIS_URL:
+        pool = redis.asyncio.BlockingConnectionPool.from_url(REDIS_URL, **options)
+    else:
+        pool = redis.asyncio.BlockingConnectionPool(**connection_kwargs(), **options)
+    return redis.asyncio.Redis(connection_pool=pool)
+
+
+# Blocking client for the pub/sub listener thread. No socket timeout, since
+# listen() waits on the socket indefinitely between messages.
+def create_pubsub_client() -> redis.Redis:
+    if REDIS_URL:
+        return redis.Redis.from_url(REDIS_URL, socket_connect_timeout=REDIS_CONNECT_TIMEOUT)
+    return redis.Redis(**connection_kwargs(), socket_connect_timeout=REDIS_CONNECT_TIMEOUT)
@@ -1,16 +1,234 @@
+import os
+import asyncio
+import logging
+import threading
+import time
+import uuid
 import redis
+from .local_cache import TTLCache, MISSING
+from .circuit_breaker import CircuitBreaker
+from .redis_backends import create_redis_client, create_pubsub_client
+from .metrics import record_redis
+from .config import (
+    BLOCK_CACHE_SIZE, BLOCK_CACHE_TTL, BLOCK_CACHE_CHANNEL, BLOCK_STATUS_REDIS_TTL, REDIS_BACKEND,
+    REDIS_BREAKER_THRESHOLD, REDIS_BREAKER_COOLDOWN,
+)
 
-# Connect to the Redis server
-redis_client = redis.Redis(host='localhost', port=6379, db=0)
+logger = logging.getLogger(__name__)
 
-# Helper function to set block status in cache
-def cache_block_status(video_id: int, is_blocked: bool):
-    redis_key = f"video_block_status:{video_id}"
-    redis_client.set(redis_key, int(is_blocked))
+# Async client over a bounded connection pool (or the in-memory stand-in, see REDIS_BACKEND)
+redis_client = create_redis_client()
 
-# Helper function to check block status from cache
-def is_video_blocked(video_id: int) -> bool:
-    redis_key = f"video_block_status:{video_id}"
-    cached_value = redis_client.get(redis_key)
-    # If no cache is found, default to not blocked
-    return cached_value is not None and int(cached_value) == 1
+# Once Redis keeps failing, skip it and answer from the local tier and the database
+redis_breaker = CircuitBreaker(REDIS_BREAKER_THRESHOLD, REDIS_BREAKER_COOLDOWN)
+
+# First tier of the block-status lookup, local to this worker process
+block_status_cache = TTLCache(maxsize=BLOCK_CACHE_SIZE, ttl=BLOCK_CACHE_TTL)
+
+# Identifies this worker in invalidation messages, so it can skip its own
+WORKER_ID = uuid.uuid4().hex
+
+# Where block-status lookups were answered from, and how long they took
+lookup_stats = {"local": 0, "redis": 0, "database": 0, "lookups": 0, "total_seconds": 0.0}
+stats_lock = threading.Lock()
+
+listener_thread = None
+listener_lock = threading.Lock()
+
+# Workers forked from a preloaded app (see api.server) need their own id, or they would
+# ignore each other's invalidations, and their own listener, since threads do not survive a fork
+def reset_after_fork():
+    global WORKER_ID, listener_thread
+    WORKER_ID = uuid.uuid4().hex
+    listener_thread = None
+
+os.register_at_fork(after_in_child=reset_after_fork)
+
+
+def block_status_key(video_id: int) -> str:
+    return f"video_block_status:{video_id}"
+
+# Run a Redis operation (a zero-argument coroutine function) through the circuit breaker.
+# Errors and timeouts are logged and return `default`, so a slow or absent Redis
+# costs at most one socket timeout per call until the breaker opens.
+# Each call is timed under `command` in the metrics.
+async def guarded(operation, default=None, command: str = "command"):
+    if not redis_breaker.allow():
+        record_redis(command, "skipped", 0.0)
+        return default
+    started = time.perf_counter()
+    try:
+        result = await operation()
+    except (redis.RedisError, OSError, asyncio.TimeoutError) as e:
+        record_redis(command, "error", time.perf_counter() - started)
+        redis_breaker.record_failure()
+        logger.warning("Redis unavailable (%s consecutive failures): %s", redis_breaker.failures, e)
+        return default
+    record_redis(command, "ok", time.perf_counter() - started)
+    redis_breaker.record_success()
+    return result
+
+# Videos whose block status could not be written to Redis. Their keys are deleted, and other
+# workers told, once Redis answers again, so lookups fall back to the database rather than
+# to a value from before the change.
+unsynced_ids = set()
+
+# Ids per DEL and per invalidation message when writing many keys at once
+BULK_DELETE_SIZE = 10000
+BULK_PUBLISH_SIZE = 1000
+
+def publish_invalidations(pipe, video_ids: list):
+    for start in range(0, len(video_ids), BULK_PUBLISH_SIZE):
+        chunk = video_ids[start:start + BULK_PUBLISH_SIZE]
+        pipe.publish(BLOCK_CACHE_CHANNEL, f"{WORKER_ID}:{','.join(map(str, chunk))}")
+
+async def sync_failed_writes():
+    if not unsynced_ids:
+        return
+    video_ids = list(unsynced_ids)
+    unsynced_ids.difference_update(video_ids)
+
+    async def delete():
+        pipe = redis_client.pipeline(transaction=False)
+        for start in range(0, len(video_ids), BULK_DELETE_SIZE):
+            pipe.delete(*(block_status_key(video_id) for video_id in video_ids[start:start + BULK_DELETE_SIZE]))
+        publish_invalidations(pipe, video_ids)
+        return await pipe.execute()
+    if await guarded(delete, command="delete_publish") is None:
+        unsynced_ids.update(video_ids)
+
+# Helper function to set block status in cache and tell other workers to drop their copy
+async def cache_block_status(video_id: int, is_blocked: bool):
+    block_status_cache.set(video_id, bool(is_blocked))
+    await sync_failed_writes()
+
+    async def write():
+        pipe = redis_client.pipeline(transaction=False)
+        pipe.set(block_status_key(video_id), int(is_blocked), ex=BLOCK_STATUS_REDIS_TTL)
+        pipe.publish(BLOCK_CACHE_CHANNEL, f"{WORKER_ID}:{video_id}")
+        return await pipe.execute()
+    if await guarded(write, command="set_publish") is None:
+        unsynced_ids.add(video_id)
+
+# Helper function to set the block status of many videos in one round trip.
+# With notify, this worker's local tier is updated and other workers told to drop their copies.
+# With only_missing (fills from the database), keys already present are left alone, since a
+# block or unblock written since the database read is newer.
+async def cache_block_statuses(statuses: dict[int, bool], notify: bool = False, only_missing: bool = False):
+    if not statuses:
+        return
+    video_ids = list(statuses)
+    if notify:
+        for video_id, is_blocked in statuses.items():
+            block_status_cache.set(video_id, bool(is_blocked))
+        await sync_failed_writes()
+
+    async def write():
+        pipe = redis_client.pipeline(transaction=False)
+        for video_id in video_ids:
+            pipe.set(block_status_key(video_id), int(statuses[video_id]), ex=BLOCK_STATUS_REDIS_TTL, nx=only_missing)
+        if notify:
+            publish_invalidations(pipe, video_ids)
+        return await pipe.execute()
+    if await guarded(write, command="set_many_publish" if notify else "set_many") is None and notify:
+        unsynced_ids.update(video_ids)
+
+
+# Background thread evicting local entries when another worker changes a block status.
+# After a dropped subscription the whole local tier is cleared, since messages may be lost.
+# It runs on its own blocking connection, outside the event loop and the async pool.
+# Messages are "<worker id>:<video id>[,<video id>...]".
+def handle_invalidation(data: bytes):
+    sender, _, video_ids = data.decode().partition(":")
+    if sender != WORKER_ID:
+        for video_id in video_ids.split(","):
+            block_status_cache.delete(int(video_id))
+
+def listen_for_invalidations():
+    client = create_pubsub_client()
+    while True:
+        try:
+            pubsub = client.pubsub(ignore_subscribe_messages=True)
+            pubsub.subscribe(BLOCK_CACHE_CHANNEL)
+            block_status_cache.clear()
+            for message in pubsub.listen():
+                handle_invalidation(message["data"])
+        except (redis.RedisError, OSError, ValueError) as e:
+            logger.warning("Block-status invalidation listener reconnecting: %s", e)
+            block_status_cache.clear()
+            time.sleep(1)
+
+# The in-process backends are private to this worker, so there is nothing to listen to
+def start_invalidation_listener():
+    global listener_thread
+    if REDIS_BACKEND != "redis":
+        return
+    with listener_lock:
+        if listener_thread is None:
+            listener_thread = threading.Thread(
+                target=listen_for_invalidations, name="block-cache-invalidation", daemon=True
+            )
+            listener_thread.start()
+
+
+def record_lookup(tier: str, started: float):
+    with stats_lock:
+        lookup_stats[tier] += 1
+        lookup_stats["lookups"] += 1
+        lookup_stats["total_seconds"] += time.perf_counter() - started
+
+# Helper function to check block status: local cache, then Redis, then the database.
+# load_from_db is an async callable returning the stored flag, or None for an unknown video.
+async def is_video_blocked(video_id: int, load_from_db=None) -> bool:
+    started = time.perf_counter()
+    start_invalidation_listener()
+
+    is_blocked = block_status_cache.get(video_id)
+    if is_blocked is not MISSING:
+        record_lookup("local", started)
+        return is_blocked
+
+    # Redis errors and an open breaker count as a miss
+    await sync_failed_writes()
+    cached_value = await guarded(lambda: redis_client.get(block_status_key(video_id)), command="get")
+    if cached_value is not None:
+        is_blocked = int(cached_value) == 1
+        block_status_cache.set(video_id, is_blocked)
+        record_lookup("redis", started)
+        return is_blocked
+
+    # Cold or flushed Redis: the database is the source of truth
+    stored = await load_from_db() if load_from_db else None
+    is_blocked = bool(stored)
+    if stored is not None:
+        key = block_status_key(video_id)
+        # NX, so this fill never replaces a status written by a block or unblock since the read;
+        # when one got there first, its value is the newer answer
+        if not await guarded(lambda: redis_client.set(key, int(is_blocked), ex=BLOCK_STATUS_REDIS_TTL, nx=True), command="set"):
+            cached_value = await guarded(lambda: redis_client.get(key), command="get")
+            if cached_value is not None:
+                is_blocked = int(cached_value) == 1
+        block_status_cache.set(video_id, is_blocked)
+    record_lookup("database", started)
+    return is_blocked
+
+
+def block_cache_stats() -> dict:
+    with stats_lock:
+        stats = dict(lookup_stats)
+    lookups = stats["lookups"]
+    return {
+        "lookups": lookups,
+        "local_hits": stats["local"],
+        "redis_hits": stats["redis"],
+        "database_fallbacks": stats["database"],
+        "local_hit_rate": stats["local"] / lookups if lookups else 0.0,
+        "cache_hit_rate": (stats["local"] + stats["redis"]) / lookups if lookups else 0.0,
+        "avg_lookup_us": stats["total_seconds"] / lookups * 1e6 if lookups else 0.0,
+        "local_cache": block_status_cache.stats(),
+        "redis": {"backend": REDIS_BACKEND, **redis_breaker.stats()},
+    }
+
+
+async def close_redis():
+    await redis_client.aclose()
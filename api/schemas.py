@@ -1,4 +1,5 @@
-from pydantic import BaseModel, EmailStr, Field,ConfigDict
+from pydantic import BaseModel, EmailStr, Field,ConfigDict, model_validator
+from .config import BULK_BLOCK_MAX_IDS
 
 # Schema for Video create 
 class VideoCreate(BaseModel):
@@ -12,9 +13,52 @@ class VideoResponse(BaseModel):
     size: float
     path: str
     is_blocked: int
+    content_hash: str | None = None
+    status: str | None = None
+    status_detail: str | None = None
+    duration: float | None = None
+    video_codec: str | None = None
+    audio_codec: str | None = None
+    width: int | None = None
+    height: int | None = None
+    bitrate: int | None = None
+    thumbnail_path: str | None = None
 
     model_config = ConfigDict(from_attributes=True)
 
+# Schema for block/unblock responses; data is None when the video does not exist
+class VideoStatusResponse(BaseModel):
+    status: bool
+    data: VideoResponse | None
+
+# Schema for a search result row: with `fields`, rows carry only the requested columns, so none is required
+class VideoSearchRow(VideoResponse):
+    id: int | None = None
+    name: str | None = None
+    size: float | None = None
+    path: str | None = None
+    is_blocked: int | None = None
+
+# Schema for search responses
+class SearchResponse(BaseModel):
+    status: bool
+    data: list[VideoSearchRow]
+    next_cursor: int | None
+
+# Schema for a freshly uploaded video
+class UploadedVideo(BaseModel):
+    id: int
+    name: str
+    size: float
+    path: str
+    is_blocked: int
+    content_hash: str | None
+    processing_status: str
+
+class UploadResponse(BaseModel):
+    status: bool
+    data: UploadedVideo
+
 # Schema for Token data access
 class TokenData(BaseModel):
     username: str | None = None
@@ -38,4 +82,43 @@ class Token(BaseModel):
 # Schema for user login
 class UserLogin(BaseModel):
     username: str
-    password: str
\ No newline at end of file
+    password: str
+
+# Schema for starting a resumable upload session
+class UploadSessionCreate(BaseModel):
+    filename: str
+
+# Search filter selecting the videos of a bulk block/unblock; same meaning as the /search/ parameters
+class BulkBlockFilter(BaseModel):
+    name: str | None = None
+    size: float | None = None
+    codec: str | None = None
+    min_size: float | None = Field(None, ge=0)
+    max_size: float | None = Field(None, ge=0)
+    min_duration: float | None = Field(None, ge=0)
+    max_duration: float | None = Field(None, ge=0)
+    min_width: int | None = Field(None, ge=0)
+    max_width: int | None = Field(None, ge=0)
+    min_height: int | None = Field(None, ge=0)
+    max_height: int | None = Field(None, ge=0)
+    min_bitrate: int | None = Field(None, ge=0)
+    max_bitrate: int | None = Field(None, ge=0)
+    cursor: int | None = Field(None, ge=0)
+
+    @model_validator(mode="after")
+    def require_criterion(self):
+        criteria = self.model_dump(exclude={"cursor"}, exclude_none=True)
+        if not any(criteria.values()) and not any(key.startswith(("min_", "max_")) for key in criteria):
+            raise ValueError("filter needs at least one search criterion")
+        return self
+
+# Schema for bulk block/unblock: a list of ids or a filter, not both
+class BulkBlockRequest(BaseModel):
+    ids: list[int] | None = Field(None, min_length=1, max_length=BULK_BLOCK_MAX_IDS)
+    filter: BulkBlockFilter | None = None
+
+    @model_validator(mode="after")
+    def require_ids_or_filter(self):
+        if (self.ids is None) == (self.filter is None):
+            raise ValueError("give either ids or filter")
+        return self
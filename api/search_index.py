@@ -0,0 +1,70 @@
+import logging
+from sqlalchemy import text, Integer
+from sqlalchemy.exc import OperationalError
+
+logger = logging.getLogger(__name__)
+
+# Search terms shorter than a trigram cannot use the FTS index
+MIN_FTS_TERM_LENGTH = 3
+
+# External-content FTS5 table over videos.name with the trigram tokenizer, so any
+# substring of three or more characters is an index lookup instead of a LIKE scan.
+# Triggers keep it in step with the videos table.
+SEARCH_INDEX_DDL = [
+    """CREATE VIRTUAL TABLE videos_fts USING fts5(
+        name, content='videos', content_rowid='id', tokenize='trigram'
+    )""",
+    """CREATE TRIGGER IF NOT EXISTS videos_fts_insert AFTER INSERT ON videos BEGIN
+        INSERT INTO videos_fts(rowid, name) VALUES (new.id, new.name);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS videos_fts_delete AFTER DELETE ON videos BEGIN
+        INSERT INTO videos_fts(videos_fts, rowid, name) VALUES ('delete', old.id, old.name);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS videos_fts_update AFTER UPDATE OF name ON videos BEGIN
+        INSERT INTO videos_fts(videos_fts, rowid, name) VALUES ('delete', old.id, old.name);
+        INSERT INTO videos_fts(rowid, name) VALUES (new.id, new.name);
+    END""",
+    # Index existing rows once, when the table is first created
+    "INSERT INTO videos_fts(videos_fts) VALUES ('rebuild')",
+]
+
+
+def search_index_exists(conn) -> bool:
+    return conn.exec_driver_sql(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'videos_fts'"
+    ).first() is not None
+
+# Create the search index if needed; returns False when the database cannot host it
+# (not SQLite, or SQLite older than 3.34 without the trigram tokenizer)
+def ensure_search_index(bind) -> bool:
+    if bind.dialect.name != "sqlite":
+        return False
+    try:
+        with bind.begin() as conn:
+            if not search_index_exists(conn):
+                for statement in SEARCH_INDEX_DDL:
+                    conn.exec_driver_sql(statement)
+    except OperationalError as e:
+        logger.warning("Full-text search index unavailable, falling back to LIKE scans: %s", e)
+        return False
+    return True
+
+# Whether an earlier ensure_search_index created the index, without changing the schema
+def has_search_index(bind) -> bool:
+    if bind.dialect.name != "sqlite":
+        return False
+    with bind.connect() as conn:
+        return search_index_exists(conn)
+
+
+# Quote a user search term as an FTS5 phrase so its characters are matched literally
+def fts_phrase(term: str) -> str:
+    return '"' + term.replace('"', '""') + '"'
+
+
+# Subquery of the rowids of videos whose name contains the term, in rowid order.
+# The keyset bound is applied inside the FTS query so FTS5 can skip straight to it.
+def fts_matches(term: str, after_id: int = 0):
+    return text(
+        "SELECT rowid FROM videos_fts WHERE videos_fts MATCH :phrase AND rowid > :after_id"
+    ).bindparams(phrase=fts_phrase(term), after_id=after_id).columns(rowid=Integer).subquery("fts")
@@ -0,0 +1,14 @@
+from .models import Video
+
+VIDEO_COLUMNS = [column.name for column in Video.__table__.columns]
+
+
+# Result rows as dicts keyed by column name, built from the plain tuples the driver
+# returns; skips the RowMapping and ORM identity-map layers, and orjson encodes the
+# dicts without a jsonable_encoder or pydantic pass
+def rows_as_dicts(keys: list[str], rows) -> list[dict]:
+    return [dict(zip(keys, row)) for row in rows]
+
+# Column values of one loaded video
+def video_as_dict(video) -> dict:
+    return {column: getattr(video, column) for column in VIDEO_COLUMNS}
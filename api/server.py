@@ -0,0 +1,139 @@
+import os
+import time
+import signal
+import logging
+import argparse
+import uvicorn
+from .config import SERVER_HOST, SERVER_PORT, SERVER_WORKERS, SHUTDOWN_TIMEOUT
+
+logger = logging.getLogger(__name__)
+
+# Production entry point: python -m api.server [--workers N]
+#
+# The app is imported once, here, with the schema brought up to date (unless DB_CREATE_SCHEMA=0).
+# The workers are then forked from this process and share its listening socket, so they start
+# without importing anything or touching the schema. Each worker opens its own database and Redis
+# connections in the app's lifespan. On SIGTERM or SIGINT every worker stops accepting connections,
+# finishes its in-flight requests (for up to SHUTDOWN_TIMEOUT seconds) and closes its connections.
+
+
+# CPU cores this process may run on, which can be fewer than the machine has
+def available_cores() -> int:
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+# A worker drains on the first stop signal and ignores the rest: uvicorn would otherwise cut the
+# drain short when Ctrl-C reaches the worker both from the terminal and from the supervisor.
+# A second signal to the supervisor kills the workers instead.
+class WorkerServer(uvicorn.Server):
+    def handle_exit(self, sig, frame):
+        self.should_exit = True
+
+
+# Forks the workers, replaces any that die, and relays stop signals to them
+class Supervisor:
+    def __init__(self, config: uvicorn.Config, workers: int):
+        self.config = config
+        self.workers = workers
+        self.socket = config.bind_socket()
+        self.children = set()
+        self.stopping = False
+
+    # `requeue`: whether this worker resubmits the transcodes left unfinished by the last run
+    def spawn(self, requeue: bool = False):
+        pid = os.fork()
+        if pid:
+            self.children.add(pid)
+            return
+        code = 1
+        try:
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            signal.signal(signal.SIGINT, signal.SIG_DFL)
+            from . import transcoder
+            transcoder.requeue_on_startup = requeue and transcoder.requeue_on_startup
+            server = WorkerServer(self.config)
+            server.run(sockets=[self.socket])
+            code = 0 if server.started else 1
+        except BaseException:
+            logger.exception("Worker %s failed", os.getpid())
+        finally:
+            os._exit(code)
+
+    def stop(self, signum, frame):
+        if self.stopping:
+            logger.warning("Killing %s workers", len(self.children))
+            self.signal_children(signal.SIGKILL)
+            return
+        self.stopping = True
+        logger.info("Stopping %s workers", len(self.children))
+        self.signal_children(signal.SIGTERM)
+
+    def signal_children(self, signum: int):
+        for pid in list(self.children):
+            try:
+                os.kill(pid, signum)
+            except ProcessLookupError:
+                pass
+
+    def run(self):
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+        for number in range(self.workers):
+            self.spawn(requeue=number == 0)
+        logger.info("Started %s workers on %s:%s", self.workers, self.config.host, self.config.port)
+        while self.children:
+            try:
+                pid, wait_status = os.wait()
+            except ChildProcessError:
+                break
+            self.children.discard(pid)
+            if not self.stopping:
+                logger.warning("Worker %s exited with %s, starting another", pid, os.waitstatus_to_exitcode(wait_status))
+                # Don't spin when workers die at startup
+                time.sleep(1)
+                if not self.stopping:
+                    self.spawn()
+        self.socket.close()
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Serve the API with worker processes forked from one preloaded app.")
+    parser.add_argument("--host", default=SERVER_HOST)
+    parser.add_argument("--port", type=int, default=SERVER_PORT)
+    parser.add_argument("--workers", type=int, default=SERVER_WORKERS or available_cores(),
+                        help="worker processes (default: SERVER_WORKERS, or one per available core)")
+    parser.add_argument("--log-level", default="info")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    logging.basicConfig(level=args.log_level.upper(), format="%(levelname)s:     %(message)s")
+    options = {"host": args.host, "port": args.port, "log_level": args.log_level, "lifespan": "on",
+               "timeout_graceful_shutdown": SHUTDOWN_TIMEOUT}
+
+    if args.workers > 1 and not hasattr(os, "fork"):
+        # No fork (Windows): uvicorn spawns the workers, and each imports the app itself.
+        # None of them can tell it is the first, so unfinished transcodes are not requeued.
+        os.environ["TRANSCODE_REQUEUE_ON_START"] = "0"
+        uvicorn.run("api.main:app", workers=args.workers, **options)
+        return
+
+    from .main import app
+    from .models import engine
+
+    config = uvicorn.Config(app, **options)
+    if args.workers <= 1:
+        uvicorn.Server(config).run()
+        return
+    # Forked workers must not share the connections the schema check opened
+    engine.dispose()
+    config.load()
+    Supervisor(config, args.workers).run()
+
+
+if __name__ == "__main__":
+    main()
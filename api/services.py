@@ -1,64 +1,159 @@
 import os
-import shutil
+import hashlib
 import aiofiles
 import random
 import string   
-from fastapi import UploadFile, File, status
+from fastapi import UploadFile, status
+from functools import partial
+from sqlalchemy import select, update
 from sqlalchemy.orm import Session
-from .models import Video, SessionLocal
-from .schemas import VideoCreate
-from fastapi import UploadFile, File, HTTPException
-from .redis_service import cache_block_status, is_video_blocked
+from sqlalchemy.ext.asyncio import AsyncSession
+from .models import Video, SEARCH_INDEX_ENABLED
+from .search_index import fts_matches, MIN_FTS_TERM_LENGTH
+from fastapi import HTTPException
+from .redis_service import cache_block_status, cache_block_statuses
+from .config import UPLOAD_CHUNK_SIZE, UPLOAD_MAX_SIZE, TRANSCODE_ENABLED, BULK_BLOCK_BATCH_SIZE, BULK_BLOCK_MAX_IDS
+from .transcoder import transcode_queue
+from .media_info import metadata_queue
+from .write_queue import write_batcher
+from .blob_store import add_blob, stage_blob
+from .storage import storage, new_temp_path
+from .edge_cache import edge_cache
+from .serialization import rows_as_dicts
+from starlette.concurrency import run_in_threadpool
+
+# Columns a search may return, and the default page size
+SEARCH_FIELDS = [column.name for column in Video.__table__.columns]
+SEARCH_PAGE_SIZE = 50
+SEARCH_MAX_PAGE_SIZE = 1000
+
+# Columns a search can bound with min_<name> / max_<name>
+RANGE_FILTERS = {
+    "size": Video.size,
+    "duration": Video.duration,
+    "width": Video.width,
+    "height": Video.height,
+    "bitrate": Video.bitrate,
+}
+
 def generate_unique_string(length: int) -> str:
     characters = string.ascii_letters + string.digits  # Character set: a-z, A-Z, 0-9
     unique_string = ''.join(random.choices(characters, k=length))
     return unique_string
 
+def raise_upload_too_large():
+    raise HTTPException(
+        status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+        detail=f"Upload exceeds the maximum size of {UPLOAD_MAX_SIZE} bytes."
+    )
+
+# Write an upload to disk in fixed-size chunks so memory stays constant,
+# returning the number of bytes written and their sha256 hex digest
+async def write_upload_stream(file: UploadFile, file_path: str, chunk_size: int = UPLOAD_CHUNK_SIZE):
+    digest = hashlib.sha256()
+    file_size = 0
+    try:
+        async with aiofiles.open(file_path, "wb") as buffer:
+            while chunk := await file.read(chunk_size):
+                file_size += len(chunk)
+                if UPLOAD_MAX_SIZE and file_size > UPLOAD_MAX_SIZE:
+                    raise_upload_too_large()
+                digest.update(chunk)
+                await buffer.write(chunk)
+    except BaseException:
+        # Never leave partial files behind
+        if os.path.exists(file_path):
+            os.remove(file_path)
+        raise
+    return file_size, digest.hexdigest()
+
+# Write job for the batched writer: flip the block flag of one video
+def update_block_status(db: Session, video_id: int, is_blocked: bool) -> bool:
+    result = db.execute(update(Video).where(Video.id == video_id).values(is_blocked=int(is_blocked)))
+    return result.rowcount > 0
+
 class VideoService:
-    def __init__(self):
-        self.db = SessionLocal()
+    def __init__(self, db: AsyncSession):
+        self.db = db
 
-    async def upload_video(self, file: UploadFile):
-        unique_string = generate_unique_string(5)
-        filename = f"{file.filename}{unique_string}"
-        file_path = f"uploads/{filename}"
+    async def upload_video(self, file: UploadFile, priority: int = 0):
+        # Reject early when the parsed upload is already known to be too large
+        if UPLOAD_MAX_SIZE and file.size is not None and file.size > UPLOAD_MAX_SIZE:
+            raise_upload_too_large()
 
-        # Save the video file asynchronously
-        async with aiofiles.open(file_path, "wb") as buffer:
-            await buffer.write(await file.read())
+        # Stream the video to a temp file chunk by chunk, computing size and hash on the way
+        temp_file = new_temp_path()
+        file_size, content_hash = await write_upload_stream(file, temp_file)
 
-        # Simulate conversion to .mp4 (you should implement actual conversion logic)
-        mp4_path = f"uploads/{filename}.mp4"
-        os.rename(file_path, mp4_path)
-        
-        # Get the file size
-        file_size = os.path.getsize(mp4_path)
+        return await self.create_video(file.filename, temp_file, file_size, content_hash, priority)
 
-        # Create a video record in the database
-        video = Video(name=filename, size=file_size, path=mp4_path)
+    # Create a video record for a just-written temp file and queue its conversion to .mp4.
+    # The file moves into content-addressed storage, or is dropped when the same content is stored already.
+    async def create_video(self, name: str, temp_file: str, size: int, content_hash: str, priority: int = 0):
+        staged = await run_in_threadpool(stage_blob, temp_file, content_hash) if storage.remote else False
+        path = await self.db.run_sync(add_blob, temp_file, content_hash, size, staged)
+        video = Video(
+            name=name, size=size, path=path, content_hash=content_hash,
+            status="queued" if TRANSCODE_ENABLED else "ready",
+        )
         self.db.add(video)
-        self.db.commit()
-        self.db.refresh(video)
-        cache_block_status(video.id, False)
+        await self.db.commit()
+        await self.db.refresh(video)
+        await cache_block_status(video.id, False)
+        if TRANSCODE_ENABLED:
+            transcode_queue.submit(video.id, path, priority)
+        else:
+            metadata_queue.submit(video.id, path, content_hash)
         return video
 
 
-    def search_videos(self, name: str = None, size: float = None):
-        query = self.db.query(Video)
-        if name:
-            query = query.filter(Video.name.contains(name))
+    # Select the given columns of videos matching a search filter, after the cursor id.
+    # `ranges` holds min_<name> / max_<name> bounds on the RANGE_FILTERS columns.
+    # Returns the query and the column to order it by.
+    def search_query(self, columns, name: str = None, size: float = None, codec: str = None,
+                     cursor: int = None, **ranges):
+        query = select(*columns)
+        order_by = Video.id
+
+        if name and SEARCH_INDEX_ENABLED and len(name) >= MIN_FTS_TERM_LENGTH:
+            # Substring match through the trigram index. Ordering on the FTS rowid (equal
+            # to Video.id) lets SQLite stream matches in order instead of sorting them all.
+            matches = fts_matches(name, cursor or 0)
+            query = query.join(matches, Video.id == matches.c.rowid)
+            order_by = matches.c.rowid
+        elif name:
+            # Too short for trigrams (or no index): the case-insensitive LIKE scan, bounded by the page limit
+            query = query.where(Video.name.contains(name))
         if size:
-            query = query.filter(Video.size == size)
+            query = query.where(Video.size == size)
+        if codec:
+            query = query.where(Video.video_codec == codec)
+        for key, bound in ranges.items():
+            if bound is not None:
+                limit, _, field = key.partition("_")
+                column = RANGE_FILTERS[field]
+                query = query.where(column >= bound if limit == "min" else column <= bound)
+        if cursor:
+            query = query.where(Video.id > cursor)
+        return query, order_by
 
-        # For each result, cache the block status
-        videos = query.all()
-        for video in videos:
-            cache_block_status(video.id, video.is_blocked)
-        return videos
+    # Keyset-paginated search ordered by id. Only the requested columns are loaded, as tuples;
+    # returns the rows as dicts and the cursor for the next page (None on the last page).
+    async def search_videos(self, name: str = None, size: float = None, codec: str = None, cursor: int = None,
+                            limit: int = SEARCH_PAGE_SIZE, fields: list[str] = None, **ranges):
+        columns = [Video.__table__.c[field] for field in (fields or SEARCH_FIELDS)]
+        if "id" not in (fields or SEARCH_FIELDS):
+            columns.insert(0, Video.id)
+        query, order_by = self.search_query(columns, name, size, codec, cursor, **ranges)
 
-    
-    def get_video_by_id(self, video_id: int):
-        video = self.db.query(Video).filter(Video.id == video_id).first()
+        # One extra row tells us whether another page follows
+        keys = [column.name for column in columns]
+        rows = (await self.db.execute(query.order_by(order_by).limit(limit + 1))).tuples().all()
+        next_cursor = rows[limit - 1][keys.index("id")] if len(rows) > limit else None
+        return rows_as_dicts(keys, rows[:limit]), next_cursor
+
+    async def get_video_by_id(self, video_id: int):
+        video = await self.db.get(Video, video_id)
         if not video:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
@@ -66,24 +161,83 @@ class VideoService:
             )
         return video
     
-    def block_video(self, video_id: int):
-        video = self.db.query(Video).filter(Video.id == video_id).first()
+    # Stored block flag of a video, or None when it does not exist
+    async def get_block_status(self, video_id: int):
+        is_blocked = await self.db.scalar(select(Video.is_blocked).where(Video.id == video_id))
+        return None if is_blocked is None else bool(is_blocked)
+
+    async def block_video(self, video_id: int):
+        return await self.set_block_status(video_id, True)
+
+    async def unblock_video(self, video_id: int):
+        return await self.set_block_status(video_id, False)
+
+    async def set_block_status(self, video_id: int, is_blocked: bool):
+        if write_batcher.enabled:
+            # Grouped with other concurrent writes into one transaction by the writer thread
+            await write_batcher.execute(partial(update_block_status, video_id=video_id, is_blocked=is_blocked))
+            video = await self.db.get(Video, video_id)
+        else:
+            video = await self.db.get(Video, video_id)
+            if video:
+                video.is_blocked = int(is_blocked)
+                await self.db.commit()
+
         if video:
-            video.is_blocked = 1
-            self.db.commit()
-            self.db.refresh(video)
-            
             # Update Redis cache
-            cache_block_status(video.id, True)
+            await cache_block_status(video.id, is_blocked)
+            if is_blocked:
+                edge_cache.evict([video.id])
         return video
 
-    def unblock_video(self, video_id: int):
-        video = self.db.query(Video).filter(Video.id == video_id).first()
-        if video:
-            video.is_blocked = 0
-            self.db.commit()
-            self.db.refresh(video)
-            
-            # Update Redis cache
-            cache_block_status(video.id, False)
-        return video
\ No newline at end of file
+    # Set the block flag of one batch of ids; returns the ids that exist
+    async def update_block_batch(self, ids: list[int], is_blocked: bool) -> list[int]:
+        result = await self.db.execute(
+            update(Video)
+            .where(Video.id.in_(ids))
+            .values(is_blocked=int(is_blocked))
+            .returning(Video.id)
+            .execution_options(synchronize_session=False)
+        )
+        return list(result.scalars())
+
+    # Block or unblock many videos in one transaction, one UPDATE per BULK_BLOCK_BATCH_SIZE ids,
+    # then push every new status to the cache in one pipeline. Takes explicit ids, or a
+    # search filter whose matches are walked in id order, at most BULK_BLOCK_MAX_IDS per call.
+    # Returns the updated ids, the missing ones and, for a filter, the cursor to resume from.
+    async def set_block_status_bulk(self, is_blocked: bool, ids: list[int] = None, filters: dict = None):
+        updated, not_found, next_cursor = [], [], None
+        if ids is not None:
+            ids = list(dict.fromkeys(ids))
+            for start in range(0, len(ids), BULK_BLOCK_BATCH_SIZE):
+                batch = ids[start:start + BULK_BLOCK_BATCH_SIZE]
+                found = await self.update_block_batch(batch, is_blocked)
+                updated.extend(found)
+                if len(found) < len(batch):
+                    found = set(found)
+                    not_found.extend(video_id for video_id in batch if video_id not in found)
+        else:
+            filters = dict(filters)
+            cursor = filters.pop("cursor", None)
+            while len(updated) < BULK_BLOCK_MAX_IDS:
+                limit = min(BULK_BLOCK_BATCH_SIZE, BULK_BLOCK_MAX_IDS - len(updated))
+                query, order_by = self.search_query([Video.id], cursor=cursor, **filters)
+                batch = list((await self.db.execute(query.order_by(order_by).limit(limit))).scalars())
+                if not batch:
+                    break
+                updated.extend(await self.update_block_batch(batch, is_blocked))
+                cursor = batch[-1]
+            else:
+                next_cursor = cursor
+        await self.db.commit()
+
+        await cache_block_statuses(dict.fromkeys(updated, is_blocked), notify=True)
+        if is_blocked:
+            edge_cache.evict(updated)
+        return {
+            "is_blocked": is_blocked,
+            "updated_count": len(updated),
+            "updated": updated,
+            "not_found": not_found,
+            "next_cursor": next_cursor,
+        }
@@ -0,0 +1,146 @@
+import os
+import uuid
+from contextlib import contextmanager
+from .config import (
+    UPLOAD_DIR, STORAGE_BACKEND, S3_BUCKET, S3_PREFIX, S3_ENDPOINT_URL, S3_REGION,
+    S3_MULTIPART_THRESHOLD, S3_MULTIPART_CHUNK_SIZE, S3_MAX_CONCURRENCY, S3_PRESIGN_EXPIRES,
+)
+
+# Where stored files live. Drivers map a key (e.g. "ab/cd/<sha256>") to a location string,
+# which is what Video.path and Blob.path hold: a filesystem path for local storage,
+# "s3://bucket/key" for S3. Locations of either kind can be served whatever the active backend.
+
+S3_SCHEME = "s3://"
+
+# Files being written, before their hash is known. Kept inside UPLOAD_DIR so that
+# moving a finished file into local storage is a rename on the same filesystem.
+TEMP_DIR = os.path.join(UPLOAD_DIR, ".tmp")
+
+
+def is_remote(location: str) -> bool:
+    return location.startswith(S3_SCHEME)
+
+# Fresh path to write an incoming file to
+def new_temp_path(suffix: str = "") -> str:
+    os.makedirs(TEMP_DIR, exist_ok=True)
+    return os.path.join(TEMP_DIR, uuid.uuid4().hex + suffix)
+
+
+# Files under UPLOAD_DIR on this node
+class LocalStorage:
+    remote = False
+
+    def __init__(self, root: str = UPLOAD_DIR):
+        self.root = root
+
+    def location(self, key: str) -> str:
+        return os.path.join(self.root, key)
+
+    def exists(self, key: str) -> bool:
+        return os.path.exists(self.location(key))
+
+    # Move a finished temp file into place; a rename, since temp files live under the same root
+    def put(self, temp_file: str, key: str) -> str:
+        path = self.location(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        os.replace(temp_file, path)
+        return path
+
+    def delete(self, location: str):
+        try:
+            os.remove(location)
+        except FileNotFoundError:
+            pass
+
+    @contextmanager
+    def local_copy(self, location: str):
+        yield location
+
+
+# Objects in an S3-compatible bucket. Uploads above S3_MULTIPART_THRESHOLD go up as parallel
+# multipart uploads; downloads are redirected to presigned URLs so the bytes bypass the API.
+class S3Storage:
+    remote = True
+
+    def __init__(self, bucket: str = S3_BUCKET, prefix: str = S3_PREFIX, client=None):
+        try:
+            import boto3
+            from boto3.s3.transfer import TransferConfig
+        except ImportError as e:
+            raise RuntimeError("STORAGE_BACKEND=s3 requires the boto3 package") from e
+        self.bucket = bucket
+        self.prefix = prefix
+        self.client = client or boto3.client("s3", endpoint_url=S3_ENDPOINT_URL, region_name=S3_REGION)
+        self.transfer_config = TransferConfig(
+            multipart_threshold=S3_MULTIPART_THRESHOLD,
+            multipart_chunksize=S3_MULTIPART_CHUNK_SIZE,
+            max_concurrency=S3_MAX_CONCURRENCY,
+        )
+
+    def object_key(self, key: str) -> str:
+        return f"{self.prefix}{key}"
+
+    def location(self, key: str) -> str:
+        return f"{S3_SCHEME}{self.bucket}/{self.object_key(key)}"
+
+    @staticmethod
+    def split(location: str) -> tuple[str, str]:
+        bucket, _, object_key = location[len(S3_SCHEME):].partition("/")
+        return bucket, object_key
+
+    def exists(self, key: str) -> bool:
+        from botocore.exceptions import ClientError
+        try:
+            self.client.head_object(Bucket=self.bucket, Key=self.object_key(key))
+        except ClientError as e:
+            if e.response["Error"]["Code"] in ("404", "NoSuchKey", "NotFound"):
+                return False
+            raise
+        return True
+
+    # Upload a finished temp file; the temp file is left for the caller to remove
+    def put(self, temp_file: str, key: str) -> str:
+        self.client.upload_file(temp_file, self.bucket, self.object_key(key), Config=self.transfer_config)
+        return self.location(key)
+
+    def delete(self, location: str):
+        bucket, object_key = self.split(location)
+        self.client.delete_object(Bucket=bucket, Key=object_key)
+
+    def download_url(self, location: str, filename: str = None) -> str:
+        bucket, object_key = self.split(location)
+        params = {"Bucket": bucket, "Key": object_key}
+        if filename:
+            filename = filename.replace('"', "")
+            params["ResponseContentDisposition"] = f'attachment; filename="{filename}"'
+        return self.client.generate_presigned_url("get_object", Params=params, ExpiresIn=S3_PRESIGN_EXPIRES)
+
+    # Download an object to a temp file for tools that need a local path (ffmpeg)
+    @contextmanager
+    def local_copy(self, location: str):
+        bucket, object_key = self.split(location)
+        path = new_temp_path()
+        try:
+            self.client.download_file(bucket, object_key, path, Config=self.transfer_config)
+            yield path
+        finally:
+            if os.path.exists(path):
+                os.remove(path)
+
+
+def create_storage():
+    if STORAGE_BACKEND == "local":
+        return LocalStorage()
+    if STORAGE_BACKEND == "s3":
+        return S3Storage()
+    raise ValueError(f"Unknown STORAGE_BACKEND {STORAGE_BACKEND!r}")
+
+
+storage = create_storage()
+
+
+# Driver able to read or delete a stored location, whichever backend is active
+def storage_for(location: str):
+    if is_remote(location) == storage.remote:
+        return storage
+    return S3Storage() if is_remote(location) else LocalStorage()
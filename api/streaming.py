@@ -0,0 +1,288 @@
+import os
+import mmap
+import secrets
+import mimetypes
+import anyio
+from email.utils import formatdate, parsedate_to_datetime
+from fastapi import Request, status
+from fastapi.responses import Response
+from .config import DOWNLOAD_MODE, DOWNLOAD_CHUNK_SIZE, DOWNLOAD_FADVISE, DOWNLOAD_READAHEAD
+
+# Upper bound on ranges honoured in one request; more than this is served in full
+MAX_RANGES = 16
+
+# Responses of this worker still sending a file, reported by the downloads_in_flight gauge
+active_downloads = 0
+
+
+# Parse a "bytes=" Range header into inclusive (start, end) pairs.
+# Returns None when the header should be ignored and [] when nothing is satisfiable.
+def parse_range_header(header: str, file_size: int):
+    unit, _, ranges_spec = header.partition("=")
+    if unit.strip().lower() != "bytes":
+        return None
+    ranges = []
+    for spec in ranges_spec.split(","):
+        start, dash, end = spec.strip().partition("-")
+        if not dash:
+            return None
+        try:
+            if start:
+                first = int(start)
+                last = int(end) if end else max(first, file_size - 1)
+                if last < first:
+                    return None
+            else:
+                # Suffix range: the final N bytes
+                suffix = int(end)
+                first, last = max(file_size - suffix, 0), file_size - 1
+                if suffix == 0:
+                    continue
+        except ValueError:
+            return None
+        if first >= file_size:
+            continue
+        ranges.append((first, min(last, file_size - 1)))
+    if len(ranges) > MAX_RANGES:
+        return None
+    return ranges
+
+
+def etag_matches(header: str, etag: str, weak: bool = True) -> bool:
+    if header.strip() == "*":
+        return True
+    for candidate in header.split(","):
+        candidate = candidate.strip()
+        if weak:
+            if candidate.removeprefix("W/") == etag.removeprefix("W/"):
+                return True
+        elif candidate == etag and not etag.startswith("W/"):
+            return True
+    return False
+
+
+def not_modified_since(header: str, modified: float) -> bool:
+    try:
+        return int(modified) <= parsedate_to_datetime(header).timestamp()
+    except (TypeError, ValueError):
+        return False
+
+
+FADVISE_FLAGS = {
+    "sequential": getattr(os, "POSIX_FADV_SEQUENTIAL", None),
+    "willneed": getattr(os, "POSIX_FADV_WILLNEED", None),
+    "normal": getattr(os, "POSIX_FADV_NORMAL", None),
+}
+
+
+# Hint the kernel about the bytes we are about to send so they are read ahead into the page cache
+def advise(fd: int, offset: int, length: int, hint: str = None):
+    flag = FADVISE_FLAGS.get(hint or DOWNLOAD_FADVISE)
+    if flag is None or not hasattr(os, "posix_fadvise"):
+        return
+    try:
+        os.posix_fadvise(fd, offset, length, flag)
+    except OSError:
+        pass
+
+
+# A file (or byte ranges of it) sent as a sequence of literal bytes and file segments.
+# The ASGI server sends the file bytes itself (pathsend / zerocopysend) when it supports
+# that; otherwise they are read in chunks with pread on a worker thread, so a cold page
+# cache never blocks the event loop. DOWNLOAD_MODE=mmap slices them out of a read-only
+# memory map on the loop instead, which only pays off when the files stay in memory.
+# With a throttle (an async callable awaited with each chunk's size before it is sent)
+# the app always sends the chunks itself.
+# The file is opened before the response starts. When `path` is a copy that may be removed
+# under us (an edge cache entry), `fallback_path` names the original, opened instead if the
+# copy is gone; the server is then never handed the copy's path to open by itself.
+class RangeFileResponse(Response):
+    def __init__(self, path: str, segments: list, status_code: int, headers: dict, media_type: str,
+                 throttle=None, file_size: int = None, fallback_path: str = None):
+        super().__init__(status_code=status_code, headers=headers, media_type=media_type)
+        self.path = path
+        self.segments = segments
+        self.throttle = throttle
+        self.file_size = os.path.getsize(path) if file_size is None else file_size
+        self.fallback_path = fallback_path
+
+    def choose_mode(self, scope) -> str:
+        extensions = scope.get("extensions") or {}
+        if DOWNLOAD_MODE in ("auto", "sendfile") and self.throttle is None:
+            if "http.response.pathsend" in extensions and self.whole_file and not self.fallback_path:
+                return "pathsend"
+            if "http.response.zerocopysend" in extensions:
+                return "zerocopysend"
+        return "mmap" if DOWNLOAD_MODE == "mmap" else "read"
+
+    @property
+    def whole_file(self) -> bool:
+        return len(self.segments) == 1 and self.segments[0] == (0, self.file_size)
+
+    # Open the file to send, or the fallback when the copy has gone. The headers were built
+    # from a stat of the same content, so a file of another size is an error, raised
+    # before anything is sent.
+    def open_file(self):
+        try:
+            file = open(self.path, "rb")
+        except FileNotFoundError:
+            if not self.fallback_path:
+                raise
+            file = open(self.fallback_path, "rb")
+        if os.fstat(file.fileno()).st_size != self.file_size:
+            file.close()
+            raise RuntimeError(f"{file.name} changed size while being served")
+        return file
+
+    async def send_zerocopy(self, send, file, start: int, length: int):
+        await send({
+            "type": "http.response.zerocopysend", "file": file,
+            "offset": start, "count": length, "more_body": True,
+        })
+
+    async def send_mmap(self, send, view, fd: int, start: int, length: int):
+        end = start + length
+        position = start
+        while position < end:
+            # Keep the next window of the file on its way into the page cache
+            if DOWNLOAD_READAHEAD and (position - start) % DOWNLOAD_READAHEAD < DOWNLOAD_CHUNK_SIZE:
+                advise(fd, position, min(DOWNLOAD_READAHEAD, end - position), "willneed")
+            chunk_end = min(position + DOWNLOAD_CHUNK_SIZE, end)
+            if self.throttle:
+                await self.throttle(chunk_end - position)
+            await send({"type": "http.response.body", "body": view[position:chunk_end], "more_body": True})
+            position = chunk_end
+
+    async def send_read(self, send, fd: int, start: int, length: int):
+        position = start
+        while length > 0:
+            if self.throttle:
+                await self.throttle(min(DOWNLOAD_CHUNK_SIZE, length))
+            chunk = await anyio.to_thread.run_sync(os.pread, fd, min(DOWNLOAD_CHUNK_SIZE, length), position)
+            if not chunk:
+                break
+            position += len(chunk)
+            length -= len(chunk)
+            await send({"type": "http.response.body", "body": chunk, "more_body": True})
+
+    async def __call__(self, scope, receive, send):
+        global active_downloads
+        active_downloads += 1
+        try:
+            await self.send_file(scope, send)
+        finally:
+            active_downloads -= 1
+
+    async def send_file(self, scope, send):
+        if scope["method"] == "HEAD":
+            await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+            return
+
+        with self.open_file() as file:
+            await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+            mode = self.choose_mode(scope)
+            if mode == "pathsend":
+                await send({"type": "http.response.pathsend", "path": os.path.abspath(self.path)})
+                return
+            fd = file.fileno()
+            for segment in self.segments:
+                if not isinstance(segment, bytes):
+                    advise(fd, *segment)
+            view = None
+            if mode == "mmap" and os.fstat(fd).st_size:
+                view = mmap.mmap(fd, 0, access=mmap.ACCESS_READ)
+            try:
+                for segment in self.segments:
+                    if isinstance(segment, bytes):
+                        await send({"type": "http.response.body", "body": segment, "more_body": True})
+                    elif mode == "zerocopysend":
+                        await self.send_zerocopy(send, file, *segment)
+                    elif view is not None:
+                        await self.send_mmap(send, view, fd, *segment)
+                    else:
+                        await self.send_read(send, fd, *segment)
+            finally:
+                if view is not None:
+                    view.close()
+        await send({"type": "http.response.body", "body": b"", "more_body": False})
+
+
+# Serve a file honouring Range, If-Range, If-None-Match and If-Modified-Since.
+# A stored content hash gives a strong ETag; otherwise a weak one is derived from mtime and size.
+# `throttle` paces the body and `fallback_path` stands in for a copy that is removed, see RangeFileResponse.
+def file_response(request: Request, path: str, content_hash: str = None, throttle=None,
+                  fallback_path: str = None) -> Response:
+    try:
+        stat_result = os.stat(path)
+    except FileNotFoundError:
+        if not fallback_path:
+            raise
+        path, fallback_path = fallback_path, None
+        stat_result = os.stat(path)
+    file_size = stat_result.st_size
+    etag = f'"{content_hash}"' if content_hash else f'W/"{int(stat_result.st_mtime)}-{file_size}"'
+    last_modified = formatdate(stat_result.st_mtime, usegmt=True)
+    headers = {"accept-ranges": "bytes", "etag": etag, "last-modified": last_modified}
+    media_type = mimetypes.guess_type(path)[0] or "application/octet-stream"
+
+    if_none_match = request.headers.get("if-none-match")
+    if_modified_since = request.headers.get("if-modified-since")
+    if (if_none_match and etag_matches(if_none_match, etag)) or (
+        not if_none_match and if_modified_since and not_modified_since(if_modified_since, stat_result.st_mtime)
+    ):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    ranges = None
+    range_header = request.headers.get("range")
+    if range_header:
+        # If-Range: only honour the range when the client's copy is still current
+        if_range = request.headers.get("if-range")
+        if not if_range or (
+            etag_matches(if_range, etag, weak=False) if if_range.strip().startswith(("\"", "W/"))
+            else if_range.strip() == last_modified
+        ):
+            ranges = parse_range_header(range_header, file_size)
+
+    if ranges is None:
+        headers["content-length"] = str(file_size)
+        return RangeFileResponse(
+            path, [(0, file_size)], status.HTTP_200_OK, headers, media_type, throttle, file_size, fallback_path
+        )
+
+    if not ranges:
+        headers["content-range"] = f"bytes */{file_size}"
+        return Response(status_code=status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE, headers=headers)
+
+    if len(ranges) == 1:
+        start, end = ranges[0]
+        headers["content-range"] = f"bytes {start}-{end}/{file_size}"
+        headers["content-length"] = str(end - start + 1)
+        return RangeFileResponse(
+            path, [(start, end - start + 1)], status.HTTP_206_PARTIAL_CONTENT, headers, media_type, throttle,
+            file_size, fallback_path,
+        )
+
+    # Several ranges: multipart/byteranges body with one part per range
+    boundary = secrets.token_hex(12)
+    segments = []
+    for start, end in ranges:
+        segments.append((
+            f"--{boundary}\r\n"
+            f"Content-Type: {media_type}\r\n"
+            f"Content-Range: bytes {start}-{end}/{file_size}\r\n\r\n"
+        ).encode())
+        segments.append((start, end - start + 1))
+        segments.append(b"\r\n")
+    segments.append(f"--{boundary}--\r\n".encode())
+    headers["content-length"] = str(sum(
+        len(segment) if isinstance(segment, bytes) else segment[1] for segment in segments
+    ))
+    return RangeFileResponse(
+        path, segments, status.HTTP_206_PARTIAL_CONTENT, headers, f"multipart/byteranges; boundary={boundary}", throttle,
+        file_size, fallback_path,
+    )
+
+
+def downloads_in_flight() -> int:
+    return active_downloads
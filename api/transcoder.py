@@ -0,0 +1,155 @@
+import os
+import hashlib
+import itertools
+import logging
+import queue
+import subprocess
+import threading
+import ffmpeg
+from sqlalchemy import select, update
+from .models import Video, SessionLocal
+from .blob_store import add_blob, delete_blob_file, release_blob, stage_blob
+from .storage import storage_for, new_temp_path
+from .media_info import metadata_queue
+from .config import (
+    UPLOAD_CHUNK_SIZE, TRANSCODE_CONCURRENCY, FFMPEG_BINARY,
+    TRANSCODE_VIDEO_CODEC, TRANSCODE_AUDIO_CODEC, TRANSCODE_PRESET, TRANSCODE_TIMEOUT,
+    TRANSCODE_REQUEUE_ON_START,
+)
+
+logger = logging.getLogger(__name__)
+
+
+def hash_file(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as source:
+        while chunk := source.read(UPLOAD_CHUNK_SIZE):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+# Build the ffmpeg command line for one job
+def build_command(source_path: str, output_path: str) -> list[str]:
+    stream = ffmpeg.input(source_path).output(
+        output_path,
+        vcodec=TRANSCODE_VIDEO_CODEC,
+        acodec=TRANSCODE_AUDIO_CODEC,
+        preset=TRANSCODE_PRESET,
+        movflags="+faststart",
+    )
+    return stream.overwrite_output().compile(cmd=FFMPEG_BINARY)
+
+
+def set_status(video_id: int, status: str, **values):
+    with SessionLocal() as db:
+        db.query(Video).filter(Video.id == video_id).update({"status": status, **values})
+        db.commit()
+
+
+# Store the converted file as a blob, point the video at it and release the source blob,
+# in one transaction; then queue the result for probing
+def finish_transcode(video_id: int, source_path: str, output_path: str):
+    content_hash = hash_file(output_path)
+    size = os.path.getsize(output_path)
+    staged = stage_blob(output_path, content_hash)
+    with SessionLocal() as db:
+        video = db.get(Video, video_id)
+        path = add_blob(db, output_path, content_hash, size, staged)
+        source_hash = video.content_hash
+        video.path, video.size, video.content_hash = path, size, content_hash
+        video.status, video.status_detail = "ready", None
+        db.flush()
+        stored, orphan = release_blob(db, source_hash)
+        db.commit()
+    # The source file goes only once the video points at the converted one.
+    # Files stored before content addressing belong to this video alone.
+    if stored:
+        delete_blob_file(orphan)
+    elif os.path.exists(source_path):
+        os.remove(source_path)
+    metadata_queue.submit(video_id, path, content_hash)
+
+
+# Transcode one uploaded file to .mp4 and point the video row at the result.
+# The output goes to a temp file: another video may be converting the same source blob.
+# Sources in remote storage are downloaded to a temp file for ffmpeg first.
+def transcode(video_id: int, source_path: str):
+    output_path = new_temp_path(".mp4")
+    set_status(video_id, "processing")
+    try:
+        with storage_for(source_path).local_copy(source_path) as local_source:
+            subprocess.run(
+                build_command(local_source, output_path),
+                check=True, capture_output=True, timeout=TRANSCODE_TIMEOUT,
+            )
+    except (OSError, subprocess.SubprocessError) as e:
+        stderr = getattr(e, "stderr", None)
+        detail = stderr.decode(errors="replace")[-500:] if stderr else str(e)
+        logger.warning("Transcode of video %s failed: %s", video_id, detail)
+        if os.path.exists(output_path):
+            os.remove(output_path)
+        set_status(video_id, "failed", status_detail=detail)
+        return
+
+    finish_transcode(video_id, source_path, output_path)
+
+
+# Bounded pool of worker threads, each driving one ffmpeg process at a time.
+# Jobs with a higher priority are picked first; equal priorities run in FIFO order.
+class TranscodeQueue:
+    def __init__(self, concurrency: int = TRANSCODE_CONCURRENCY, handler=transcode):
+        self.concurrency = concurrency
+        self.handler = handler
+        self.jobs = queue.PriorityQueue()
+        self.counter = itertools.count()
+        self.workers = []
+        self.lock = threading.Lock()
+
+    def start(self):
+        with self.lock:
+            while len(self.workers) < self.concurrency:
+                worker = threading.Thread(target=self.run, name=f"transcoder-{len(self.workers)}", daemon=True)
+                worker.start()
+                self.workers.append(worker)
+
+    def submit(self, video_id: int, source_path: str, priority: int = 0):
+        self.start()
+        self.jobs.put((-priority, next(self.counter), video_id, source_path))
+
+    def pending(self) -> int:
+        return self.jobs.qsize()
+
+    def run(self):
+        while True:
+            _, _, video_id, source_path = self.jobs.get()
+            try:
+                self.handler(video_id, source_path)
+            except Exception:
+                logger.exception("Transcode worker crashed on video %s", video_id)
+                set_status(video_id, "failed", status_detail="internal error")
+            finally:
+                self.jobs.task_done()
+
+
+transcode_queue = TranscodeQueue()
+
+
+# Whether this process resubmits unfinished jobs on startup; api.server clears it in all
+# workers but the first, and in any worker it starts to replace one that died
+requeue_on_startup = TRANSCODE_REQUEUE_ON_START
+
+# Jobs live only in the queue of the process that accepted the upload, so a restart or crash
+# leaves their videos queued or processing. Set those back to queued and submit them again,
+# oldest first; returns how many. Run it once per server start, never while other workers
+# are transcoding, or their jobs would run twice.
+def requeue_unfinished() -> int:
+    with SessionLocal() as db:
+        jobs = db.execute(
+            select(Video.id, Video.path).where(Video.status.in_(("queued", "processing"))).order_by(Video.id)
+        ).all()
+        db.execute(update(Video).where(Video.status == "processing").values(status="queued"))
+        db.commit()
+    for video_id, path in jobs:
+        transcode_queue.submit(video_id, path)
+    if jobs:
+        logger.info("Requeued %s unfinished transcodes", len(jobs))
+    return len(jobs)
@@ -0,0 +1,215 @@
+import os
+import json
+import time
+import shutil
+import hashlib
+import secrets
+import aiofiles
+from fastapi import HTTPException, status
+from starlette.concurrency import run_in_threadpool
+from .config import (
+    UPLOAD_DIR, UPLOAD_CHUNK_SIZE, UPLOAD_MAX_SIZE, UPLOAD_PART_MAX_SIZE, UPLOAD_MAX_PARTS, UPLOAD_SESSION_TTL,
+)
+from .storage import new_temp_path
+
+# Each session is a directory holding its metadata and, per received part, a data file and a
+# small record ("00001.part") naming that file with its size and digest. Replacing the record
+# is the one atomic step that makes a part, or a re-sent copy of it, visible.
+SESSIONS_DIR = os.path.join(UPLOAD_DIR, ".sessions")
+
+
+def session_dir(upload_id: str) -> str:
+    return os.path.join(SESSIONS_DIR, upload_id)
+
+def part_path(upload_id: str, part_number: int) -> str:
+    return os.path.join(session_dir(upload_id), f"{part_number:05d}.part")
+
+def read_record(path: str) -> dict:
+    with open(path) as record:
+        return json.load(record)
+
+def load_session(upload_id: str) -> dict:
+    try:
+        with open(os.path.join(session_dir(upload_id), "meta.json")) as meta:
+            return json.load(meta)
+    except FileNotFoundError:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Upload session {upload_id} not found."
+        )
+
+# Records of the received parts, ordered by part number
+def read_parts(upload_id: str) -> list[dict]:
+    return [
+        read_record(entry.path)
+        for entry in sorted(os.scandir(session_dir(upload_id)), key=lambda e: e.name)
+        if entry.name.endswith(".part")
+    ]
+
+# Received parts as shown to clients
+def list_parts(upload_id: str) -> list[dict]:
+    return [
+        {"part_number": part["part_number"], "size": part["size"], "sha256": part["sha256"]}
+        for part in read_parts(upload_id)
+    ]
+
+
+# Remove sessions nothing was written to for `ttl` seconds, so abandoned uploads do not fill
+# the disk; returns how many went. Writing a part touches the session directory.
+def sweep_sessions(ttl: int = UPLOAD_SESSION_TTL) -> int:
+    if not ttl or not os.path.isdir(SESSIONS_DIR):
+        return 0
+    cutoff = time.time() - ttl
+    removed = 0
+    for entry in os.scandir(SESSIONS_DIR):
+        if entry.is_dir() and entry.stat().st_mtime < cutoff:
+            shutil.rmtree(entry.path, ignore_errors=True)
+            removed += 1
+    return removed
+
+
+def create_session(filename: str) -> dict:
+    sweep_sessions()
+    upload_id = secrets.token_hex(16)
+    os.makedirs(session_dir(upload_id))
+    session = {"upload_id": upload_id, "filename": filename}
+    with open(os.path.join(session_dir(upload_id), "meta.json"), "w") as meta:
+        json.dump(session, meta)
+    return session
+
+
+# Stream one part to disk; re-sending a part number replaces the earlier copy
+async def write_part(upload_id: str, part_number: int, chunks) -> dict:
+    load_session(upload_id)
+    if not 1 <= part_number <= UPLOAD_MAX_PARTS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Part number must be between 1 and {UPLOAD_MAX_PARTS}."
+        )
+
+    # Bytes already received in the other parts count against UPLOAD_MAX_SIZE as this one arrives
+    received = sum(part["size"] for part in read_parts(upload_id) if part["part_number"] != part_number)
+    record_path = part_path(upload_id, part_number)
+    # Unique names let concurrent retries of the same part not clobber each other
+    token = secrets.token_hex(4)
+    data_path = f"{record_path[:-len('.part')]}.{token}.data"
+    temp_path = f"{record_path}.{token}.tmp"
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        async with aiofiles.open(data_path, "wb") as buffer:
+            async for chunk in chunks:
+                size += len(chunk)
+                if size > UPLOAD_PART_MAX_SIZE:
+                    raise HTTPException(
+                        status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                        detail=f"Part exceeds the maximum size of {UPLOAD_PART_MAX_SIZE} bytes."
+                    )
+                if UPLOAD_MAX_SIZE and received + size > UPLOAD_MAX_SIZE:
+                    raise HTTPException(
+                        status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                        detail=f"Upload exceeds the maximum size of {UPLOAD_MAX_SIZE} bytes."
+                    )
+                digest.update(chunk)
+                await buffer.write(chunk)
+        part = {"part_number": part_number, "size": size, "sha256": digest.hexdigest()}
+        with open(temp_path, "w") as record:
+            json.dump({**part, "data": os.path.basename(data_path)}, record)
+        try:
+            replaced = read_record(record_path)["data"]
+        except FileNotFoundError:
+            replaced = None
+        os.replace(temp_path, record_path)
+    except BaseException:
+        for path in (data_path, temp_path):
+            if os.path.exists(path):
+                os.remove(path)
+        raise
+    # The copy this one replaced; a concurrent retry of the same part may have removed it already
+    if replaced:
+        try:
+            os.remove(os.path.join(session_dir(upload_id), replaced))
+        except FileNotFoundError:
+            pass
+    return part
+
+
+# Append src to dst in the kernel where the platform allows it
+def copy_into(dst, src, size: int):
+    offset = 0
+    copy_file_range = getattr(os, "copy_file_range", None)
+    try:
+        while offset < size:
+            if copy_file_range:
+                copied = copy_file_range(src.fileno(), dst.fileno(), size - offset, offset)
+            else:
+                copied = os.sendfile(dst.fileno(), src.fileno(), offset, size - offset)
+            if copied == 0:
+                break
+            offset += copied
+    except (OSError, AttributeError):
+        # Cross-device or unsupported filesystem: fall back to a userspace copy
+        src.seek(offset)
+        shutil.copyfileobj(src, dst, UPLOAD_CHUNK_SIZE)
+        # The kernel copies of later parts write at the descriptor's position, behind this buffer
+        dst.flush()
+        return
+    if offset != size:
+        raise OSError(f"Short copy while assembling upload ({offset} of {size} bytes)")
+
+
+# Concatenate all parts into a temp file, to be stored by create_video
+def assemble(upload_id: str) -> tuple[str, str, int, str]:
+    session = load_session(upload_id)
+    parts = read_parts(upload_id)
+    numbers = [part["part_number"] for part in parts]
+    if not numbers or numbers != list(range(1, len(numbers) + 1)):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Parts must be numbered consecutively from 1 before completing."
+        )
+    total_size = sum(part["size"] for part in parts)
+    if UPLOAD_MAX_SIZE and total_size > UPLOAD_MAX_SIZE:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"Upload exceeds the maximum size of {UPLOAD_MAX_SIZE} bytes."
+        )
+
+    name = session["filename"]
+    data_paths = [os.path.join(session_dir(upload_id), part["data"]) for part in parts]
+    path = new_temp_path()
+    try:
+        with open(path, "wb") as dst:
+            for part, data_path in zip(parts, data_paths):
+                with open(data_path, "rb") as src:
+                    copy_into(dst, src, part["size"])
+
+        # sha256 of the whole file, as /upload/ computes it, so both paths share blobs and ETags.
+        # The parts were just copied, so this reads them back from the page cache.
+        digest = hashlib.sha256()
+        for data_path in data_paths:
+            with open(data_path, "rb") as src:
+                while chunk := src.read(UPLOAD_CHUNK_SIZE):
+                    digest.update(chunk)
+    except BaseException:
+        os.remove(path)
+        raise
+    return name, path, total_size, digest.hexdigest()
+
+
+def abort_session(upload_id: str):
+    load_session(upload_id)
+    shutil.rmtree(session_dir(upload_id), ignore_errors=True)
+
+
+# The session is dropped only once the video row is committed, so a failed completion can be retried
+async def complete_session(upload_id: str, video_service, priority: int = 0):
+    name, path, size, content_hash = await run_in_threadpool(assemble, upload_id)
+    try:
+        video = await video_service.create_video(name, path, size, content_hash, priority)
+    except BaseException:
+        if os.path.exists(path):
+            os.remove(path)
+        raise
+    await run_in_threadpool(shutil.rmtree, session_dir(upload_id), True)
+    return video
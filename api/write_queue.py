@@ -0,0 +1,90 @@
+import asyncio
+import logging
+import queue
+import threading
+from concurrent.futures import Future
+from .models import SessionLocal
+from .config import SQLITE_WRITE_BATCHING, SQLITE_WRITE_BATCH_SIZE, SQLITE_WRITE_BATCH_WAIT
+
+logger = logging.getLogger(__name__)
+
+
+# Single writer thread for small writes. Jobs (callables taking a sync Session) that
+# arrive together are run in one transaction, so SQLite's database-wide write lock is
+# taken once per batch instead of once per request.
+class WriteBatcher:
+    def __init__(self, session_factory=SessionLocal, max_batch: int = SQLITE_WRITE_BATCH_SIZE,
+                 max_wait: float = SQLITE_WRITE_BATCH_WAIT, enabled: bool = SQLITE_WRITE_BATCHING):
+        self.session_factory = session_factory
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.enabled = enabled
+        self.jobs = queue.Queue()
+        self.worker = None
+        self.lock = threading.Lock()
+        self.batches = 0
+        self.writes = 0
+
+    def start(self):
+        with self.lock:
+            if self.worker is None:
+                self.worker = threading.Thread(target=self.run, name="sqlite-writer", daemon=True)
+                self.worker.start()
+
+    def submit(self, job) -> Future:
+        self.start()
+        future = Future()
+        self.jobs.put((job, future))
+        return future
+
+    # Await a job from async code without blocking the event loop
+    async def execute(self, job):
+        return await asyncio.wrap_future(self.submit(job))
+
+    # Wait for one job, then gather whatever else arrives within max_wait.
+    # Jobs whose caller has already given up are dropped.
+    def collect(self) -> list:
+        batch = []
+        job = self.jobs.get()
+        while True:
+            if job[1].set_running_or_notify_cancel():
+                batch.append(job)
+            if len(batch) >= self.max_batch:
+                break
+            try:
+                job = self.jobs.get(timeout=self.max_wait)
+            except queue.Empty:
+                if batch:
+                    break
+                job = self.jobs.get()
+        return batch
+
+    def run(self):
+        while True:
+            batch = self.collect()
+            try:
+                results = self.commit(batch)
+            except Exception:
+                # One bad job must not fail its neighbours: retry each on its own
+                logger.warning("Write batch of %d failed, retrying jobs one by one", len(batch))
+                for job, future in batch:
+                    try:
+                        result = self.commit([(job, future)])[0]
+                    except Exception as e:
+                        future.set_exception(e)
+                    else:
+                        future.set_result(result)
+                continue
+            for (job, future), result in zip(batch, results):
+                future.set_result(result)
+
+    def commit(self, batch: list) -> list:
+        with self.session_factory() as db:
+            results = [job(db) for job, future in batch]
+            db.commit()
+        self.batches += 1
+        self.writes += len(batch)
+        return results
+
+
+write_batcher = WriteBatcher()
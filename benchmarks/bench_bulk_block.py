@@ -0,0 +1,67 @@
+"""Blocking many videos: one request per id vs the bulk endpoint.
+
+Seeds a throwaway database with --videos rows. "per-id" blocks --per-id-sample
+ids one at a time through VideoService.set_block_status (what a moderation
+job calling POST /block/{id}/ costs, minus HTTP); "bulk" posts each batch
+size to POST /block/bulk/ in-process, including JSON parsing and validation.
+REDIS_BACKEND defaults to memory; set it to redis to include the pipeline.
+
+    python benchmarks/bench_bulk_block.py --videos 200000 --sizes 1000 10000 100000
+"""
+import argparse
+import asyncio
+import os
+import random
+import tempfile
+import time
+
+import common  # noqa: F401  (puts the project root on sys.path)
+
+
+async def run(args):
+    import httpx
+    from api.dependencies import admin_only
+    from api.main import app
+    from api.models import AsyncSessionLocal, SessionLocal, Video
+    from api.services import VideoService
+
+    with SessionLocal() as db:
+        db.add_all(Video(name=f"video {i}", size=i, path=f"uploads/{i}.mp4") for i in range(args.videos))
+        db.commit()
+
+    print(f"{'mode':>8} {'ids':>8} {'seconds':>9} {'ids/s':>10}")
+    ids = random.sample(range(1, args.videos + 1), args.per_id_sample)
+    began = time.perf_counter()
+    for video_id in ids:
+        async with AsyncSessionLocal() as db:
+            await VideoService(db).set_block_status(video_id, True)
+    elapsed = time.perf_counter() - began
+    print(f"{'per-id':>8} {len(ids):>8} {elapsed:>9.2f} {len(ids) / elapsed:>10,.0f}")
+
+    app.dependency_overrides[admin_only] = lambda: None
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=600) as client:
+        for size in args.sizes:
+            ids = random.sample(range(1, args.videos + 1), min(size, args.videos))
+            began = time.perf_counter()
+            response = await client.post("/unblock/bulk/", json={"ids": ids})
+            elapsed = time.perf_counter() - began
+            assert response.status_code == 200, response.text
+            print(f"{'bulk':>8} {len(ids):>8} {elapsed:>9.2f} {len(ids) / elapsed:>10,.0f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--videos", type=int, default=200_000)
+    parser.add_argument("--per-id-sample", type=int, default=2000)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10_000, 100_000])
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        os.environ["DATABASE_URL"] = f"sqlite:///{workdir}/bench.db"
+        os.environ.setdefault("REDIS_BACKEND", "memory")
+        asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
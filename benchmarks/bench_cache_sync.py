@@ -0,0 +1,99 @@
+"""Block-status cache writes: per-row SET vs pipelined batches.
+
+Part 1 times a 1000-row /search/ page with the old per-row cache_block_status
+loop, without any cache writes (current behaviour) and with one pipelined
+batch of SETs.
+Part 2 compares warming the whole cache row by row against
+api.cache_warmup.warm_block_status_cache. Uses the Redis server the app
+is configured for (REDIS_BACKEND=memory measures the client overhead only);
+build the catalogue with gen_catalogue.py first.
+
+    python benchmarks/gen_catalogue.py --db /tmp/catalogue.db --rows 1000000
+    python benchmarks/bench_cache_sync.py --db /tmp/catalogue.db
+"""
+import argparse
+import asyncio
+import os
+import time
+
+from common import percentile
+
+
+async def search_page_timings(term: str, pages: int):
+    from api.models import AsyncSessionLocal
+    from api.redis_service import cache_block_status, cache_block_statuses
+    from api.services import VideoService
+
+    async def per_row(videos):
+        for v in videos:
+            await cache_block_status(v["id"], v["is_blocked"])
+
+    async def no_writes(videos):
+        pass
+
+    strategies = {
+        "per-row SET": per_row,
+        "no cache writes": no_writes,
+        "pipelined SET": lambda videos: cache_block_statuses({v["id"]: v["is_blocked"] for v in videos}),
+    }
+    for label, write in strategies.items():
+        samples = []
+        cursor = None
+        async with AsyncSessionLocal() as db:
+            service = VideoService(db)
+            for _ in range(pages):
+                began = time.perf_counter()
+                videos, cursor = await service.search_videos(term, cursor=cursor, limit=1000)
+                await write(videos)
+                samples.append(time.perf_counter() - began)
+        print(f"{label:>18} {percentile(samples, 50) * 1000:>10.2f} {percentile(samples, 99) * 1000:>10.2f}")
+
+
+async def warmup_timings(per_row_rows: int, batch_size: int):
+    from sqlalchemy import select
+    from api.cache_warmup import warm_block_status_cache
+    from api.models import AsyncSessionLocal, Video
+    from api.redis_service import cache_block_status
+
+    async with AsyncSessionLocal() as db:
+        rows = (await db.execute(select(Video.id, Video.is_blocked).order_by(Video.id).limit(per_row_rows))).all()
+    began = time.perf_counter()
+    for video_id, is_blocked in rows:
+        await cache_block_status(video_id, is_blocked)
+    per_row = len(rows) / (time.perf_counter() - began)
+    print(f"{'per-row SET':>18} {per_row:>12,.0f} rows/s  ({len(rows):,} rows)")
+
+    began = time.perf_counter()
+    warmed = await warm_block_status_cache(batch_size)
+    batched = warmed / (time.perf_counter() - began)
+    print(f"{'batched SET NX':>18} {batched:>12,.0f} rows/s  ({warmed:,} rows)")
+
+
+# One event loop for the whole run, since pooled Redis connections belong to the loop that opened them
+async def run(args):
+    from api.redis_service import close_redis
+
+    print("search page of 1000 rows")
+    print(f"{'':>18} {'p50 ms':>10} {'p99 ms':>10}")
+    await search_page_timings(args.term, args.pages)
+
+    print("\nwarming the block-status cache")
+    await warmup_timings(args.per_row_rows, args.batch_size)
+    await close_redis()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--db", required=True)
+    parser.add_argument("--term", default="holiday")
+    parser.add_argument("--pages", type=int, default=20)
+    parser.add_argument("--per-row-rows", type=int, default=100_000, help="rows warmed one SET at a time")
+    parser.add_argument("--batch-size", type=int, default=10_000)
+    args = parser.parse_args()
+
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.abspath(args.db)}"
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+"""Time from a cold process start to the first answered request.
+
+Starts the API --runs times per mode against a throwaway database (created
+once up front, so each start is a restart with the schema already current)
+and reports the median of:
+
+  first     seconds from spawning the process to the first response to --path
+  ready     seconds until every worker has logged "Application startup complete"
+  first_ms  latency of that first request (the lifespan opens the database and
+            Redis connections, so it should not pay for them)
+  stop      seconds from SIGTERM to the process exiting
+
+Modes:
+
+  uvicorn          uvicorn api.main:app, one process (the old container command without --reload)
+  uvicorn-workers  uvicorn --workers N, each worker spawned and importing the app itself
+  server           python -m api.server, app imported and schema brought up to date once, then forked
+  server-cached    python -m api.server with DB_CREATE_SCHEMA=0
+
+Redis is the in-memory stand-in and background workers are off.
+
+    python benchmarks/bench_cold_start.py --workers 1 4 --runs 5
+"""
+import argparse
+import os
+import signal
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+
+from common import ROOT, free_port
+
+MODES = ["uvicorn", "uvicorn-workers", "server", "server-cached"]
+
+
+def command(mode: str, workers: int, port: int) -> list:
+    if mode.startswith("uvicorn"):
+        workers = ["--workers", str(workers)] if mode == "uvicorn-workers" else []
+        return [sys.executable, "-m", "uvicorn", "api.main:app", "--host", "127.0.0.1", "--port", str(port), *workers]
+    return [sys.executable, "-m", "api.server", "--host", "127.0.0.1", "--port", str(port), "--workers", str(workers)]
+
+
+def request(url: str):
+    try:
+        with urllib.request.urlopen(url, timeout=5) as response:
+            response.read()
+    except urllib.error.HTTPError:
+        pass  # any status counts as answered
+
+
+def start(mode: str, workers: int, env: dict, path: str) -> dict:
+    port = free_port()
+    env = {**env, "DB_CREATE_SCHEMA": "0" if mode == "server-cached" else "1"}
+    began = time.perf_counter()
+    process = subprocess.Popen(command(mode, workers, port), cwd=ROOT, env=env,
+                               stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
+    started = []
+    all_started = threading.Event()
+    expected = 1 if mode == "uvicorn" else workers
+
+    def read_log():
+        for line in process.stdout:
+            if "Application startup complete" in line:
+                started.append(time.perf_counter() - began)
+                if len(started) == expected:
+                    all_started.set()
+    threading.Thread(target=read_log, daemon=True).start()
+
+    url = f"http://127.0.0.1:{port}{path}"
+    while True:
+        if process.poll() is not None:
+            raise RuntimeError(f"{mode} exited with {process.returncode}")
+        sent = time.perf_counter()
+        try:
+            request(url)
+            break
+        except (urllib.error.URLError, ConnectionError):
+            time.sleep(0.005)
+    answered = time.perf_counter()
+    all_started.wait(timeout=60)
+
+    stopping = time.perf_counter()
+    process.send_signal(signal.SIGTERM)
+    process.wait(timeout=60)
+    return {
+        "first": answered - began,
+        "ready": started[-1] if started else float("nan"),
+        "first_ms": (answered - sent) * 1000,
+        "stop": time.perf_counter() - stopping,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--modes", nargs="+", choices=MODES, default=MODES)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 4])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--path", default="/download/1/", help="request answered first (any status counts)")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        env = {
+            **os.environ,
+            "DATABASE_URL": f"sqlite:///{workdir}/coldstart.db",
+            "UPLOAD_DIR": os.path.join(workdir, "uploads"),
+            "REDIS_BACKEND": "memory",
+            "TRANSCODE_ENABLED": "0",
+            "METADATA_ENABLED": "0",
+            "PACKAGING_ENABLED": "0",
+        }
+        subprocess.run([sys.executable, "-c", "import api.models"], cwd=ROOT, env=env, check=True)
+
+        print(f"{'mode':>16} {'workers':>8} {'first s':>8} {'ready s':>8} {'first ms':>9} {'stop s':>7}")
+        for mode in args.modes:
+            for workers in ([1] if mode == "uvicorn" else args.workers):
+                runs = [start(mode, workers, env, args.path) for _ in range(args.runs)]
+                median = {key: statistics.median(run[key] for run in runs) for key in runs[0]}
+                print(f"{mode:>16} {workers:>8} {median['first']:>8.3f} {median['ready']:>8.3f}"
+                      f" {median['first_ms']:>9.2f} {median['stop']:>7.3f}")
+
+
+if __name__ == "__main__":
+    main()
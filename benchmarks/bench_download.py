@@ -0,0 +1,116 @@
+"""Download throughput and server CPU cost: FileResponse vs api.streaming.
+
+Starts a uvicorn server process per strategy serving one temporary file and
+downloads it from N concurrent clients. Server CPU is read from /proc, so the
+"CPU s/GB" column excludes the benchmark client.
+
+    python benchmarks/bench_download.py --size-mb 64 --concurrency 1 50 500
+    python benchmarks/bench_download.py --modes fileresponse mmap read
+"""
+import argparse
+import asyncio
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from common import ROOT, free_port, make_file
+
+MODES = ["fileresponse", "auto", "mmap", "read"]
+
+
+def build_app(path: str, mode: str):
+    from fastapi import FastAPI, Request
+    from fastapi.responses import FileResponse
+    from api.streaming import file_response
+
+    app = FastAPI()
+
+    @app.get("/file")
+    async def serve(request: Request):
+        if mode == "fileresponse":
+            return FileResponse(path)
+        return file_response(request, path, "benchmark")
+
+    return app
+
+
+def cpu_seconds(pid: int) -> float:
+    with open(f"/proc/{pid}/stat") as stat:
+        fields = stat.read().rsplit(")", 1)[1].split()
+    return (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+
+
+async def drive(base_url: str, concurrency: int, downloads: int):
+    import httpx
+
+    transferred = 0
+    remaining = downloads
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=300) as client:
+        async def worker():
+            nonlocal transferred, remaining
+            while remaining > 0:
+                remaining -= 1
+                async with client.stream("GET", "/file") as response:
+                    async for chunk in response.aiter_raw():
+                        transferred += len(chunk)
+
+        began = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        return time.perf_counter() - began, transferred
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size-mb", type=int, default=32)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 50, 500])
+    parser.add_argument("--downloads", type=int, default=0, help="downloads per level (default: max(20, clients))")
+    parser.add_argument("--modes", nargs="+", choices=MODES, default=["fileresponse", "auto"])
+    parser.add_argument("--serve", nargs=3, metavar=("PATH", "MODE", "PORT"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        import uvicorn
+        path, mode, port = args.serve
+        uvicorn.run(build_app(path, mode), host="127.0.0.1", port=int(port), log_level="warning")
+        return
+
+    import httpx
+
+    with tempfile.TemporaryDirectory() as workdir:
+        path = os.path.join(workdir, "large.mp4")
+        make_file(path, args.size_mb)
+
+        print(f"{'mode':>12} {'clients':>8} {'MB/s':>10} {'CPU s/GB':>10}")
+        for mode in args.modes:
+            port = free_port()
+            env = dict(os.environ, DOWNLOAD_MODE="auto" if mode == "fileresponse" else mode)
+            server = subprocess.Popen(
+                [sys.executable, __file__, "--serve", path, mode, str(port)], env=env, cwd=ROOT
+            )
+            base_url = f"http://127.0.0.1:{port}"
+            try:
+                while True:
+                    try:
+                        httpx.get(f"{base_url}/docs")
+                        break
+                    except httpx.TransportError:
+                        time.sleep(0.05)
+                for concurrency in args.concurrency:
+                    downloads = args.downloads or max(20, concurrency)
+                    cpu_before = cpu_seconds(server.pid)
+                    elapsed, transferred = asyncio.run(drive(base_url, concurrency, downloads))
+                    cpu = cpu_seconds(server.pid) - cpu_before
+                    print(
+                        f"{mode:>12} {concurrency:>8} {transferred / elapsed / 1e6:>10.1f}"
+                        f" {cpu / (transferred / 1e9):>10.2f}"
+                    )
+            finally:
+                server.terminate()
+                server.wait()
+
+
+if __name__ == "__main__":
+    main()
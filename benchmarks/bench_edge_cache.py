@@ -0,0 +1,73 @@
+"""Edge cache hit rate and lookup cost on a skewed download workload.
+
+Creates --videos files of --file-kb each and sends --requests lookups whose
+video ids follow a Zipf distribution (exponent --skew), so a few titles get
+most of the traffic. This is replayed for each policy and --promote-after
+value at each cache size (--cache-percent of the catalogue). The report shows
+the hit rate, the copies made and evicted (bytes written to the cache tier),
+and the time per EdgeCache.lookup. Copies run on the cache's background thread
+as in production. Requests wait for a copy to finish, so results do not depend
+on disk speed.
+
+    python benchmarks/bench_edge_cache.py --videos 1000 --requests 50000 --cache-percent 1 5 --promote-after 1 3
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+
+import common  # noqa: F401  (puts the project root on sys.path)
+
+
+def zipf_ids(count: int, videos: int, skew: float, seed: int) -> list:
+    rng = random.Random(seed)
+    weights = [1 / (rank ** skew) for rank in range(1, videos + 1)]
+    return rng.choices(range(1, videos + 1), weights=weights, k=count)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--videos", type=int, default=1000)
+    parser.add_argument("--file-kb", type=int, default=64)
+    parser.add_argument("--requests", type=int, default=50000)
+    parser.add_argument("--skew", type=float, default=1.0, help="Zipf exponent")
+    parser.add_argument("--cache-percent", type=float, nargs="+", default=[1, 5])
+    parser.add_argument("--policies", nargs="+", default=["lru", "lfu"])
+    parser.add_argument("--promote-after", type=int, nargs="+", default=[1, 3])
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    from api.edge_cache import EdgeCache
+
+    requests = zipf_ids(args.requests, args.videos, args.skew, args.seed)
+    size = args.file_kb * 1024
+    with tempfile.TemporaryDirectory() as workdir:
+        origin = os.path.join(workdir, "origin")
+        os.makedirs(origin)
+        paths = {}
+        for video_id in range(1, args.videos + 1):
+            paths[video_id] = os.path.join(origin, f"{video_id}.mp4")
+            with open(paths[video_id], "wb") as handle:
+                handle.write(os.urandom(size))
+
+        print(f"{'cache %':>8} {'policy':>6} {'promote':>8} {'hit rate':>9} {'copies':>7} {'evictions':>10} {'lookup us':>10}")
+        for percent in args.cache_percent:
+            for policy in args.policies:
+                for promote_after in args.promote_after:
+                    cache = EdgeCache(os.path.join(workdir, f"cache-{percent}-{policy}-{promote_after}"),
+                                      max_bytes=int(args.videos * size * percent / 100), policy=policy,
+                                      promote_after=promote_after)
+                    spent = 0.0
+                    for video_id in requests:
+                        began = time.perf_counter()
+                        cache.lookup(video_id, paths[video_id], f"hash{video_id}")
+                        spent += time.perf_counter() - began
+                        cache.jobs.join()
+                    stats = cache.stats(top=0)
+                    print(f"{percent:>8g} {policy:>6} {promote_after:>8} {stats['hit_rate']:>9.1%}"
+                          f" {stats['promotions']:>7} {stats['evictions']:>10} {spent / len(requests) * 1e6:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""Login throughput, and what a login storm does to other requests.
+
+Serves the app from a throwaway database with one user and drives /signin/
+from concurrent clients, while a probe client keeps requesting /search/.
+"event-loop" verifies bcrypt inline in the handler (the old behaviour);
+"pool" uses the bounded password-hashing pool.
+
+    python benchmarks/bench_login.py --clients 32 --seconds 5
+    BCRYPT_ROUNDS=10 PASSWORD_HASH_WORKERS=4 python benchmarks/bench_login.py
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+from common import percentile, serve_in_thread
+
+
+async def drive(base_url: str, clients: int, seconds: float):
+    import httpx
+
+    logins, rejected, probes = [], 0, []
+    deadline = time.perf_counter() + seconds
+    limits = httpx.Limits(max_connections=clients + 1)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=120) as client:
+
+        async def login():
+            nonlocal rejected
+            while time.perf_counter() < deadline:
+                began = time.perf_counter()
+                response = await client.post("/signin/", json={"username": "bench", "password": "bench-password"})
+                if response.status_code == 503:
+                    rejected += 1
+                    continue
+                assert response.status_code == 200, response.status_code
+                logins.append(time.perf_counter() - began)
+
+        async def probe():
+            while time.perf_counter() < deadline:
+                began = time.perf_counter()
+                await client.get("/search/", params={"name": "video"})
+                probes.append(time.perf_counter() - began)
+                await asyncio.sleep(0.01)
+
+        began = time.perf_counter()
+        await asyncio.gather(probe(), *(login() for _ in range(clients)))
+        elapsed = time.perf_counter() - began
+    return elapsed, logins, rejected, probes
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clients", type=int, default=32)
+    parser.add_argument("--seconds", type=float, default=5)
+    parser.add_argument("--modes", nargs="+", choices=["event-loop", "pool"], default=["event-loop", "pool"])
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        os.environ["DATABASE_URL"] = f"sqlite:///{workdir}/bench.db"
+        os.environ.setdefault("REDIS_BACKEND", "memory")
+        from api import auth
+        from api.main import app
+        from api.models import SessionLocal, User, Video
+
+        with SessionLocal() as db:
+            db.add(User(username="bench", email="bench@example.com",
+                        hashed_password=auth.get_password_hash("bench-password")))
+            db.add_all(Video(name=f"video {i}", size=i, path=f"uploads/{i}.mp4") for i in range(100))
+            db.commit()
+
+        pooled = auth.run_password_job
+
+        async def inline(func, *job_args):
+            return func(*job_args)
+
+        server, base_url = serve_in_thread(app)
+        print(f"bcrypt cost {auth.BCRYPT_ROUNDS}, {auth.PASSWORD_HASH_WORKERS} hashing threads, {args.clients} clients")
+        print(f"{'mode':>10} {'logins/s':>9} {'503s':>6} {'login p50':>10} {'login p99':>10} {'probe p50':>10} {'probe p99':>10}")
+        for mode in args.modes:
+            auth.run_password_job = inline if mode == "event-loop" else pooled
+            elapsed, logins, rejected, probes = asyncio.run(drive(base_url, args.clients, args.seconds))
+            print(
+                f"{mode:>10} {len(logins) / elapsed:>9.1f} {rejected:>6}"
+                f" {percentile(logins, 50) * 1000:>8.0f}ms {percentile(logins, 99) * 1000:>8.0f}ms"
+                f" {percentile(probes, 50) * 1000:>8.1f}ms {percentile(probes, 99) * 1000:>8.1f}ms"
+            )
+        server.should_exit = True
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""Per-request cost of the metrics middleware and the SQL timing hooks.
+
+Runs a minimal ASGI app (it sends a 200 with a four-byte body), bare and
+wrapped in MetricsMiddleware, and reports the time per request of each.
+The difference is the middleware's overhead, without the noise of FastAPI's
+own routing. It also times one Histogram.observe call, and SELECT 1 on an
+engine with and without the query timing. The modes alternate for --rounds
+rounds and the best round is kept, which filters out noise from other processes.
+
+    python benchmarks/bench_metrics.py --requests 50000 --rounds 5
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+import common  # noqa: F401  (puts the project root on sys.path)
+
+
+async def endpoint():
+    pass
+
+
+class App:
+    # Stands in for the FastAPI app the middleware reads route templates from
+    class Route:
+        endpoint = endpoint
+        path = "/ping/{item_id}/"
+    routes = [Route]
+
+    # What routing and the endpoint do to the scope and the ASGI channel
+    async def __call__(self, scope, receive, send):
+        scope["endpoint"] = endpoint
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b"pong"})
+
+
+async def time_requests(app, count: int) -> float:
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        pass
+
+    scope = {"type": "http", "method": "GET", "path": "/ping/1/", "headers": [], "app": App()}
+    began = time.perf_counter()
+    for _ in range(count):
+        await app(dict(scope), receive, send)
+    return (time.perf_counter() - began) / count
+
+
+def time_queries(engine, count: int) -> float:
+    from sqlalchemy import text
+
+    samples = []
+    with engine.connect() as conn:
+        for _ in range(count):
+            began = time.perf_counter()
+            conn.execute(text("SELECT 1")).scalar()
+            samples.append(time.perf_counter() - began)
+    return statistics.median(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=50000)
+    parser.add_argument("--rounds", type=int, default=5)
+    args = parser.parse_args()
+
+    from sqlalchemy import create_engine
+    from api.metrics import Histogram, MetricsMiddleware, instrument_engine
+
+    bare = App()
+    measured = MetricsMiddleware(bare)
+    without = min(asyncio.run(time_requests(bare, args.requests)) for _ in range(args.rounds))
+    with_metrics = min(asyncio.run(time_requests(measured, args.requests)) for _ in range(args.rounds))
+
+    histogram = Histogram("bench", "bench", ("route",))
+    began = time.perf_counter()
+    for index in range(args.requests):
+        histogram.observe(("/ping/{item_id}/",), index * 1e-6)
+    observe = (time.perf_counter() - began) / args.requests
+
+    plain_engine = create_engine("sqlite://")
+    hooked_engine = create_engine("sqlite://")
+    instrument_engine(hooked_engine)
+    query_plain = query_hooked = float("inf")
+    for _ in range(args.rounds):
+        query_plain = min(query_plain, time_queries(plain_engine, args.requests))
+        query_hooked = min(query_hooked, time_queries(hooked_engine, args.requests))
+
+    print(f"{'':>26} {'us':>8}")
+    print(f"{'bare ASGI app':>26} {without * 1e6:>8.2f}")
+    print(f"{'with MetricsMiddleware':>26} {with_metrics * 1e6:>8.2f}")
+    print(f"{'middleware overhead':>26} {(with_metrics - without) * 1e6:>8.2f}")
+    print(f"{'Histogram.observe':>26} {observe * 1e6:>8.2f}")
+    print(f"{'SELECT 1 without timing':>26} {query_plain * 1e6:>8.2f}")
+    print(f"{'SELECT 1 with timing':>26} {query_hooked * 1e6:>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""Throughput of many concurrent ranged reads against one large file.
+
+Serves a temporary file through api.streaming.file_response under uvicorn and
+hits it with random single-range GETs from concurrent clients.
+
+    python benchmarks/bench_range_reads.py --size-mb 512 --concurrency 1 32 256 --range-kb 256
+"""
+import argparse
+import asyncio
+import os
+import random
+import tempfile
+import time
+
+from common import make_file, percentile, serve_in_thread
+
+
+async def drive(base_url: str, file_size: int, concurrency: int, requests: int, range_bytes: int):
+    import httpx
+
+    latencies = []
+    transferred = 0
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60) as client:
+        queue = asyncio.Queue()
+        for _ in range(requests):
+            start = random.randrange(0, file_size - range_bytes)
+            queue.put_nowait(f"bytes={start}-{start + range_bytes - 1}")
+
+        async def worker():
+            nonlocal transferred
+            while not queue.empty():
+                header = queue.get_nowait()
+                began = time.perf_counter()
+                response = await client.get("/file", headers={"Range": header})
+                assert response.status_code == 206, response.status_code
+                transferred += len(response.content)
+                latencies.append(time.perf_counter() - began)
+
+        began = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - began
+    return elapsed, transferred, latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size-mb", type=int, default=256)
+    parser.add_argument("--range-kb", type=int, default=256)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 16, 128])
+    args = parser.parse_args()
+
+    from fastapi import FastAPI, Request
+    from api.streaming import file_response
+
+    with tempfile.TemporaryDirectory() as workdir:
+        path = os.path.join(workdir, "large.mp4")
+        make_file(path, args.size_mb)
+        file_size = os.path.getsize(path)
+
+        app = FastAPI()
+
+        @app.get("/file")
+        async def serve(request: Request):
+            return file_response(request, path, "benchmark")
+
+        server, base_url = serve_in_thread(app)
+        print(f"{'clients':>8} {'req/s':>10} {'MB/s':>10} {'p50 ms':>8} {'p99 ms':>8}")
+        for concurrency in args.concurrency:
+            elapsed, transferred, latencies = asyncio.run(
+                drive(base_url, file_size, concurrency, args.requests, args.range_kb * 1024)
+            )
+            print(
+                f"{concurrency:>8} {len(latencies) / elapsed:>10.0f} {transferred / elapsed / 1e6:>10.1f}"
+                f" {percentile(latencies, 50) * 1000:>8.2f} {percentile(latencies, 99) * 1000:>8.2f}"
+            )
+        server.should_exit = True
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""Cost of one rate-limit decision.
+
+Times LocalBuckets.take (the in-process buckets), RateLimiter.take on those
+buckets (adding the coroutine and the circuit-breaker check), client_key on
+a request with a bearer token, and RateLimiter.take through the Redis script.
+Requests cycle over --keys distinct clients. The Redis path runs against
+--redis-url when given, otherwise against fakeredis (which needs lupa for
+scripts). fakeredis interprets the script in Python-hosted Lua and is far
+slower than a server, so only the --redis-url numbers say anything about Redis.
+
+    python benchmarks/bench_rate_limit.py --iterations 100000 --keys 1000
+    python benchmarks/bench_rate_limit.py --redis-url redis://localhost:6379/0
+"""
+import argparse
+import asyncio
+import time
+
+import common  # noqa: F401  (puts the project root on sys.path)
+
+
+async def time_limiter(limiter, keys: list, iterations: int) -> float:
+    began = time.perf_counter()
+    for index in range(iterations):
+        await limiter.take(keys[index % len(keys)], 1000, 1000)
+    return (time.perf_counter() - began) / iterations
+
+
+def redis_client(url: str):
+    if url:
+        import redis.asyncio as redis
+        return redis.Redis.from_url(url)
+    try:
+        import lupa  # noqa: F401
+        import fakeredis
+    except ImportError:
+        return None
+    return fakeredis.aioredis.FakeRedis()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=100000)
+    parser.add_argument("--keys", type=int, default=1000, help="distinct clients the requests cycle over")
+    parser.add_argument("--redis-url", help="Redis server to time the shared buckets against")
+    args = parser.parse_args()
+
+    from starlette.requests import Request
+    from api.auth import create_access_token
+    from api.rate_limit import LocalBuckets, RateLimiter, client_key
+
+    keys = [f"download:user:{index}" for index in range(args.keys)]
+    buckets = LocalBuckets()
+    began = time.perf_counter()
+    for index in range(args.iterations):
+        buckets.take(keys[index % len(keys)], 1000, 1000)
+    local = (time.perf_counter() - began) / args.iterations
+
+    limiter = asyncio.run(time_limiter(RateLimiter(), keys, args.iterations))
+
+    token = create_access_token(data={"sub": "1"})
+    request = Request({"type": "http", "headers": [(b"authorization", f"Bearer {token}".encode())],
+                       "client": ("127.0.0.1", 50000)})
+    began = time.perf_counter()
+    for _ in range(args.iterations):
+        client_key(request)
+    keying = (time.perf_counter() - began) / args.iterations
+
+    client = redis_client(args.redis_url)
+    shared = None
+    if client is not None:
+        # A round trip per decision, so fewer of them
+        shared = asyncio.run(time_limiter(RateLimiter(client), keys, max(1, args.iterations // 10)))
+
+    print(f"{'':>30} {'us':>8}")
+    print(f"{'LocalBuckets.take':>30} {local * 1e6:>8.2f}")
+    print(f"{'RateLimiter.take (local)':>30} {limiter * 1e6:>8.2f}")
+    print(f"{'client_key (bearer token)':>30} {keying * 1e6:>8.2f}")
+    if shared is None:
+        print(f"{'RateLimiter.take (Redis)':>30} {'skipped: pass --redis-url or install lupa':>8}")
+    else:
+        print(f"{'RateLimiter.take (Redis)':>30} {shared * 1e6:>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+"""Search latency: today's LIKE '%term%' scan vs the FTS5 trigram index.
+
+Run gen_catalogue.py first. "rare" terms match a handful of rows (an id
+fragment), "common" terms match a large share of the catalogue.
+
+    python benchmarks/bench_search.py --db /tmp/catalogue.db --queries 200 --limit 50
+"""
+import argparse
+import random
+import sqlite3
+import time
+
+from common import percentile
+from gen_catalogue import WORDS
+
+LIKE_SQL = "SELECT id, name FROM videos WHERE name LIKE ? LIMIT ?"
+# Same shape as the query VideoService.search_videos issues for the first page
+FTS_SQL = (
+    "SELECT videos.id, videos.name FROM videos JOIN ("
+    "SELECT rowid FROM videos_fts WHERE videos_fts MATCH ? AND rowid > 0) AS fts "
+    "ON videos.id = fts.rowid ORDER BY fts.rowid LIMIT ?"
+)
+
+
+def run(conn, sql, params_list, limit):
+    samples = []
+    for params in params_list:
+        began = time.perf_counter()
+        conn.execute(sql, (params, limit)).fetchall()
+        samples.append(time.perf_counter() - began)
+    return samples
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--db", required=True)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--limit", type=int, default=50, help="-1 returns every match, as /search/ did")
+    args = parser.parse_args()
+
+    conn = sqlite3.connect(args.db)
+    conn.execute("PRAGMA mmap_size=268435456")
+    conn.execute("PRAGMA cache_size=-262144")
+    max_id = conn.execute("SELECT MAX(id) FROM videos").fetchone()[0]
+
+    terms = {
+        "rare": [f"{random.randint(1, max_id):08d}"[-6:] for _ in range(args.queries)],
+        "common": [random.choice(WORDS) for _ in range(args.queries)],
+    }
+    print(f"{max_id:,} rows, limit {args.limit}")
+    print(f"{'terms':>8} {'engine':>6} {'p50 ms':>10} {'p99 ms':>10}")
+    for kind, words in terms.items():
+        for engine, sql, params in (
+            ("like", LIKE_SQL, [f"%{word}%" for word in words]),
+            ("fts", FTS_SQL, [f'"{word}"' for word in words]),
+        ):
+            samples = run(conn, sql, params, args.limit)
+            print(f"{kind:>8} {engine:>6} {percentile(samples, 50) * 1000:>10.3f} {percentile(samples, 99) * 1000:>10.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""Time to load and serialize a 10k-row video response.
+
+Seeds a throwaway database with --rows videos, then builds the /search/ body
+for all of them several ways and reports the median load (query + row objects)
+and encode (Python objects to response bytes) times:
+
+  orm        ORM instances through jsonable_encoder + JSONResponse (the old block/unblock path)
+  mappings   RowMapping dicts through jsonable_encoder + JSONResponse (the old search path)
+  model      the same dicts validated into SearchResponse and dumped by pydantic (response_model)
+  orjson     plain tuples zipped into dicts + ORJSONResponse (the current path)
+
+    python benchmarks/bench_serialization.py --rows 10000 --repeat 20
+"""
+import argparse
+import os
+import statistics
+import tempfile
+import time
+
+import common  # noqa: F401  (puts the project root on sys.path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=10_000)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        os.environ["DATABASE_URL"] = f"sqlite:///{workdir}/bench.db"
+        os.environ.setdefault("REDIS_BACKEND", "memory")
+        from fastapi.encoders import jsonable_encoder
+        from fastapi.responses import JSONResponse, ORJSONResponse
+        from sqlalchemy import select
+        from api.models import SessionLocal, Video
+        from api.schemas import SearchResponse
+        from api.serialization import VIDEO_COLUMNS, rows_as_dicts
+
+        with SessionLocal() as db:
+            db.add_all(
+                Video(name=f"video {i}.mp4", size=i * 1000.0, path=f"uploads/{i}.mp4", content_hash=f"{i:064x}",
+                      duration=i % 600, video_codec="h264", audio_codec="aac", width=1920, height=1080,
+                      bitrate=4_000_000)
+                for i in range(args.rows)
+            )
+            db.commit()
+
+        columns = [Video.__table__.c[name] for name in VIDEO_COLUMNS]
+        query = select(*columns).order_by(Video.id).limit(args.rows)
+
+        def load_orm(db):
+            return list(db.scalars(select(Video).order_by(Video.id).limit(args.rows)))
+
+        def load_mappings(db):
+            return [dict(row) for row in db.execute(query).mappings().all()]
+
+        def load_tuples(db):
+            return rows_as_dicts(VIDEO_COLUMNS, db.execute(query).tuples().all())
+
+        def encode_default(data):
+            return JSONResponse(jsonable_encoder({"status": True, "data": data, "next_cursor": None})).body
+
+        def encode_model(data):
+            return SearchResponse.model_validate({"status": True, "data": data, "next_cursor": None}).model_dump_json()
+
+        def encode_orjson(data):
+            return ORJSONResponse({"status": True, "data": data, "next_cursor": None}).body
+
+        modes = [
+            ("orm", load_orm, encode_default),
+            ("mappings", load_mappings, encode_default),
+            ("model", load_mappings, encode_model),
+            ("orjson", load_tuples, encode_orjson),
+        ]
+        print(f"{args.rows} rows, median of {args.repeat}")
+        print(f"{'mode':>9} {'load ms':>9} {'encode ms':>10} {'total ms':>9} {'bytes':>10}")
+        for label, load, encode in modes:
+            loads, encodes = [], []
+            for _ in range(args.repeat):
+                # A fresh session each time, as each request gets one
+                with SessionLocal() as db:
+                    began = time.perf_counter()
+                    data = load(db)
+                    loaded = time.perf_counter()
+                    body = encode(data)
+                    encoded = time.perf_counter()
+                loads.append(loaded - began)
+                encodes.append(encoded - loaded)
+            load_ms, encode_ms = statistics.median(loads) * 1000, statistics.median(encodes) * 1000
+            print(f"{label:>9} {load_ms:>9.1f} {encode_ms:>10.1f} {load_ms + encode_ms:>9.1f} {len(body):>10,}")
+
+
+if __name__ == "__main__":
+    main()
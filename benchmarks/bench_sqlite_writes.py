@@ -0,0 +1,90 @@
+"""Block/unblock write throughput under concurrent readers, per SQLite profile.
+
+Each profile runs in its own process (settings are read at import time)
+against a fresh temporary database seeded with --videos rows.
+
+    python benchmarks/bench_sqlite_writes.py --writers 32 --readers 32 --seconds 5
+"""
+import argparse
+import asyncio
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+from common import ROOT
+
+PROFILES = {
+    "rollback-journal": {"SQLITE_JOURNAL_MODE": "DELETE", "SQLITE_SYNCHRONOUS": "FULL",
+                         "SQLITE_MMAP_SIZE": "0", "SQLITE_CACHE_SIZE": ""},
+    "wal": {},
+    "wal+batching": {"SQLITE_WRITE_BATCHING": "1"},
+}
+
+
+async def run(args):
+    from api import services
+    from api.models import AsyncSessionLocal, SessionLocal, Video
+
+    with SessionLocal() as db:
+        db.add_all(Video(name=f"video {i}", size=i, path=f"uploads/{i}.mp4") for i in range(args.videos))
+        db.commit()
+
+    writes = reads = 0
+    deadline = time.perf_counter() + args.seconds
+
+    async def writer():
+        nonlocal writes
+        while time.perf_counter() < deadline:
+            async with AsyncSessionLocal() as db:
+                service = services.VideoService(db)
+                video_id = random.randint(1, args.videos)
+                await service.set_block_status(video_id, writes % 2 == 0)
+            writes += 1
+
+    async def reader():
+        nonlocal reads
+        while time.perf_counter() < deadline:
+            async with AsyncSessionLocal() as db:
+                await services.VideoService(db).get_video_by_id(random.randint(1, args.videos))
+            reads += 1
+
+    began = time.perf_counter()
+    await asyncio.gather(*[writer() for _ in range(args.writers)], *[reader() for _ in range(args.readers)])
+    elapsed = time.perf_counter() - began
+    print(f"{writes / elapsed:.0f} {reads / elapsed:.0f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--videos", type=int, default=10000)
+    parser.add_argument("--writers", type=int, default=16)
+    parser.add_argument("--readers", type=int, default=16)
+    parser.add_argument("--seconds", type=float, default=5)
+    parser.add_argument("--profiles", nargs="+", choices=list(PROFILES), default=list(PROFILES))
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        asyncio.run(run(args))
+        return
+
+    print(f"{'profile':>18} {'writes/s':>10} {'reads/s':>10}")
+    for profile in args.profiles:
+        with tempfile.TemporaryDirectory() as workdir:
+            # The benchmark measures the database only, not a Redis round trip
+            env = dict(os.environ, DATABASE_URL=f"sqlite:///{workdir}/bench.db", REDIS_BACKEND="memory",
+                       **PROFILES[profile])
+            output = subprocess.run(
+                [sys.executable, __file__, "--child", "--videos", str(args.videos), "--writers", str(args.writers),
+                 "--readers", str(args.readers), "--seconds", str(args.seconds)],
+                env=env, cwd=ROOT, check=True, capture_output=True, text=True,
+            ).stdout.split()
+            writes, reads = output[-2:]
+            print(f"{profile:>18} {writes:>10} {reads:>10}")
+
+
+if __name__ == "__main__":
+    main()
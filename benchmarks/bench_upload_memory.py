@@ -0,0 +1,81 @@
+"""Peak RSS of VideoService.upload_video as the upload size grows.
+
+Each size runs in a fresh child process against a throwaway database and
+upload directory, so ru_maxrss reflects that single upload only.
+
+    python benchmarks/bench_upload_memory.py --sizes 16 64 256 1024
+    python benchmarks/bench_upload_memory.py --mode buffered   # old read()-everything path
+"""
+import argparse
+import asyncio
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def run_child(size_mb: int, mode: str):
+    sys.path.insert(0, ROOT)
+    # The benchmark measures the write path only, not a Redis round trip
+    os.environ.setdefault("REDIS_BACKEND", "memory")
+    from fastapi import UploadFile
+    from api import services
+    from api.models import AsyncSessionLocal
+
+    source = tempfile.NamedTemporaryFile(dir=os.environ["UPLOAD_DIR"], delete=False)
+    block = os.urandom(1024 * 1024)
+    for _ in range(size_mb):
+        source.write(block)
+    source.close()
+    baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    async def upload():
+        with open(source.name, "rb") as handle:
+            file = UploadFile(file=handle, filename="bench.bin", size=size_mb * 1024 * 1024)
+            if mode == "buffered":
+                with open(os.path.join(os.environ["UPLOAD_DIR"], "buffered.bin"), "wb") as out:
+                    out.write(await file.read())
+            else:
+                async with AsyncSessionLocal() as db:
+                    await services.VideoService(db).upload_video(file)
+
+    asyncio.run(upload())
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    print(f"{baseline} {peak}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[16, 64, 256], help="upload sizes in MB")
+    parser.add_argument("--mode", choices=["streaming", "buffered"], default="streaming")
+    parser.add_argument("--child", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child is not None:
+        run_child(args.child, args.mode)
+        return
+
+    print(f"{'size MB':>8} {'baseline RSS MB':>16} {'peak RSS MB':>12} {'growth MB':>10}  ({args.mode})")
+    for size_mb in args.sizes:
+        with tempfile.TemporaryDirectory() as workdir:
+            env = dict(
+                os.environ,
+                DATABASE_URL=f"sqlite:///{workdir}/bench.db",
+                UPLOAD_DIR=workdir,
+                UPLOAD_MAX_SIZE="0",
+                TRANSCODE_ENABLED="0",
+                METADATA_ENABLED="0",
+            )
+            output = subprocess.run(
+                [sys.executable, __file__, "--child", str(size_mb), "--mode", args.mode],
+                env=env, cwd=ROOT, check=True, capture_output=True, text=True,
+            ).stdout.split()
+            baseline, peak = (int(value) / 1024 for value in output[-2:])
+            print(f"{size_mb:>8} {baseline:>16.1f} {peak:>12.1f} {peak - baseline:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
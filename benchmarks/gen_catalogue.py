@@ -0,0 +1,66 @@
+"""Generate a synthetic video catalogue for search benchmarks.
+
+Creates the schema (including the FTS index) through api.models, then bulk
+inserts rows with sqlite3. 10M rows take several minutes and ~2 GB on disk.
+
+    python benchmarks/gen_catalogue.py --db /tmp/catalogue.db --rows 10000000
+"""
+import argparse
+import os
+import random
+import sqlite3
+import subprocess
+import sys
+import time
+
+from common import ROOT
+
+WORDS = (
+    "holiday beach mountain city night drone wedding concert tutorial cooking travel review "
+    "unboxing gameplay trailer interview lecture webinar football tennis sunset timelapse "
+    "birthday family puppy kitten festival roadtrip skiing surfing hiking recipe podcast"
+).split()
+
+
+def video_name(index: int) -> str:
+    words = random.sample(WORDS, 3)
+    return f"{words[0]}_{words[1]}_{words[2]}_{index:08d}.mp4"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--db", required=True)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--batch", type=int, default=100_000)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    # Create the application schema exactly as the app would
+    subprocess.run(
+        [sys.executable, "-c", "import api.models"],
+        env=dict(os.environ, DATABASE_URL=f"sqlite:///{os.path.abspath(args.db)}"), cwd=ROOT, check=True,
+    )
+
+    conn = sqlite3.connect(args.db)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=OFF")
+    start = conn.execute("SELECT COALESCE(MAX(id), 0) FROM videos").fetchone()[0]
+    began = time.perf_counter()
+    for offset in range(0, args.rows, args.batch):
+        count = min(args.batch, args.rows - offset)
+        rows = []
+        for index in range(start + offset + 1, start + offset + count + 1):
+            name = video_name(index)
+            rows.append((name, random.randint(10_000, 5_000_000_000), f"uploads/{name}", int(random.random() < 0.02)))
+        with conn:
+            conn.executemany("INSERT INTO videos (name, size, path, is_blocked) VALUES (?, ?, ?, ?)", rows)
+        print(f"{offset + count:>12,} rows  {time.perf_counter() - began:7.1f}s", end="\r", flush=True)
+    conn.execute("INSERT INTO videos_fts(videos_fts) VALUES ('optimize')")
+    conn.commit()
+    conn.close()
+    print(f"\ninserted {args.rows:,} rows into {args.db}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,230 @@
+"""Load test of the whole API against an isolated, seeded instance.
+
+Creates a throwaway database and upload directory, seeds --users users and
+--videos videos (spread over --files stored files), and serves the app with
+uvicorn in this process. Redis is the in-memory stand-in, and transcoding,
+probing, packaging and rate limiting are off, so only the request path is measured.
+Each scenario then runs for --seconds at each --concurrency:
+
+  token     POST /token with a random seeded user (one bcrypt verify each)
+  search    GET /search/ for a random name term, --limit rows
+  download  GET /download/ of a random video
+  upload    POST /upload/ of --upload-kb random bytes
+  block     POST /block/ or /unblock/ of a random video, alternating
+
+Prints throughput and latency percentiles, and writes them as JSON with
+--json for comparing commits; --compare prints the change against such a file.
+Client and server share one process and one core's worth of GIL, so the
+numbers are for comparing runs on the same machine, not for capacity planning.
+
+    python benchmarks/loadtest.py --users 1000 --videos 100000 --concurrency 1 16 64 --json results.json
+    git checkout other-branch && python benchmarks/loadtest.py --compare results.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+from common import ROOT, percentile, serve_in_thread
+
+SCENARIOS = ["token", "search", "download", "upload", "block"]
+WORDS = ["holiday", "beach", "meeting", "concert", "tutorial", "trailer", "interview", "recap"]
+PASSWORD = "loadtest-password"
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def seed(args, upload_dir: str):
+    from sqlalchemy import insert
+    from api import auth
+    from api.models import SessionLocal, User, Video
+
+    paths = []
+    for index in range(args.files):
+        path = os.path.join(upload_dir, f"seed-{index}.mp4")
+        with open(path, "wb") as handle:
+            handle.write(os.urandom(args.file_kb * 1024))
+        paths.append(path)
+
+    # One hash for everyone: seeding would otherwise take --users bcrypt rounds
+    hashed = auth.get_password_hash(PASSWORD)
+    rng = random.Random(args.seed)
+    with SessionLocal() as db:
+        db.execute(insert(User), [
+            {"username": f"user{i}", "email": f"user{i}@example.com", "hashed_password": hashed,
+             "is_active": True, "is_admin": i == 0}
+            for i in range(args.users)
+        ])
+        db.execute(insert(Video), [
+            {"name": f"{rng.choice(WORDS)} {rng.choice(WORDS)} {i}.mp4", "size": args.file_kb * 1024,
+             "path": paths[i % len(paths)], "is_blocked": 0, "status": "ready"}
+            for i in range(args.videos)
+        ])
+        db.commit()
+
+
+# Request factories: each takes the client and a random generator and returns the response
+def scenarios(args, headers: dict) -> dict:
+    upload_body = os.urandom(args.upload_kb * 1024)
+
+    async def token(client, rng):
+        form = {"username": f"user{rng.randrange(args.users)}", "password": PASSWORD}
+        return await client.post("/token", data=form)
+
+    async def search(client, rng):
+        params = {"name": rng.choice(WORDS), "limit": args.limit}
+        return await client.get("/search/", params=params, headers=headers)
+
+    async def download(client, rng):
+        return await client.get(f"/download/{rng.randrange(1, args.videos + 1)}/")
+
+    async def upload(client, rng):
+        files = {"file": ("loadtest.mp4", upload_body, "video/mp4")}
+        return await client.post("/upload/", files=files, headers=headers)
+
+    async def block(client, rng):
+        action = rng.choice(["block", "unblock"])
+        return await client.post(f"/{action}/{rng.randrange(1, args.videos + 1)}/")
+
+    return {"token": token, "search": search, "download": download, "upload": upload, "block": block}
+
+
+async def drive(base_url: str, request, concurrency: int, seconds: float, seed: int):
+    import httpx
+
+    latencies, errors = [], 0
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=120) as client:
+        deadline = time.perf_counter() + seconds
+
+        async def worker(index: int):
+            nonlocal errors
+            rng = random.Random(seed * 1000 + index)
+            while time.perf_counter() < deadline:
+                began = time.perf_counter()
+                try:
+                    response = await request(client, rng)
+                    failed = response.status_code >= 400
+                except httpx.HTTPError:
+                    failed = True
+                if failed:
+                    errors += 1
+                else:
+                    latencies.append(time.perf_counter() - began)
+
+        began = time.perf_counter()
+        await asyncio.gather(*(worker(index) for index in range(concurrency)))
+        elapsed = time.perf_counter() - began
+    return {
+        "concurrency": concurrency,
+        "requests": len(latencies) + errors,
+        "errors": errors,
+        "seconds": round(elapsed, 3),
+        "throughput_rps": round(len(latencies) / elapsed, 2),
+        "mean_ms": round(sum(latencies) / len(latencies) * 1000, 3) if latencies else None,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 3),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 3),
+        "max_ms": round(max(latencies) * 1000, 3) if latencies else None,
+    }
+
+
+def print_results(results: list):
+    print(f"{'scenario':>9} {'conc':>5} {'req/s':>9} {'errors':>7} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    for row in results:
+        print(f"{row['scenario']:>9} {row['concurrency']:>5} {row['throughput_rps']:>9.1f} {row['errors']:>7}"
+              f" {row['p50_ms']:>8.2f} {row['p95_ms']:>8.2f} {row['p99_ms']:>8.2f}")
+
+
+# Relative change in throughput and p99 against a previous --json file, per scenario and concurrency
+def print_comparison(results: list, baseline_path: str):
+    with open(baseline_path) as handle:
+        baseline = json.load(handle)
+    previous = {(row["scenario"], row["concurrency"]): row for row in baseline["results"]}
+    print(f"\ncompared with {baseline.get('commit') or baseline_path}")
+    print(f"{'scenario':>9} {'conc':>5} {'req/s':>9} {'p99':>9}")
+    for row in results:
+        before = previous.get((row["scenario"], row["concurrency"]))
+        if not before or not before["throughput_rps"] or not before["p99_ms"]:
+            continue
+        rps = (row["throughput_rps"] / before["throughput_rps"] - 1) * 100
+        p99 = (row["p99_ms"] / before["p99_ms"] - 1) * 100
+        print(f"{row['scenario']:>9} {row['concurrency']:>5} {rps:>+8.1f}% {p99:>+8.1f}%")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--videos", type=int, default=100_000)
+    parser.add_argument("--files", type=int, default=16, help="distinct stored files the videos point at")
+    parser.add_argument("--file-kb", type=int, default=1024)
+    parser.add_argument("--upload-kb", type=int, default=256)
+    parser.add_argument("--limit", type=int, default=50, help="search page size")
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=SCENARIOS)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 16, 64])
+    parser.add_argument("--seconds", type=float, default=5)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", help="write the results to this file")
+    parser.add_argument("--compare", help="results file of an earlier run to compare against")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        upload_dir = os.path.join(workdir, "uploads")
+        os.makedirs(upload_dir)
+        os.environ["DATABASE_URL"] = f"sqlite:///{workdir}/loadtest.db"
+        os.environ["UPLOAD_DIR"] = upload_dir
+        os.environ["REDIS_BACKEND"] = "memory"
+        os.environ["STORAGE_BACKEND"] = "local"
+        os.environ["TRANSCODE_ENABLED"] = "0"
+        os.environ["METADATA_ENABLED"] = "0"
+        os.environ["PACKAGING_ENABLED"] = "0"
+        os.environ["RATE_LIMIT_ENABLED"] = "0"
+        from api.auth import create_access_token
+        from api.main import app
+
+        began = time.perf_counter()
+        seed(args, upload_dir)
+        print(f"seeded {args.users} users and {args.videos} videos in {time.perf_counter() - began:.1f}s")
+
+        # user0 is the admin; its id is 1 in the fresh database
+        headers = {"Authorization": f"Bearer {create_access_token(data={'sub': '1'})}"}
+        requests = scenarios(args, headers)
+        server, base_url = serve_in_thread(app)
+        results = []
+        for name in args.scenarios:
+            for concurrency in args.concurrency:
+                row = asyncio.run(drive(base_url, requests[name], concurrency, args.seconds, args.seed))
+                results.append({"scenario": name, **row})
+        server.should_exit = True
+
+    print_results(results)
+    report = {
+        "commit": git_commit(),
+        "created_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "config": {key: value for key, value in vars(args).items() if key not in ("json", "compare")},
+        "results": results,
+    }
+    if args.json:
+        with open(args.json, "w") as handle:
+            json.dump(report, handle, indent=2)
+    if args.compare:
+        print_comparison(results, args.compare)
+
+
+if __name__ == "__main__":
+    main()
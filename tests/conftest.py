@@ -0,0 +1,66 @@
+import os
+import sys
+import stat
+import sqlite3
+import tempfile
+from io import BytesIO
+
+# Run the suite against the in-process Redis stand-in unless a backend is chosen explicitly.
+# Set before any test module imports the app, since settings are read at import time.
+os.environ.setdefault("REDIS_BACKEND", "memory")
+
+# Every module signs in as the same client; tests/test_rate_limit.py turns the limits on itself
+os.environ.setdefault("RATE_LIMIT_ENABLED", "0")
+
+# Run against a copy of videos.db (for its seeded users) and a scratch upload directory,
+# so the suite leaves neither database rows nor stored files in the working tree
+scratch = tempfile.TemporaryDirectory(prefix="video-tests-")
+if "DATABASE_URL" not in os.environ:
+    database = os.path.join(scratch.name, "videos.db")
+    source = sqlite3.connect(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "videos.db"))
+    copy = sqlite3.connect(database)
+    source.backup(copy)
+    source.close()
+    copy.close()
+    os.environ["DATABASE_URL"] = f"sqlite:///{database}"
+os.environ.setdefault("UPLOAD_DIR", os.path.join(scratch.name, "uploads"))
+
+# Imported after the settings above
+import pytest
+from fastapi.testclient import TestClient
+from api.main import app
+
+
+# Test client shared by the modules that take it as a fixture
+@pytest.fixture(scope="session")
+def client():
+    return TestClient(app)
+
+# Authorization header of the seeded admin user
+@pytest.fixture(scope="session")
+def admin_headers(client):
+    response = client.post("/signin/", json={"username": "admin", "password": "admin"})
+    assert response.status_code == 200
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+# Factory for stand-ins of ffmpeg and ffprobe: writes `source`, a Python script formatted with
+# the interpreter path and `fields`, as an executable in tmp_path and returns its path
+@pytest.fixture
+def fake_binary(tmp_path):
+    def make(name: str, source: str, **fields) -> str:
+        path = tmp_path / name
+        path.write_text(source.format(python=sys.executable, **fields))
+        path.chmod(path.stat().st_mode | stat.S_IEXEC)
+        return str(path)
+    return make
+
+# Upload `content` (random bytes by default) through /upload/ as the admin; returns the response data
+@pytest.fixture
+def upload(client, admin_headers):
+    def post(content: bytes = None, filename: str = "upload.mp4", media_type: str = "video/mp4") -> dict:
+        content = os.urandom(64) if content is None else content
+        files = {"file": (filename, BytesIO(content), media_type)}
+        response = client.post("/upload/", files=files, headers=admin_headers)
+        assert response.status_code == 200
+        return response.json()["data"]
+    return post
@@ -0,0 +1,47 @@
+import os
+import pytest
+from api.blob_store import blob_path, delete_blob_file, release_blob
+from api.models import SessionLocal, Blob
+from api.config import UPLOAD_DIR
+
+@pytest.fixture(autouse=True)
+def no_transcoding(monkeypatch):
+    # Keep the background conversion from swapping blobs under the test
+    monkeypatch.setattr("api.services.TRANSCODE_ENABLED", False)
+
+def test_blob_path_is_sharded():
+    content_hash = "abcdef" + "0" * 58
+    assert blob_path(content_hash) == os.path.join(UPLOAD_DIR, "ab", "cd", content_hash)
+
+def test_duplicate_uploads_share_one_blob(upload):
+    content = os.urandom(64)
+    first = upload(content, "dedupe.mp4")
+    second = upload(content, "copy.mp4")
+
+    assert first["path"] == second["path"] == blob_path(first["content_hash"])
+    assert first["name"] == "dedupe.mp4" and second["name"] == "copy.mp4"
+    with open(first["path"], "rb") as stored:
+        assert stored.read() == content
+    with SessionLocal() as db:
+        assert db.get(Blob, first["content_hash"]).ref_count == 2
+
+    # The file goes with the last reference
+    with SessionLocal() as db:
+        assert release_blob(db, first["content_hash"]) == (True, None)
+        db.commit()
+        assert os.path.exists(first["path"])
+        stored, orphan = release_blob(db, first["content_hash"])
+        assert stored and orphan == first["path"]
+        # Nothing is deleted before the commit, so a rollback keeps the file
+        db.rollback()
+        assert os.path.exists(first["path"])
+        assert db.get(Blob, first["content_hash"]).ref_count == 1
+        stored, orphan = release_blob(db, first["content_hash"])
+        db.commit()
+        assert db.get(Blob, first["content_hash"]) is None
+    delete_blob_file(orphan)
+    assert not os.path.exists(first["path"])
+
+def test_release_of_unknown_hash_is_a_no_op():
+    with SessionLocal() as db:
+        assert release_blob(db, "f" * 64) == (False, None)
@@ -0,0 +1,130 @@
+import time
+import anyio
+import redis
+from api import redis_service
+from api.circuit_breaker import CircuitBreaker
+from api.local_cache import TTLCache, MISSING
+from api.redis_service import block_status_cache, redis_client, handle_invalidation
+
+def test_ttl_cache_evicts_least_recently_used():
+    cache = TTLCache(maxsize=2, ttl=60)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+    assert cache.get("b") is MISSING
+    assert cache.get("a") == 1 and cache.get("c") == 3
+
+def test_ttl_cache_expires_entries():
+    cache = TTLCache(maxsize=10, ttl=0.01)
+    cache.set("a", False)
+    assert cache.get("a") is False
+    time.sleep(0.02)
+    assert cache.get("a") is MISSING
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 1
+
+# A cold Redis must not let a blocked video through
+def test_cold_cache_falls_back_to_database(client, admin_headers):
+    client.post("/block/1/")
+    anyio.run(redis_client.delete, "video_block_status:1")
+    block_status_cache.clear()
+
+    before = client.get("/stats/block-cache/", headers=admin_headers).json()["data"]
+    response = client.get("/download/1/")
+    assert response.status_code == 403
+
+    after = client.get("/stats/block-cache/", headers=admin_headers).json()["data"]
+    assert after["database_fallbacks"] == before["database_fallbacks"] + 1
+    # The database answer repopulates both tiers
+    assert int(anyio.run(redis_client.get, "video_block_status:1")) == 1
+    assert block_status_cache.get(1) is True
+
+    client.get("/download/1/")
+    final = client.get("/stats/block-cache/", headers=admin_headers).json()["data"]
+    assert final["local_hits"] == after["local_hits"] + 1
+
+# A block written while the fallback reads the database must survive the fill
+def test_database_fill_does_not_overwrite_block():
+    anyio.run(redis_client.delete, "video_block_status:424244")
+    block_status_cache.clear()
+
+    async def load_from_db():
+        await redis_service.cache_block_status(424244, True)
+        block_status_cache.clear()
+        return False
+
+    assert anyio.run(redis_service.is_video_blocked, 424244, load_from_db) is True
+    assert int(anyio.run(redis_client.get, "video_block_status:424244")) == 1
+    assert block_status_cache.get(424244) is True
+    anyio.run(redis_client.delete, "video_block_status:424244")
+
+# A change published by another worker evicts the local entry; our own messages are ignored
+def test_invalidation_from_other_worker():
+    block_status_cache.set(424242, True)
+    block_status_cache.set(424243, True)
+    handle_invalidation(b"other-worker:424242")
+    handle_invalidation(f"{redis_service.WORKER_ID}:424243".encode())
+    assert block_status_cache.get(424242) is MISSING
+    assert block_status_cache.get(424243) is True
+
+def test_circuit_breaker_opens_and_retries_after_cooldown():
+    breaker = CircuitBreaker(threshold=2, cooldown=0.01)
+    breaker.record_failure()
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == "open" and not breaker.allow()
+    time.sleep(0.02)
+    # One trial call after the cooldown, then closed again on success
+    assert breaker.allow() and not breaker.allow()
+    breaker.record_success()
+    assert breaker.state == "closed" and breaker.trips == 1
+
+class DownRedis:
+    def __init__(self):
+        self.calls = 0
+
+    def __getattr__(self, name):
+        async def fail(*args, **kwargs):
+            self.calls += 1
+            raise redis.ConnectionError("connection refused")
+        return fail
+
+    def pipeline(self, transaction=True):
+        raise redis.ConnectionError("connection refused")
+
+# With Redis down, block checks are answered from the database and the breaker stops the retries
+def test_redis_outage_falls_back_to_database(client, monkeypatch):
+    down = DownRedis()
+    monkeypatch.setattr(redis_service, "redis_client", down)
+    monkeypatch.setattr(redis_service, "redis_breaker", CircuitBreaker(threshold=2, cooldown=60))
+
+    assert client.post("/block/1/").status_code == 200
+    for _ in range(3):
+        block_status_cache.clear()
+        assert client.get("/download/1/").status_code == 403
+    # The failed block write and its replay trip the breaker before any GET is sent
+    assert redis_service.redis_breaker.state == "open"
+    assert down.calls == 0
+
+    monkeypatch.undo()
+    client.post("/unblock/1/")
+
+# A block written while the breaker is open must not leave the old "unblocked" value in Redis
+def test_block_during_outage_is_not_lost(client, monkeypatch):
+    client.post("/unblock/1/")
+    assert int(anyio.run(redis_client.get, "video_block_status:1")) == 0
+    assert anyio.run(redis_client.ttl, "video_block_status:1") > 0
+
+    breaker = CircuitBreaker(threshold=1, cooldown=60)
+    breaker.record_failure()
+    monkeypatch.setattr(redis_service, "redis_breaker", breaker)
+    assert client.post("/block/1/").status_code == 200
+    assert 1 in redis_service.unsynced_ids
+
+    # Redis is back and the local entry has expired: the stale key is dropped, the database answers
+    breaker.record_success()
+    block_status_cache.clear()
+    assert client.get("/download/1/").status_code == 403
+    assert not redis_service.unsynced_ids
+    assert int(anyio.run(redis_client.get, "video_block_status:1")) == 1
+    client.post("/unblock/1/")
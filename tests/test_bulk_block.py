@@ -0,0 +1,83 @@
+import anyio
+import pytest
+from api import services
+from api.models import SessionLocal, Video
+from api.redis_service import block_status_cache, redis_client, handle_invalidation
+from api.local_cache import MISSING
+from api.services import generate_unique_string
+
+# Videos with a random marker in their names, removed again after each test
+@pytest.fixture()
+def videos():
+    marker = generate_unique_string(8)
+    db = SessionLocal()
+    rows = [Video(name=f"bulk_{marker}_{i}.mp4", size=i, path=f"uploads/{i}.mp4") for i in range(5)]
+    db.add_all(rows)
+    db.commit()
+    yield marker, [row.id for row in rows]
+    for row in rows:
+        db.delete(row)
+    db.commit()
+    db.close()
+
+def stored_flags(ids):
+    with SessionLocal() as db:
+        return dict(db.query(Video.id, Video.is_blocked).filter(Video.id.in_(ids)).all())
+
+def test_bulk_block_by_ids(client, admin_headers, videos, monkeypatch):
+    # Small batches so several UPDATE statements share the transaction
+    monkeypatch.setattr(services, "BULK_BLOCK_BATCH_SIZE", 2)
+    marker, ids = videos
+    missing = max(ids) + 1000
+    response = client.post("/block/bulk/", json={"ids": [*ids, ids[0], missing]}, headers=admin_headers)
+    assert response.status_code == 200
+    data = response.json()["data"]
+    assert data["updated"] == ids and data["not_found"] == [missing]
+    assert data["updated_count"] == len(ids)
+
+    assert set(stored_flags(ids).values()) == {1}
+    for video_id in ids:
+        assert int(anyio.run(redis_client.get, f"video_block_status:{video_id}")) == 1
+        assert block_status_cache.get(video_id) is True
+    assert client.get(f"/download/{ids[0]}/").status_code == 403
+
+def test_bulk_unblock_by_filter(client, admin_headers, videos, monkeypatch):
+    monkeypatch.setattr(services, "BULK_BLOCK_BATCH_SIZE", 2)
+    marker, ids = videos
+    client.post("/block/bulk/", json={"ids": ids}, headers=admin_headers)
+
+    response = client.post("/unblock/bulk/", json={"filter": {"name": marker, "min_size": 1}}, headers=admin_headers)
+    data = response.json()["data"]
+    assert data["updated"] == ids[1:] and data["next_cursor"] is None
+    assert stored_flags(ids) == {ids[0]: 1, **{video_id: 0 for video_id in ids[1:]}}
+
+def test_bulk_filter_stops_at_limit_and_resumes(client, admin_headers, videos, monkeypatch):
+    monkeypatch.setattr(services, "BULK_BLOCK_BATCH_SIZE", 2)
+    monkeypatch.setattr(services, "BULK_BLOCK_MAX_IDS", 3)
+    marker, ids = videos
+    first = client.post("/block/bulk/", json={"filter": {"name": marker}}, headers=admin_headers).json()["data"]
+    assert first["updated"] == ids[:3] and first["next_cursor"] == ids[2]
+
+    rest = client.post(
+        "/block/bulk/", json={"filter": {"name": marker, "cursor": first["next_cursor"]}}, headers=admin_headers
+    ).json()["data"]
+    assert rest["updated"] == ids[3:] and rest["next_cursor"] is None
+
+@pytest.mark.parametrize("body", [
+    {},
+    {"ids": []},
+    {"ids": [1], "filter": {"name": "x"}},
+    {"filter": {}},
+])
+def test_bulk_block_rejects_invalid_requests(client, admin_headers, body):
+    assert client.post("/block/bulk/", json=body, headers=admin_headers).status_code == 422
+
+def test_bulk_block_requires_admin(client):
+    assert client.post("/block/bulk/", json={"ids": [1]}).status_code == 401
+
+def test_invalidation_message_with_many_ids():
+    block_status_cache.set(525252, True)
+    block_status_cache.set(525253, False)
+    handle_invalidation(b"other-worker:525252,525253")
+    assert block_status_cache.get(525252) is MISSING
+    assert block_status_cache.get(525253) is MISSING
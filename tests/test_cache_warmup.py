@@ -0,0 +1,28 @@
+import anyio
+from api.cache_warmup import warm_block_status_cache
+from api.models import SessionLocal, Video
+from api.redis_service import redis_client
+
+def test_warm_block_status_cache():
+    db = SessionLocal()
+    videos = db.query(Video).all()
+    db.close()
+    anyio.run(redis_client.delete, *[f"video_block_status:{video.id}" for video in videos])
+
+    # Small batches so the keyset loop runs more than once
+    assert anyio.run(warm_block_status_cache, 2) == len(videos)
+    for video in videos:
+        assert int(anyio.run(redis_client.get, f"video_block_status:{video.id}")) == video.is_blocked
+
+def test_warmup_keeps_newer_statuses():
+    db = SessionLocal()
+    video = db.query(Video).first()
+    db.close()
+    key = f"video_block_status:{video.id}"
+    # A block written after the warmup read its batch must not be overwritten with the stale row
+    anyio.run(redis_client.set, key, int(not video.is_blocked))
+    try:
+        anyio.run(warm_block_status_cache)
+        assert int(anyio.run(redis_client.get, key)) == int(not video.is_blocked)
+    finally:
+        anyio.run(redis_client.delete, key)
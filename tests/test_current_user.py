@@ -0,0 +1,59 @@
+import pytest
+from api.auth import create_access_token
+from api.dependencies import user_cache, invalidate_user
+from api.models import SessionLocal, User
+
+@pytest.fixture
+def admin_user():
+    db = SessionLocal()
+    db.query(User).filter(User.username == "cacheduser").delete()
+    user = User(username="cacheduser", email="cacheduser@example.com", hashed_password="x", is_admin=True)
+    db.add(user)
+    db.commit()
+    db.refresh(user)
+    yield db, user
+    db.delete(user)
+    db.commit()
+    db.close()
+    invalidate_user(user.id)
+
+def auth_headers(user_id: int) -> dict:
+    return {"Authorization": f"Bearer {create_access_token(data={'sub': user_id})}"}
+
+def test_repeated_requests_use_cached_user(client, admin_user):
+    db, user = admin_user
+    headers = auth_headers(user.id)
+    assert client.get("/stats/block-cache/", headers=headers).status_code == 200
+    hits = user_cache.hits
+    assert client.get("/stats/block-cache/", headers=headers).status_code == 200
+    assert user_cache.hits == hits + 1
+
+def test_role_change_applies_after_invalidation(client, admin_user):
+    db, user = admin_user
+    headers = auth_headers(user.id)
+    assert client.get("/stats/block-cache/", headers=headers).status_code == 200
+
+    user.is_admin = False
+    db.commit()
+    # Still cached until invalidated explicitly (or the TTL runs out)
+    assert client.get("/stats/block-cache/", headers=headers).status_code == 200
+    invalidate_user(user.id)
+    assert client.get("/stats/block-cache/", headers=headers).status_code == 403
+
+def test_inactive_user_is_rejected(client, admin_user):
+    db, user = admin_user
+    user.is_active = False
+    db.commit()
+    invalidate_user(user.id)
+    assert client.get("/stats/block-cache/", headers=auth_headers(user.id)).status_code == 401
+
+def test_expired_token_is_rejected_even_when_cached(client, admin_user):
+    from datetime import timedelta
+    from api.auth import decode_token, token_cache
+
+    db, user = admin_user
+    token = create_access_token(data={"sub": user.id}, expires_delta=timedelta(minutes=5))
+    payload = decode_token(token)
+    token_cache.set(token, {**payload, "exp": 0})
+    response = client.get("/stats/block-cache/", headers={"Authorization": f"Bearer {token}"})
+    assert response.status_code == 401
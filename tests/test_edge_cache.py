@@ -0,0 +1,129 @@
+import os
+import time
+import pytest
+from api.edge_cache import EdgeCache
+
+def write_video(directory, name: str, size: int) -> str:
+    path = os.path.join(directory, name)
+    with open(path, "wb") as handle:
+        handle.write(os.urandom(size))
+    return path
+
+def promote(cache: EdgeCache, video_id: int, path: str, times: int = 1):
+    for _ in range(times):
+        cache.lookup(video_id, path, f"hash{video_id}")
+    cache.jobs.join()
+
+def set_last_access(cache: EdgeCache, video_id: int, seconds_ago: float):
+    path = cache.entry_path(video_id, f"hash{video_id}")
+    os.utime(path, (time.time() - seconds_ago, os.stat(path).st_mtime))
+
+@pytest.fixture
+def origin(tmp_path):
+    directory = tmp_path / "origin"
+    directory.mkdir()
+    return str(directory)
+
+# Served from storage until the nth request, then from the copy, which keeps the original's mtime
+def test_promotes_after_nth_miss(tmp_path, origin):
+    cache = EdgeCache(str(tmp_path / "cache"), max_bytes=1000, promote_after=3)
+    path = write_video(origin, "a.mp4", 100)
+
+    assert [cache.lookup(1, path, "hash1") for _ in range(2)] == [path, path]
+    assert not cache.jobs.unfinished_tasks
+    assert cache.lookup(1, path, "hash1") == path
+    cache.jobs.join()
+
+    cached = cache.lookup(1, path, "hash1")
+    assert cached == cache.entry_path(1, "hash1")
+    assert open(cached, "rb").read() == open(path, "rb").read()
+    assert os.stat(cached).st_mtime_ns == os.stat(path).st_mtime_ns
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["promotions"], stats["cached_files"]) == (1, 3, 1, 1)
+    assert stats["files"] == [{"video_id": 1, "requests": 4, "hits": 1, "misses": 3, "hit_rate": 0.25, "cached": True}]
+
+# Videos without a content hash, and files larger than the cache, are always served from storage
+def test_skips_unhashed_and_oversized(tmp_path, origin):
+    cache = EdgeCache(str(tmp_path / "cache"), max_bytes=100, promote_after=1)
+    small = write_video(origin, "small.mp4", 10)
+    large = write_video(origin, "large.mp4", 200)
+    assert cache.lookup(1, small, None) == small
+    promote(cache, 2, large, times=2)
+    assert cache.lookup(2, large, "hash2") == large
+    assert cache.stats()["cached_files"] == 0
+
+def test_lru_evicts_least_recently_used(tmp_path, origin):
+    cache = EdgeCache(str(tmp_path / "cache"), max_bytes=250, policy="lru", promote_after=1)
+    paths = {video_id: write_video(origin, f"{video_id}.mp4", 100) for video_id in (1, 2, 3)}
+    promote(cache, 1, paths[1])
+    promote(cache, 2, paths[2])
+    set_last_access(cache, 1, 60)
+    set_last_access(cache, 2, 30)
+    # A hit on 1 makes 2 the least recently used
+    assert cache.lookup(1, paths[1], "hash1") == cache.entry_path(1, "hash1")
+
+    promote(cache, 3, paths[3])
+    assert os.path.exists(cache.entry_path(1, "hash1"))
+    assert not os.path.exists(cache.entry_dir(2))
+    assert os.path.exists(cache.entry_path(3, "hash3"))
+    assert cache.stats()["evictions"] == 1
+
+# Under lfu a copy only makes way for a video requested more often than it
+def test_lfu_evicts_least_requested(tmp_path, origin):
+    cache = EdgeCache(str(tmp_path / "cache"), max_bytes=250, policy="lfu", promote_after=1)
+    paths = {video_id: write_video(origin, f"{video_id}.mp4", 100) for video_id in (1, 2, 3)}
+    promote(cache, 1, paths[1])
+    promote(cache, 2, paths[2])
+    for _ in range(5):
+        cache.lookup(1, paths[1], "hash1")
+
+    # One request each for 2 and 3: 3 is not worth evicting 2 for
+    promote(cache, 3, paths[3])
+    assert os.path.exists(cache.entry_path(2, "hash2"))
+    assert not os.path.exists(cache.entry_dir(3))
+
+    promote(cache, 3, paths[3])
+    assert os.path.exists(cache.entry_path(1, "hash1"))
+    assert not os.path.exists(cache.entry_dir(2))
+    assert os.path.exists(cache.entry_path(3, "hash3"))
+
+# A new content hash (e.g. after transcoding) replaces the old copy
+def test_new_content_replaces_copy(tmp_path, origin):
+    cache = EdgeCache(str(tmp_path / "cache"), max_bytes=1000, promote_after=1)
+    path = write_video(origin, "a.mp4", 100)
+    promote(cache, 1, path)
+    cache.lookup(1, path, "other")
+    cache.jobs.join()
+    assert os.listdir(cache.entry_dir(1)) == ["other"]
+
+def test_unknown_policy_is_rejected():
+    with pytest.raises(ValueError):
+        EdgeCache("cache", policy="fifo")
+
+# Clients get the same bytes and validators from either tier, and blocking drops the copy at once
+def test_download_from_edge_cache_and_evict_on_block(client, admin_headers, tmp_path, monkeypatch):
+    cache = EdgeCache(str(tmp_path / "cache"), max_bytes=10 * 1024 * 1024, promote_after=1)
+    monkeypatch.setattr("api.main.edge_cache", cache)
+    monkeypatch.setattr("api.services.edge_cache", cache)
+
+    body = os.urandom(64 * 1024)
+    files = {"file": ("edge.mp4", body, "video/mp4")}
+    video_id = client.post("/upload/", files=files, headers=admin_headers).json()["data"]["id"]
+
+    from_storage = client.get(f"/download/{video_id}/")
+    cache.jobs.join()
+    from_cache = client.get(f"/download/{video_id}/")
+    assert from_storage.content == from_cache.content == body
+    for header in ("etag", "last-modified", "content-length"):
+        assert from_storage.headers[header] == from_cache.headers[header]
+    assert client.get(f"/download/{video_id}/", headers={"Range": "bytes=0-9"}).content == body[:10]
+
+    stats = client.get("/stats/edge-cache/", headers=admin_headers).json()["data"]
+    assert stats["files"][0] == {"video_id": video_id, "requests": 3, "hits": 2, "misses": 1,
+                                 "hit_rate": 2 / 3, "cached": True}
+    assert "edge_cache_lookups_total" in client.get("/metrics").text
+
+    assert client.post(f"/block/{video_id}/").status_code == 200
+    assert not os.path.exists(cache.entry_dir(video_id))
+    assert cache.stats()["blocked_evictions"] == 1
+    client.post(f"/unblock/{video_id}/")
@@ -0,0 +1,71 @@
+import time
+from api.media_info import MetadataQueue, parse_probe, thumbnail_command
+from api.services import generate_unique_string
+
+PROBE_OUTPUT = {
+    "streams": [
+        {"codec_type": "video", "codec_name": "h264", "width": 1920, "height": 1080},
+        {"codec_type": "audio", "codec_name": "aac"},
+    ],
+    "format": {"duration": "12.500000", "bit_rate": "4000000"},
+}
+
+# Stand-ins for ffprobe (prints PROBE_OUTPUT) and ffmpeg (writes a fake JPEG)
+STUB_FFPROBE = """#!{python}
+import json
+print(json.dumps({output!r}))
+"""
+STUB_FFMPEG = """#!{python}
+import sys
+with open([a for a in sys.argv[1:] if not a.startswith("-")][-1], "wb") as output:
+    output.write(b"\\xff\\xd8 thumbnail")
+"""
+
+def test_parse_probe():
+    assert parse_probe(PROBE_OUTPUT) == {
+        "duration": 12.5, "video_codec": "h264", "audio_codec": "aac",
+        "width": 1920, "height": 1080, "bitrate": 4000000,
+    }
+    assert parse_probe({})["duration"] is None
+
+def test_thumbnail_command():
+    command = thumbnail_command("in.mp4", "out.jpg", 1.25)
+    assert command[:5] == ["ffmpeg", "-ss", "1.25", "-i", "in.mp4"]
+    assert "[0]scale=320:-2[s0]" in command and "out.jpg" in command
+
+# Queued jobs are taken in batches of up to batch_size
+def test_queue_collects_batches():
+    jobs = MetadataQueue(batch_size=3, batch_wait=0.01)
+    for video_id in range(5):
+        jobs.jobs.put((video_id, "", ""))
+    assert [job[0] for job in jobs.collect()] == [0, 1, 2]
+    assert [job[0] for job in jobs.collect()] == [3, 4]
+
+def test_upload_is_probed_and_searchable(client, admin_headers, fake_binary, upload, monkeypatch):
+    monkeypatch.setattr("api.media_info.FFPROBE_BINARY", fake_binary("ffprobe", STUB_FFPROBE, output=PROBE_OUTPUT))
+    monkeypatch.setattr("api.media_info.FFMPEG_BINARY", fake_binary("ffmpeg", STUB_FFMPEG))
+    monkeypatch.setattr("api.services.TRANSCODE_ENABLED", False)
+
+    marker = generate_unique_string(8)
+    video_id = upload(filename=f"probe_{marker}.mp4")["id"]
+
+    deadline = time.monotonic() + 10
+    while (data := client.get(f"/videos/{video_id}/status/", headers=admin_headers).json()["data"])["duration"] is None:
+        assert time.monotonic() < deadline, "metadata never stored"
+        time.sleep(0.05)
+    assert data["video_codec"] == "h264" and (data["width"], data["height"]) == (1920, 1080)
+    assert data["has_thumbnail"]
+
+    def search(**params):
+        response = client.get("/search/", params={"name": marker, **params}, headers=admin_headers)
+        assert response.status_code == 200
+        return [video["id"] for video in response.json()["data"]]
+
+    assert search(min_duration=10, max_duration=13, codec="h264", min_height=720) == [video_id]
+    assert search(min_duration=13) == []
+    assert search(max_bitrate=1000000) == []
+
+    response = client.get(f"/videos/{video_id}/thumbnail/")
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "image/jpeg"
+    assert response.content.startswith(b"\xff\xd8")
@@ -0,0 +1,56 @@
+import pytest
+from api.metrics import Histogram
+
+def sample(text: str, name: str, **labels) -> float:
+    for line in text.splitlines():
+        if line.startswith(name + "{") and all(f'{key}="{value}"' in line for key, value in labels.items()):
+            return float(line.rsplit(" ", 1)[1])
+    return 0.0
+
+def test_histogram_buckets_are_cumulative():
+    histogram = Histogram("latency_seconds", "Test.", ("route",), buckets=(0.01, 0.1))
+    for seconds in (0.005, 0.05, 0.05, 3):
+        histogram.observe(("/a",), seconds)
+    lines = histogram.render()
+    assert 'latency_seconds_bucket{route="/a",le="0.01"} 1' in lines
+    assert 'latency_seconds_bucket{route="/a",le="0.1"} 3' in lines
+    assert 'latency_seconds_bucket{route="/a",le="+Inf"} 4' in lines
+    assert 'latency_seconds_count{route="/a"} 4' in lines
+    assert sample("\n".join(lines), "latency_seconds_sum", route="/a") == pytest.approx(3.105)
+
+# Routes are labelled by template, with database and Redis time broken out
+def test_metrics_endpoint(client):
+    before = client.get("/metrics").text
+    client.get("/download/1/")
+    client.get("/download/2/")
+    client.get("/no-such-route/")
+
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    text = response.text
+
+    route = "/download/{video_id}/"
+    requests = sum(sample(text, "http_request_duration_seconds_count", route=route, status=status)
+                   for status in ("200", "206", "403", "404"))
+    previous = sum(sample(before, "http_request_duration_seconds_count", route=route, status=status)
+                   for status in ("200", "206", "403", "404"))
+    assert requests - previous == 2
+    assert sample(text, "http_request_duration_seconds_count", route="unmatched", status="404") >= 1
+    assert "/download/1/" not in text
+
+    assert sample(text, "http_request_phase_seconds_count", route=route, phase="db") > \
+        sample(before, "http_request_phase_seconds_count", route=route, phase="db")
+    assert sample(text, "db_query_duration_seconds_count", operation="SELECT") > 0
+    assert sample(text, "redis_command_duration_seconds_count", command="get", outcome="ok") > 0
+    assert 'background_jobs_queued{queue="transcode"}' in text
+    assert "redis_circuit_breaker_open 0" in text
+
+def test_profile_written_on_request(client, tmp_path, monkeypatch):
+    pytest.importorskip("pyinstrument")
+    monkeypatch.setattr("api.metrics.PROFILER_ENABLED", True)
+    monkeypatch.setattr("api.metrics.PROFILE_DIR", str(tmp_path))
+    client.get("/download/1/")
+    assert not list(tmp_path.iterdir())
+    client.get("/download/1/", headers={"X-Profile": "1"})
+    assert [path.suffix for path in tmp_path.iterdir()] == [".html"]
@@ -0,0 +1,115 @@
+import os
+import shutil
+import subprocess
+import pytest
+from api.packaging import package, package_command, renditions_for, manifest_index, video_hashes
+
+# Stand-in for ffmpeg writing the HLS layout: a master playlist plus one playlist and two segments per rendition
+STUB_FFMPEG = """#!{python}
+import os, sys
+args = sys.argv[1:]
+renditions = len(args[args.index("-var_stream_map") + 1].split())
+output = [a for a in args if a.endswith("index.m3u8")][-1]
+root = os.path.dirname(os.path.dirname(output))
+master = ["#EXTM3U"]
+for index in range(renditions):
+    os.makedirs(os.path.join(root, f"v{{index}}"))
+    playlist = ["#EXTM3U", "#EXT-X-PLAYLIST-TYPE:VOD"]
+    for segment in range(2):
+        with open(os.path.join(root, f"v{{index}}", f"seg_{{segment:05d}}.ts"), "wb") as out:
+            out.write(b"G segment %d of rendition %d" % (segment, index))
+        playlist += ["#EXTINF:6.0,", f"seg_{{segment:05d}}.ts"]
+    with open(os.path.join(root, f"v{{index}}", "index.m3u8"), "w") as out:
+        out.write("\\n".join(playlist + ["#EXT-X-ENDLIST"]) + "\\n")
+    master += ["#EXT-X-STREAM-INF:BANDWIDTH=800000", f"v{{index}}/index.m3u8"]
+with open(os.path.join(root, "master.m3u8"), "w") as out:
+    out.write("\\n".join(master) + "\\n")
+"""
+
+@pytest.fixture
+def hls_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr("api.packaging.HLS_DIR", str(tmp_path / "hls"))
+    manifest_index.clear()
+    video_hashes.clear()
+    yield tmp_path / "hls"
+    manifest_index.clear()
+
+def test_renditions_for_source_height():
+    assert renditions_for(720) == [(720, 2800), (480, 1400), (360, 800)]
+    assert renditions_for(240) == [(360, 800)]
+    assert len(renditions_for(None)) == 4
+
+def test_package_command():
+    command = package_command("in.mp4", "out", [(720, 2800), (360, 800)], has_audio=False)
+    assert "[0:v]split=2[s0][s1];[s0]scale=-2:720[s2];[s1]scale=-2:360[s3]" in command
+    assert command[command.index("-var_stream_map") + 1] == "v:0 v:1"
+    assert command[command.index("-b:v:1") + 1] == "800k"
+    assert command[-2] == os.path.join("out", "v%v", "index.m3u8")
+
+def test_stream_endpoints(client, hls_dir, admin_headers, fake_binary, upload, monkeypatch):
+    monkeypatch.setattr("api.packaging.FFMPEG_BINARY", fake_binary("ffmpeg", STUB_FFMPEG))
+    # Packaged here directly, not after conversion and probing
+    monkeypatch.setattr("api.services.TRANSCODE_ENABLED", False)
+    monkeypatch.setattr("api.media_info.METADATA_ENABLED", False)
+
+    video = upload(filename="stream.mp4")
+    video_id, content_hash = video["id"], video["content_hash"]
+    assert client.get(f"/videos/{video_id}/hls/master.m3u8").status_code == 404
+
+    assert package(video_id, video["path"], content_hash, height=480) is not None
+    assert not os.listdir(hls_dir / ".tmp")
+    assert client.get(f"/videos/{video_id}/status/", headers=admin_headers).json()["data"]["has_stream"]
+
+    response = client.get(f"/videos/{video_id}/hls/master.m3u8")
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/vnd.apple.mpegurl"
+    assert response.headers["cache-control"] == "no-cache"
+    renditions = [line for line in response.text.splitlines() if not line.startswith("#")]
+    assert renditions == [f"{content_hash}/v0/index.m3u8", f"{content_hash}/v1/index.m3u8"]
+
+    base = f"/videos/{video_id}/hls/{content_hash}/v1"
+    response = client.get(f"{base}/index.m3u8")
+    assert response.status_code == 200 and "seg_00001.ts" in response.text
+    assert "immutable" in response.headers["cache-control"]
+
+    response = client.get(f"{base}/seg_00001.ts")
+    assert response.status_code == 200
+    assert response.content == b"G segment 1 of rendition 1"
+    assert response.headers["content-type"] == "video/mp2t"
+    assert "immutable" in response.headers["cache-control"]
+
+    # Only segments listed in the playlists, and only the video's current package
+    assert client.get(f"{base}/seg_00009.ts").status_code == 404
+    assert client.get(f"{base}/..%2Findex.m3u8").status_code == 404
+    assert client.get(f"/videos/{video_id}/hls/{'0' * 64}/v1/seg_00001.ts").status_code == 404
+
+    client.post(f"/block/{video_id}/", headers=admin_headers)
+    try:
+        assert client.get(f"/videos/{video_id}/hls/master.m3u8").status_code == 403
+        assert client.get(f"{base}/seg_00001.ts").status_code == 403
+    finally:
+        client.post(f"/unblock/{video_id}/", headers=admin_headers)
+
+# Packaging the same content again reuses the stored package
+def test_package_is_shared_by_content(tmp_path, hls_dir, monkeypatch):
+    monkeypatch.setattr("api.packaging.FFMPEG_BINARY", str(tmp_path / "missing-ffmpeg"))
+    target = hls_dir / "ab" / "cd" / ("abcd" + "0" * 60)
+    target.mkdir(parents=True)
+    assert package(1, "unused.mp4", "abcd" + "0" * 60) == str(target)
+    assert package(1, "unused.mp4", "ef" + "0" * 62) is None
+
+@pytest.mark.skipif(shutil.which("ffmpeg") is None, reason="ffmpeg is not installed")
+def test_package_synthetic_clip(tmp_path, hls_dir, monkeypatch):
+    monkeypatch.setattr("api.packaging.FFMPEG_BINARY", "ffmpeg")
+    source = tmp_path / "clip.mp4"
+    subprocess.run(
+        ["ffmpeg", "-f", "lavfi", "-i", "testsrc=duration=3:size=320x240:rate=24",
+         "-f", "lavfi", "-i", "sine=duration=3", "-shortest", "-y", str(source)],
+        check=True, capture_output=True,
+    )
+    monkeypatch.setattr("api.packaging.RENDITIONS", [(240, 400), (120, 150)])
+    content_hash = "f" * 64
+    assert package(1, str(source), content_hash, height=240, has_audio=True) is not None
+    found = manifest_index.get(content_hash)
+    assert sorted(found.playlists) == ["v0", "v1"]
+    assert all(found.segments[rendition] for rendition in found.playlists)
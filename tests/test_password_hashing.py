@@ -0,0 +1,29 @@
+from passlib.context import CryptContext
+from api import auth
+from api.models import SessionLocal, User
+
+# A login with a hash made at an outdated bcrypt cost upgrades the stored hash
+def test_login_rehashes_outdated_hash(client, monkeypatch):
+    old_hash = CryptContext(schemes=["bcrypt"], bcrypt__rounds=4).hash("testpassword")
+    with SessionLocal() as db:
+        db.query(User).filter(User.username == "rehashuser").delete()
+        db.add(User(username="rehashuser", email="rehashuser@example.com", hashed_password=old_hash))
+        db.commit()
+
+    monkeypatch.setattr(auth, "pwd_context", CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=5))
+    response = client.post("/signin/", json={"username": "rehashuser", "password": "testpassword"})
+    assert response.status_code == 200
+
+    with SessionLocal() as db:
+        new_hash = db.query(User).filter(User.username == "rehashuser").one().hashed_password
+        db.query(User).filter(User.username == "rehashuser").delete()
+        db.commit()
+    assert new_hash.startswith("$2b$05$")
+    assert auth.pwd_context.verify("testpassword", new_hash)
+
+# Logins beyond the hashing queue limit are turned away rather than queued
+def test_login_rejected_when_hash_queue_full(client, monkeypatch):
+    monkeypatch.setattr(auth, "PASSWORD_HASH_MAX_PENDING", 0)
+    response = client.post("/signin/", json={"username": "testuser", "password": "testpassword"})
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "1"
@@ -0,0 +1,81 @@
+import os
+import time
+import asyncio
+import pytest
+from api.auth import create_access_token
+from api.rate_limit import LocalBuckets, RateLimiter, TOKEN_BUCKET_SCRIPT, limiter, client_key
+
+@pytest.fixture
+def limits(monkeypatch):
+    monkeypatch.setattr("api.rate_limit.RATE_LIMIT_ENABLED", True)
+    limiter.local.clear()
+    yield monkeypatch
+    limiter.local.clear()
+
+def test_bucket_refuses_then_refills():
+    buckets = LocalBuckets()
+    assert [buckets.take("k", rate=100, burst=3)[0] for _ in range(4)] == [True, True, True, False]
+    allowed, wait = buckets.take("k", rate=100, burst=3)
+    assert not allowed and 0 < wait <= 0.01
+    time.sleep(0.02)
+    assert buckets.take("k", rate=100, burst=3)[0]
+
+# With debt the take always succeeds and returns how long to wait instead
+def test_bucket_paces_with_debt():
+    buckets = LocalBuckets()
+    assert buckets.take("k", rate=1000, burst=100, cost=100, debt=True) == (True, 0.0)
+    allowed, wait = buckets.take("k", rate=1000, burst=100, cost=500, debt=True)
+    assert allowed and wait == pytest.approx(0.5, abs=0.01)
+
+def test_local_buckets_are_bounded():
+    buckets = LocalBuckets(maxsize=2)
+    for key in "abc":
+        buckets.take(key, rate=1, burst=1)
+    assert list(buckets.buckets) == ["b", "c"]
+
+def test_signin_is_limited_per_client(client, limits):
+    for _ in range(20):
+        response = client.post("/signin/", json={"username": "nobody", "password": "wrong"})
+        if response.status_code == 429:
+            break
+    assert response.status_code == 429
+    assert int(response.headers["retry-after"]) >= 1
+
+# A bearer token keys the bucket by user, so users behind one address do not share it
+def test_client_key_prefers_user():
+    class Request:
+        headers = {"authorization": f"Bearer {create_access_token(data={'sub': '42'})}"}
+        client = type("Client", (), {"host": "10.0.0.1"})
+    assert client_key(Request) == "user:42"
+    Request.headers = {"authorization": "Bearer not-a-token"}
+    assert client_key(Request) == "ip:10.0.0.1"
+
+def test_download_bandwidth_is_shaped(client, admin_headers, limits):
+    limits.setattr("api.services.TRANSCODE_ENABLED", False)
+    limits.setattr("api.media_info.METADATA_ENABLED", False)
+    content = os.urandom(1024 * 1024)
+    files = {"file": ("shaped.mp4", content, "video/mp4")}
+    video_id = client.post("/upload/", files=files, headers=admin_headers).json()["data"]["id"]
+
+    rate, burst = 2 * 1024 * 1024, 256 * 1024
+    limits.setattr("api.rate_limit.DOWNLOAD_BANDWIDTH_LIMIT", rate)
+    limits.setattr("api.rate_limit.DOWNLOAD_BANDWIDTH_BURST", burst)
+    began = time.monotonic()
+    response = client.get(f"/download/{video_id}/")
+    elapsed = time.monotonic() - began
+    assert response.status_code == 200 and response.content == content
+    assert elapsed >= (len(content) - burst) / rate * 0.9
+
+# The Redis script needs a server with Lua scripting; fakeredis provides one with lupa
+def test_redis_token_bucket():
+    pytest.importorskip("lupa")
+    fakeredis = pytest.importorskip("fakeredis.aioredis")
+
+    async def run():
+        shared = RateLimiter(fakeredis.FakeRedis())
+        results = [await shared.take("signin:ip:1", rate=1, burst=2) for _ in range(3)]
+        assert [allowed for allowed, _ in results] == [True, True, False]
+        allowed, wait = await shared.take("bandwidth:ip:1", rate=1000, burst=100, cost=600, debt=True)
+        assert allowed and wait == pytest.approx(0.5, abs=0.05)
+    asyncio.run(run())
+    assert "redis.call" in TOKEN_BUCKET_SCRIPT
@@ -0,0 +1,89 @@
+import os
+from io import BytesIO
+import pytest
+
+boto3 = pytest.importorskip("boto3")
+moto = pytest.importorskip("moto")
+
+from boto3.s3.transfer import TransferConfig
+from api import blob_store, services
+from api.storage import S3Storage, new_temp_path
+
+# S3Storage against moto's in-process S3, with 5 MiB multipart parts
+@pytest.fixture()
+def s3(monkeypatch):
+    for name in ("AWS_ACCESS_KEY_ID", "AWS_SECRET_ACCESS_KEY"):
+        monkeypatch.setenv(name, "testing")
+    with moto.mock_aws():
+        s3_client = boto3.client("s3", region_name="us-east-1")
+        s3_client.create_bucket(Bucket="videos-test")
+        storage = S3Storage(bucket="videos-test", prefix="blobs/", client=s3_client)
+        storage.transfer_config = TransferConfig(multipart_threshold=5 * 1024 * 1024, multipart_chunksize=5 * 1024 * 1024)
+        yield storage
+
+def temp_file(content: bytes) -> str:
+    path = new_temp_path()
+    with open(path, "wb") as handle:
+        handle.write(content)
+    return path
+
+def test_large_files_use_multipart_upload(s3):
+    content = os.urandom(11 * 1024 * 1024)
+    path = temp_file(content)
+    location = s3.put(path, "ab/cd/large")
+    os.remove(path)
+
+    assert location == "s3://videos-test/blobs/ab/cd/large"
+    assert s3.exists("ab/cd/large") and not s3.exists("ab/cd/missing")
+    stored = s3.client.head_object(Bucket="videos-test", Key="blobs/ab/cd/large")
+    assert stored["ETag"].strip('"').endswith("-3")
+
+    with s3.local_copy(location) as local:
+        with open(local, "rb") as handle:
+            assert handle.read() == content
+    assert not os.path.exists(local)
+
+    s3.delete(location)
+    assert not s3.exists("ab/cd/large")
+
+def test_presigned_download_url(s3):
+    url = s3.download_url("s3://videos-test/blobs/ab/cd/x", 'my "clip".mp4')
+    assert "videos-test" in url and "blobs/ab/cd/x" in url
+    assert "Signature" in url or "X-Amz-Signature" in url
+    assert "my+clip.mp4" in url or "my%20clip.mp4" in url
+
+def test_upload_to_s3_and_redirect_download(client, s3, admin_headers, monkeypatch):
+    monkeypatch.setattr(blob_store, "storage", s3)
+    monkeypatch.setattr(services, "storage", s3)
+    monkeypatch.setattr(services, "TRANSCODE_ENABLED", False)
+
+    # add_blob runs in the write transaction on the event loop: S3 calls belong in stage_blob
+    in_transaction = []
+
+    def add_blob(*args):
+        in_transaction.append(True)
+        try:
+            return blob_store.add_blob(*args)
+        finally:
+            in_transaction.pop()
+    monkeypatch.setattr(services, "add_blob", add_blob)
+    for name in ("exists", "put"):
+        def no_network(*args, call=getattr(s3, name)):
+            assert not in_transaction, "S3 called inside the database transaction"
+            return call(*args)
+        monkeypatch.setattr(s3, name, no_network)
+
+    content = os.urandom(64)
+    files = {"file": ("cloud.mp4", BytesIO(content), "video/mp4")}
+    first = client.post("/upload/", files=files, headers=admin_headers).json()["data"]
+    files = {"file": ("cloud-copy.mp4", BytesIO(content), "video/mp4")}
+    second = client.post("/upload/", files=files, headers=admin_headers).json()["data"]
+
+    key = blob_store.blob_key(first["content_hash"])
+    assert first["path"] == second["path"] == f"s3://videos-test/blobs/{key}"
+    assert s3.exists(key)
+
+    monkeypatch.setattr("api.main.storage_for", lambda location: s3)
+    response = client.get(f"/download/{first['id']}/", follow_redirects=False)
+    assert response.status_code == 307
+    assert f"blobs/{key}" in response.headers["location"]
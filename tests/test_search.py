@@ -0,0 +1,117 @@
+import pytest
+from api.models import SessionLocal, Video, SEARCH_INDEX_ENABLED
+from api.services import generate_unique_string
+
+# Videos with a random marker in their names, removed again after each test
+@pytest.fixture()
+def videos():
+    marker = generate_unique_string(8)
+    db = SessionLocal()
+    rows = [
+        Video(name=f"holiday_{marker}_beach.mp4", size=100, path="uploads/a.mp4"),
+        Video(name=f"HOLIDAY_{marker}_mountains.mp4", size=200, path="uploads/b.mp4"),
+        Video(name=f"work_{marker}_meeting.mp4", size=300, path="uploads/c.mp4"),
+    ]
+    db.add_all(rows)
+    db.commit()
+    yield marker, rows
+    for row in rows:
+        db.delete(row)
+    db.commit()
+    db.close()
+
+def search(client, headers, **params):
+    response = client.get("/search/", params=params, headers=headers)
+    assert response.status_code == 200
+    return [video["name"] for video in response.json()["data"]]
+
+def test_search_index_enabled():
+    assert SEARCH_INDEX_ENABLED
+
+def test_substring_search(client, admin_headers, videos):
+    marker, rows = videos
+    assert sorted(search(client, admin_headers, name=f"{marker}_beach")) == [rows[0].name]
+    # Case-insensitive, like the LIKE scan it replaces
+    assert len(search(client, admin_headers, name=f"holiday_{marker}")) == 2
+    assert len(search(client, admin_headers, name=marker)) == 3
+    assert search(client, admin_headers, name=f"{marker}_beach", size=999) == []
+
+def test_index_follows_updates(client, admin_headers, videos):
+    marker, rows = videos
+    db = SessionLocal()
+    video = db.get(Video, rows[2].id)
+    video.name = f"renamed_{marker}.mp4"
+    db.commit()
+    db.close()
+
+    assert search(client, admin_headers, name=f"work_{marker}") == []
+    assert search(client, admin_headers, name=f"renamed_{marker}") == [f"renamed_{marker}.mp4"]
+
+def test_special_characters_are_literal(client, admin_headers, videos):
+    assert search(client, admin_headers, name='"quoted" OR *') == []
+
+# Terms too short for the index still match case-insensitively anywhere in the name
+def test_short_terms_match_substrings(client, admin_headers):
+    marker = generate_unique_string(8)
+    db = SessionLocal()
+    rows = [Video(name=name, size=1, path="uploads/short.mp4")
+            for name in (f"xxq~yy_{marker}.mp4", f"Q~c_{marker}.mp4", f"q~d_{marker}.mp4", f"other_{marker}.mp4")]
+    db.add_all(rows)
+    db.commit()
+    try:
+        names = search(client, admin_headers, name="q~", limit=1000)
+        assert {row.name for row in rows[:3]} <= set(names)
+        assert rows[3].name not in names
+    finally:
+        for row in rows:
+            db.delete(row)
+        db.commit()
+        db.close()
+
+# Walking the cursor visits every match exactly once, in id order
+def test_keyset_pagination(client, admin_headers, videos):
+    marker, rows = videos
+    seen, cursor = [], None
+    while True:
+        params = {"name": marker, "limit": 2}
+        if cursor:
+            params["cursor"] = cursor
+        body = client.get("/search/", params=params, headers=admin_headers).json()
+        seen += [video["id"] for video in body["data"]]
+        cursor = body["next_cursor"]
+        if cursor is None:
+            break
+    assert seen == sorted(row.id for row in rows)
+
+def test_size_range(client, admin_headers, videos):
+    marker, rows = videos
+    assert search(client, admin_headers, name=marker, min_size=150) == [rows[1].name, rows[2].name]
+    assert search(client, admin_headers, name=marker, min_size=150, max_size=250) == [rows[1].name]
+
+def test_field_projection(client, admin_headers, videos):
+    marker, rows = videos
+    response = client.get("/search/", params={"name": marker, "fields": "name,size"}, headers=admin_headers)
+    assert response.json()["data"][0] == {"id": rows[0].id, "name": rows[0].name, "size": 100}
+
+    response = client.get("/search/", params={"name": marker, "fields": "name,password"}, headers=admin_headers)
+    assert response.status_code == 400
+
+# The cursor comes from the id column wherever it sits among the requested fields
+def test_projection_pagination(client, admin_headers, videos):
+    marker, rows = videos
+    response = client.get("/search/", params={"name": marker, "fields": "size,id", "limit": 1}, headers=admin_headers)
+    assert response.headers["content-type"] == "application/json"
+    body = response.json()
+    assert body["data"] == [{"size": 100, "id": rows[0].id}]
+    assert body["next_cursor"] == rows[0].id
+
+# Projected rows leave columns out, so the documented row schema requires none of them
+def test_search_schema_allows_projected_rows(client, admin_headers, videos):
+    marker, rows = videos
+    response = client.get("/search/", params={"name": marker, "fields": "id"}, headers=admin_headers).json()
+    assert response["data"] == [{"id": row.id} for row in rows]
+
+    schemas = client.get("/openapi.json").json()["components"]["schemas"]
+    row_schema = schemas["SearchResponse"]["properties"]["data"]["items"]["$ref"].rsplit("/", 1)[-1]
+    assert not schemas[row_schema].get("required")
+    assert set(schemas[row_schema]["properties"]) == set(schemas["VideoResponse"]["properties"])
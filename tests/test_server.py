@@ -0,0 +1,96 @@
+import os
+import sys
+import time
+import signal
+import socket
+import sqlite3
+import subprocess
+import httpx
+from fastapi.testclient import TestClient
+from api import main, redis_service
+from api.main import app
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Connections are opened on startup and closed on shutdown
+def test_lifespan_opens_and_closes_connections(monkeypatch):
+    closed = []
+
+    async def close_redis():
+        closed.append(True)
+    monkeypatch.setattr(main, "close_redis", close_redis)
+
+    with TestClient(app) as client:
+        assert client.get("/download/999999/").status_code == 404
+        assert not closed
+    assert closed
+
+# Workers forked from one app must not share the id that filters their own invalidations
+def test_forked_worker_gets_its_own_id():
+    read_end, write_end = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        os.write(write_end, redis_service.WORKER_ID.encode())
+        os._exit(0)
+    os.waitpid(pid, 0)
+    assert os.read(read_end, 64).decode() != redis_service.WORKER_ID
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def wait_until_serving(base_url: str, server: subprocess.Popen):
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        assert server.poll() is None, server.stdout.read()
+        try:
+            return httpx.get(f"{base_url}/download/999999/")
+        except httpx.TransportError:
+            time.sleep(0.05)
+    raise AssertionError("server did not start")
+
+# SIGTERM lets a paced download in flight finish before the workers exit (uvicorn's graceful shutdown)
+def test_server_drains_downloads_on_sigterm(tmp_path):
+    size = 2 * 1024 * 1024
+    video = tmp_path / "video.mp4"
+    video.write_bytes(os.urandom(size))
+    env = {
+        **os.environ,
+        "DATABASE_URL": f"sqlite:///{tmp_path}/server.db",
+        "UPLOAD_DIR": str(tmp_path / "uploads"),
+        "REDIS_BACKEND": "memory",
+        "RATE_LIMIT_ENABLED": "1",
+        "DOWNLOAD_BANDWIDTH_LIMIT": str(1024 * 1024),
+        "DOWNLOAD_BANDWIDTH_BURST": str(256 * 1024),
+        "SHUTDOWN_TIMEOUT": "20",
+    }
+    subprocess.run([sys.executable, "-c", "import api.models"], cwd=ROOT, env=env, check=True)
+    with sqlite3.connect(tmp_path / "server.db") as db:
+        db.execute("INSERT INTO videos (id, name, size, path, is_blocked, status) VALUES (1, 'video.mp4', ?, ?, 0, 'ready')",
+                   (size, str(video)))
+
+    port = free_port()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "api.server", "--workers", "2", "--port", str(port), "--host", "127.0.0.1"],
+        cwd=ROOT, env={**env, "DB_CREATE_SCHEMA": "0"},
+        stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True,
+    )
+    try:
+        base_url = f"http://127.0.0.1:{port}"
+        assert wait_until_serving(base_url, server).status_code == 404
+
+        received = 0
+        with httpx.stream("GET", f"{base_url}/download/1/", timeout=30) as response:
+            assert response.status_code == 200
+            for chunk in response.iter_bytes():
+                if not received:
+                    server.send_signal(signal.SIGTERM)
+                received += len(chunk)
+        assert received == size
+        assert server.wait(timeout=30) == 0
+    finally:
+        if server.poll() is None:
+            server.kill()
+        server.wait()
@@ -0,0 +1,181 @@
+import os
+import anyio
+import pytest
+from fastapi import FastAPI, Request
+from fastapi.testclient import TestClient
+from api.streaming import RangeFileResponse, file_response, parse_range_header
+
+CONTENT = bytes(range(256)) * 40  # 10240 bytes
+CONTENT_HASH = "abc123"
+
+# App serving one file, separate from the shared client of the video API
+@pytest.fixture()
+def file_client(tmp_path):
+    path = tmp_path / "video.mp4"
+    path.write_bytes(CONTENT)
+    app = FastAPI()
+
+    @app.get("/file")
+    async def serve(request: Request):
+        return file_response(request, str(path), CONTENT_HASH)
+
+    return TestClient(app)
+
+def test_parse_range_header():
+    assert parse_range_header("bytes=0-9", 100) == [(0, 9)]
+    assert parse_range_header("bytes=90-", 100) == [(90, 99)]
+    assert parse_range_header("bytes=-10", 100) == [(90, 99)]
+    assert parse_range_header("bytes=95-200", 100) == [(95, 99)]
+    assert parse_range_header("bytes=0-1, 5-6", 100) == [(0, 1), (5, 6)]
+    assert parse_range_header("bytes=200-300", 100) == []
+    assert parse_range_header("bytes=9-1", 100) is None
+    assert parse_range_header("items=0-1", 100) is None
+    assert parse_range_header("bytes=abc", 100) is None
+
+def test_full_response(file_client):
+    response = file_client.get("/file")
+    assert response.status_code == 200
+    assert response.content == CONTENT
+    assert response.headers["etag"] == f'"{CONTENT_HASH}"'
+    assert response.headers["accept-ranges"] == "bytes"
+    assert response.headers["content-type"] == "video/mp4"
+
+def test_single_range(file_client):
+    response = file_client.get("/file", headers={"Range": "bytes=100-199"})
+    assert response.status_code == 206
+    assert response.content == CONTENT[100:200]
+    assert response.headers["content-range"] == f"bytes 100-199/{len(CONTENT)}"
+    assert response.headers["content-length"] == "100"
+
+def test_multi_range(file_client):
+    response = file_client.get("/file", headers={"Range": "bytes=0-9, 5000-5009"})
+    assert response.status_code == 206
+    content_type = response.headers["content-type"]
+    assert content_type.startswith("multipart/byteranges; boundary=")
+    boundary = content_type.split("boundary=")[1]
+    assert int(response.headers["content-length"]) == len(response.content)
+
+    parts = response.content.split(f"--{boundary}".encode())[1:-1]
+    assert len(parts) == 2
+    assert f"Content-Range: bytes 0-9/{len(CONTENT)}".encode() in parts[0]
+    assert parts[0].endswith(b"\r\n\r\n" + CONTENT[0:10] + b"\r\n")
+    assert parts[1].endswith(b"\r\n\r\n" + CONTENT[5000:5010] + b"\r\n")
+
+def test_unsatisfiable_range(file_client):
+    response = file_client.get("/file", headers={"Range": f"bytes={len(CONTENT)}-"})
+    assert response.status_code == 416
+    assert response.headers["content-range"] == f"bytes */{len(CONTENT)}"
+
+def test_conditional_get(file_client):
+    etag = file_client.get("/file").headers["etag"]
+    last_modified = file_client.get("/file").headers["last-modified"]
+
+    assert file_client.get("/file", headers={"If-None-Match": etag}).status_code == 304
+    assert file_client.get("/file", headers={"If-None-Match": '"other"'}).status_code == 200
+    assert file_client.get("/file", headers={"If-Modified-Since": last_modified}).status_code == 304
+
+def test_if_range(file_client):
+    etag = file_client.get("/file").headers["etag"]
+
+    response = file_client.get("/file", headers={"Range": "bytes=0-9", "If-Range": etag})
+    assert response.status_code == 206
+
+    # A stale validator means the client gets the whole current file
+    response = file_client.get("/file", headers={"Range": "bytes=0-9", "If-Range": '"stale"'})
+    assert response.status_code == 200
+    assert response.content == CONTENT
+
+@pytest.mark.parametrize("mode", ["mmap", "read"])
+def test_download_modes(file_client, monkeypatch, mode):
+    monkeypatch.setattr("api.streaming.DOWNLOAD_MODE", mode)
+    monkeypatch.setattr("api.streaming.DOWNLOAD_CHUNK_SIZE", 1000)
+    assert file_client.get("/file").content == CONTENT
+    response = file_client.get("/file", headers={"Range": "bytes=999-3001"})
+    assert response.content == CONTENT[999:3002]
+
+# Servers offering the zero-copy ASGI extensions send the file bytes themselves
+def run_asgi(response, extensions):
+    messages = []
+    scope = {"type": "http", "method": "GET", "extensions": extensions}
+
+    async def receive():
+        return {"type": "http.request"}
+
+    async def send(message):
+        messages.append(message)
+
+    anyio.run(response, scope, receive, send)
+    return messages
+
+# Without the extensions (uvicorn) the file is read off the event loop, as FileResponse did
+def test_auto_reads_in_thread_without_extensions(tmp_path, monkeypatch):
+    path = tmp_path / "video.mp4"
+    path.write_bytes(CONTENT)
+    response = RangeFileResponse(str(path), [(0, len(CONTENT))], 200, {}, "video/mp4")
+    assert response.choose_mode({"extensions": {}}) == "read"
+
+    reads = []
+    run_sync = anyio.to_thread.run_sync
+
+    async def in_thread(function, *args, **kwargs):
+        reads.append(function)
+        return await run_sync(function, *args, **kwargs)
+    monkeypatch.setattr(anyio.to_thread, "run_sync", in_thread)
+    messages = run_asgi(response, {})
+    assert b"".join(message.get("body", b"") for message in messages[1:]) == CONTENT
+    assert reads and all(function is os.pread for function in reads)
+
+def test_pathsend_for_whole_file(tmp_path):
+    path = tmp_path / "video.mp4"
+    path.write_bytes(CONTENT)
+    response = RangeFileResponse(str(path), [(0, len(CONTENT))], 200, {}, "video/mp4")
+    messages = run_asgi(response, {"http.response.pathsend": {}})
+    assert messages[-1] == {"type": "http.response.pathsend", "path": str(path)}
+
+def test_zerocopysend_for_ranges(tmp_path):
+    path = tmp_path / "video.mp4"
+    path.write_bytes(CONTENT)
+    response = RangeFileResponse(str(path), [b"--part\r\n", (10, 20)], 206, {}, "video/mp4")
+    messages = run_asgi(response, {"http.response.pathsend": {}, "http.response.zerocopysend": {}})
+    assert messages[1]["body"] == b"--part\r\n"
+    assert messages[2]["type"] == "http.response.zerocopysend"
+    assert (messages[2]["offset"], messages[2]["count"]) == (10, 20)
+    assert messages[-1] == {"type": "http.response.body", "body": b"", "more_body": False}
+
+# An edge copy evicted between the lookup and the send is replaced by the stored file
+def test_evicted_copy_falls_back_to_origin(tmp_path):
+    origin, copy = tmp_path / "origin.mp4", tmp_path / "copy.mp4"
+    origin.write_bytes(CONTENT)
+    copy.write_bytes(CONTENT)
+    response = RangeFileResponse(str(copy), [(0, len(CONTENT))], 200, {}, "video/mp4", fallback_path=str(origin))
+    copy.unlink()
+    messages = run_asgi(response, {"http.response.pathsend": {}})
+    assert messages[0]["type"] == "http.response.start"
+    assert b"".join(message.get("body", b"") for message in messages[1:]) == CONTENT
+
+def test_file_response_uses_origin_when_copy_is_gone(tmp_path):
+    origin = tmp_path / "origin.mp4"
+    origin.write_bytes(CONTENT)
+    app = FastAPI()
+
+    @app.get("/file")
+    async def serve(request: Request):
+        return file_response(request, str(tmp_path / "gone.mp4"), CONTENT_HASH, fallback_path=str(origin))
+
+    response = TestClient(app).get("/file", headers={"range": "bytes=0-9"})
+    assert response.status_code == 206
+    assert response.content == CONTENT[:10]
+
+# A file that no longer matches the headers fails before the response starts
+def test_changed_file_fails_before_start(tmp_path):
+    path = tmp_path / "video.mp4"
+    path.write_bytes(CONTENT)
+    response = RangeFileResponse(str(path), [(0, len(CONTENT))], 200, {}, "video/mp4")
+    path.write_bytes(CONTENT[:100])
+    messages = []
+
+    async def send(message):
+        messages.append(message)
+    with pytest.raises(RuntimeError):
+        anyio.run(response, {"type": "http", "method": "GET", "extensions": {}}, None, send)
+    assert messages == []
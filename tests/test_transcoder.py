@@ -0,0 +1,104 @@
+import os
+import hashlib
+import time
+from fastapi.testclient import TestClient
+from api.main import app
+from api.blob_store import blob_path
+from api.models import SessionLocal, Video
+from api import transcoder
+from api.transcoder import TranscodeQueue, build_command
+
+# Stand-in for ffmpeg: writes the input plus a marker to the output path, or fails
+STUB_FFMPEG = """#!{python}
+import sys
+args = sys.argv[1:]
+if {fail}:
+    sys.stderr.write("stub ffmpeg: conversion failed")
+    sys.exit(1)
+with open(args[args.index("-i") + 1], "rb") as source:
+    data = source.read()
+with open([a for a in args if not a.startswith("-")][-1], "wb") as output:
+    output.write(data + b" as mp4")
+"""
+
+def wait_for_status(client, video_id, headers, timeout=10):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        data = client.get(f"/videos/{video_id}/status/", headers=headers).json()["data"]
+        if data["processing_status"] in ("ready", "failed"):
+            return data
+        time.sleep(0.05)
+    raise AssertionError(f"video {video_id} still {data['processing_status']}")
+
+def test_build_command():
+    command = build_command("in.wmv", "in.wmv.mp4")
+    assert command[:3] == ["ffmpeg", "-i", "in.wmv"]
+    assert "libx264" in command and "in.wmv.mp4" in command and "-y" in command
+
+def test_upload_is_transcoded_in_background(client, admin_headers, fake_binary, upload, monkeypatch):
+    monkeypatch.setattr("api.transcoder.FFMPEG_BINARY", fake_binary("ffmpeg", STUB_FFMPEG, fail=False))
+    content = os.urandom(32)
+    data = upload(content, "transcode.wmv", "video/x-ms-wmv")
+    assert data["processing_status"] == "queued"
+
+    status = wait_for_status(client, data["id"], admin_headers)
+    assert status["processing_status"] == "ready"
+    # The source blob is released and the output stored under its own hash
+    assert not os.path.exists(data["path"])
+    with SessionLocal() as db:
+        video = db.get(Video, data["id"])
+    assert video.content_hash == hashlib.sha256(content + b" as mp4").hexdigest()
+    assert video.path == blob_path(video.content_hash)
+    assert os.path.exists(video.path)
+
+def test_failed_transcode_keeps_original(client, admin_headers, fake_binary, upload, monkeypatch):
+    monkeypatch.setattr("api.transcoder.FFMPEG_BINARY", fake_binary("ffmpeg_fail", STUB_FFMPEG, fail=True))
+    data = upload(b"Test video content", "transcode.wmv", "video/x-ms-wmv")
+
+    status = wait_for_status(client, data["id"], admin_headers)
+    assert status["processing_status"] == "failed"
+    assert "conversion failed" in status["detail"]
+    assert os.path.exists(data["path"])
+
+# Higher priority jobs are picked before older, lower priority ones
+def test_queue_priority():
+    handled = []
+    jobs = TranscodeQueue(concurrency=1, handler=lambda video_id, path: handled.append(video_id))
+    # Queue everything before the worker starts so ordering is deterministic
+    for video_id, priority in [(1, 0), (2, 5), (3, 0), (4, 9)]:
+        jobs.jobs.put((-priority, next(jobs.counter), video_id, ""))
+    jobs.start()
+    jobs.jobs.join()
+    assert handled == [4, 2, 1, 3]
+
+class RecordingQueue:
+    def __init__(self):
+        self.submitted = []
+
+    def submit(self, video_id, path, priority=0):
+        self.submitted.append(video_id)
+
+# Jobs lost with a stopped server are resubmitted once, by the worker allowed to do it
+def test_unfinished_transcodes_requeued_on_startup(monkeypatch):
+    with SessionLocal() as db:
+        videos = [Video(name=f"{status}.mp4", size=1, path=f"/missing/{status}.mp4", status=status)
+                  for status in ("queued", "processing", "ready")]
+        db.add_all(videos)
+        db.commit()
+        ids = [video.id for video in videos]
+    jobs = RecordingQueue()
+    monkeypatch.setattr(transcoder, "transcode_queue", jobs)
+
+    monkeypatch.setattr(transcoder, "requeue_on_startup", False)
+    with TestClient(app):
+        pass
+    assert not set(ids) & set(jobs.submitted)
+
+    monkeypatch.setattr(transcoder, "requeue_on_startup", True)
+    with TestClient(app):
+        pass
+    assert [video_id for video_id in jobs.submitted if video_id in ids] == ids[:2]
+    with SessionLocal() as db:
+        assert [db.get(Video, video_id).status for video_id in ids] == ["queued", "queued", "ready"]
+        db.query(Video).filter(Video.id.in_(ids)).delete()
+        db.commit()
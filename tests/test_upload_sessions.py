@@ -0,0 +1,133 @@
+import os
+import hashlib
+import pytest
+from api.services import VideoService
+from api.storage import TEMP_DIR
+from api.upload_sessions import copy_into, session_dir, sweep_sessions
+
+def start_session(client, headers):
+    response = client.post("/uploads/", json={"filename": "resumable.mp4"}, headers=headers)
+    assert response.status_code == 200
+    return response.json()["data"]["upload_id"]
+
+# Parts sent out of order are assembled in part-number order
+def test_resumable_upload(client, admin_headers):
+    upload_id = start_session(client, admin_headers)
+    parts = {1: b"first part ", 2: b"second part ", 3: b"third part"}
+
+    for number in (3, 1, 2):
+        response = client.put(f"/uploads/{upload_id}/parts/{number}/", content=parts[number], headers=admin_headers)
+        assert response.status_code == 200
+        assert response.json()["data"]["sha256"] == hashlib.sha256(parts[number]).hexdigest()
+
+    # Re-sending a part replaces it
+    response = client.put(f"/uploads/{upload_id}/parts/2/", content=parts[2], headers=admin_headers)
+    assert response.status_code == 200
+
+    response = client.get(f"/uploads/{upload_id}/", headers=admin_headers)
+    assert [part["part_number"] for part in response.json()["data"]["parts"]] == [1, 2, 3]
+
+    response = client.post(f"/uploads/{upload_id}/complete/", headers=admin_headers)
+    assert response.status_code == 200
+    data = response.json()["data"]
+    assert data["size"] == sum(len(part) for part in parts.values())
+    with open(data["path"], "rb") as assembled:
+        assert assembled.read() == b"".join(parts[number] for number in (1, 2, 3))
+
+    # Hashed like a single upload, so the same bytes sent either way share one blob
+    assert data["content_hash"] == hashlib.sha256(b"".join(parts[n] for n in (1, 2, 3))).hexdigest()
+    files = {"file": ("single.mp4", b"".join(parts[n] for n in (1, 2, 3)), "video/mp4")}
+    single = client.post("/upload/", files=files, headers=admin_headers).json()["data"]
+    assert single["content_hash"] == data["content_hash"]
+
+    # The session is gone once completed
+    response = client.get(f"/uploads/{upload_id}/", headers=admin_headers)
+    assert response.status_code == 404
+
+# A re-sent part with new content replaces the old bytes and digest together
+def test_resent_part_replaces_data_and_digest(client, admin_headers):
+    upload_id = start_session(client, admin_headers)
+    client.put(f"/uploads/{upload_id}/parts/1/", content=b"old bytes", headers=admin_headers)
+    client.put(f"/uploads/{upload_id}/parts/1/", content=b"new bytes!", headers=admin_headers)
+
+    parts = client.get(f"/uploads/{upload_id}/", headers=admin_headers).json()["data"]["parts"]
+    assert parts == [{"part_number": 1, "size": 10, "sha256": hashlib.sha256(b"new bytes!").hexdigest()}]
+    assert len([name for name in os.listdir(session_dir(upload_id)) if name.endswith(".data")]) == 1
+    client.delete(f"/uploads/{upload_id}/", headers=admin_headers)
+
+# The parts received so far count against UPLOAD_MAX_SIZE while a part arrives
+def test_parts_over_the_upload_limit(client, admin_headers, monkeypatch):
+    monkeypatch.setattr("api.upload_sessions.UPLOAD_MAX_SIZE", 20)
+    upload_id = start_session(client, admin_headers)
+    assert client.put(f"/uploads/{upload_id}/parts/1/", content=b"x" * 15, headers=admin_headers).status_code == 200
+    assert client.put(f"/uploads/{upload_id}/parts/2/", content=b"x" * 10, headers=admin_headers).status_code == 413
+    # Re-sending a part does not count its earlier copy
+    assert client.put(f"/uploads/{upload_id}/parts/1/", content=b"x" * 20, headers=admin_headers).status_code == 200
+    parts = client.get(f"/uploads/{upload_id}/", headers=admin_headers).json()["data"]["parts"]
+    assert [part["size"] for part in parts] == [20]
+    client.delete(f"/uploads/{upload_id}/", headers=admin_headers)
+
+# A failed completion keeps the session for a retry and leaves no temp file behind
+def test_failed_complete_keeps_session(client, admin_headers, monkeypatch):
+    upload_id = start_session(client, admin_headers)
+    client.put(f"/uploads/{upload_id}/parts/1/", content=b"kept part", headers=admin_headers)
+
+    async def fail(*args, **kwargs):
+        raise RuntimeError("database unavailable")
+    monkeypatch.setattr(VideoService, "create_video", fail)
+    temp_files = set(os.listdir(TEMP_DIR))
+    with pytest.raises(RuntimeError):
+        client.post(f"/uploads/{upload_id}/complete/", headers=admin_headers)
+    assert set(os.listdir(TEMP_DIR)) == temp_files
+    monkeypatch.undo()
+
+    assert client.post(f"/uploads/{upload_id}/complete/", headers=admin_headers).status_code == 200
+    assert client.get(f"/uploads/{upload_id}/", headers=admin_headers).status_code == 404
+
+# Sessions nothing was written to for UPLOAD_SESSION_TTL seconds are swept
+def test_abandoned_sessions_are_swept(client, admin_headers):
+    stale, fresh = start_session(client, admin_headers), start_session(client, admin_headers)
+    os.utime(session_dir(stale), (0, 0))
+    assert sweep_sessions(3600) == 1
+    assert client.get(f"/uploads/{stale}/", headers=admin_headers).status_code == 404
+    assert client.get(f"/uploads/{fresh}/", headers=admin_headers).status_code == 200
+    client.delete(f"/uploads/{fresh}/", headers=admin_headers)
+
+# Completing with a missing part is refused and keeps the session
+def test_complete_with_missing_part(client, admin_headers):
+    upload_id = start_session(client, admin_headers)
+    client.put(f"/uploads/{upload_id}/parts/2/", content=b"orphan", headers=admin_headers)
+
+    response = client.post(f"/uploads/{upload_id}/complete/", headers=admin_headers)
+    assert response.status_code == 400
+
+    response = client.delete(f"/uploads/{upload_id}/", headers=admin_headers)
+    assert response.status_code == 200
+
+def test_invalid_upload_id(client, admin_headers):
+    response = client.get("/uploads/../../etc/", headers=admin_headers)
+    assert response.status_code in (404, 422)
+    response = client.get("/uploads/not-a-session/", headers=admin_headers)
+    assert response.status_code == 422
+
+# A part copied in userspace is written out before the next part is copied in the kernel
+@pytest.mark.skipif(not hasattr(os, "copy_file_range"), reason="needs copy_file_range")
+def test_copy_fallback_keeps_part_order(tmp_path, monkeypatch):
+    parts = [tmp_path / "a.part", tmp_path / "b.part"]
+    parts[0].write_bytes(b"A" * 4096)
+    parts[1].write_bytes(b"B" * 4096)
+    kernel_copy = os.copy_file_range
+    calls = []
+
+    def copy_file_range(*args):
+        calls.append(args)
+        if len(calls) == 1:
+            raise OSError("cross-device")
+        return kernel_copy(*args)
+    monkeypatch.setattr(os, "copy_file_range", copy_file_range)
+
+    with open(tmp_path / "out", "wb") as dst:
+        for part in parts:
+            with open(part, "rb") as src:
+                copy_into(dst, src, 4096)
+    assert (tmp_path / "out").read_bytes() == b"A" * 4096 + b"B" * 4096
@@ -1,7 +1,10 @@
+import os
+import hashlib
 import pytest
 from fastapi.testclient import TestClient
 from api.main import app  # Assuming the app is imported from api.main
-from api.models import SessionLocal
+from api.models import SessionLocal, AsyncSessionLocal
+from api.storage import TEMP_DIR
 from api.dependencies import get_db
 from sqlalchemy.orm import Session
 from fastapi import UploadFile
@@ -18,12 +21,9 @@ def test_db():
     db.close()
 
 # Dependency override for testing purposes
-def override_get_db():
-    db = SessionLocal()  # Replace with test database session
-    try:
+async def override_get_db():
+    async with AsyncSessionLocal() as db:  # Replace with test database session
         yield db
-    finally:
-        db.close()
 
 app.dependency_overrides[get_db] = override_get_db
 
@@ -61,6 +61,37 @@ def test_upload_video():
     assert "is_blocked" in json_response["data"]
     assert "path" in json_response["data"]
     assert "id" in json_response["data"]
+    assert json_response["data"]["size"] == len(b"Test video content")
+    assert json_response["data"]["content_hash"] == hashlib.sha256(b"Test video content").hexdigest()
+
+# Test upload rejected when it exceeds the configured maximum size
+def test_upload_video_too_large(monkeypatch):
+    monkeypatch.setattr("api.services.UPLOAD_MAX_SIZE", 8)
+    response = client.post("/signin/", json={"username": "admin", "password": "admin"})
+    token = response.json()["access_token"]
+    headers = {"Authorization": f"Bearer {token}"}
+
+    temp_files = set(os.listdir(TEMP_DIR)) if os.path.isdir(TEMP_DIR) else set()
+    files = {"file": ("too_large.wmv", BytesIO(b"Test video content"), "video/mp4")}
+    response = client.post("/upload/", files=files, headers=headers)
+
+    assert response.status_code == 413
+    assert set(os.listdir(TEMP_DIR)) == temp_files
+
+# A declared length over the limit is refused before the body is read, and before authentication
+def test_upload_refused_on_content_length(monkeypatch):
+    monkeypatch.setattr("api.main.UPLOAD_MAX_SIZE", 8)
+    received = []
+
+    def body():
+        for _ in range(4):
+            received.append(True)
+            yield b"x" * 64 * 1024
+    headers = {"Content-Type": "multipart/form-data; boundary=x", "Content-Length": str(256 * 1024)}
+    response = client.post("/upload/", content=body(), headers=headers)
+    assert response.status_code == 413
+    assert "maximum size" in response.json()["detail"]
+    assert len(received) <= 1
 
 # Test search video
 def test_search_video():
@@ -104,3 +135,10 @@ def test_download_video():
     else:
         assert response.status_code == 200
         assert response.headers["content-type"] == "application/octet-stream"
+
+# Block responses carry the video's columns, and null for unknown ids
+def test_block_response_shape():
+    body = client.post("/unblock/1/").json()
+    assert body["data"]["id"] == 1 and body["data"]["is_blocked"] == 0
+    assert {"name", "size", "path", "content_hash", "duration"} <= set(body["data"])
+    assert client.post("/block/999999999/").json() == {"status": True, "data": None}
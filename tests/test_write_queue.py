@@ -0,0 +1,69 @@
+import threading
+import pytest
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import sessionmaker
+from api.write_queue import WriteBatcher
+
+@pytest.fixture()
+def session_factory(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path}/writes.db")
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE counters (id INTEGER PRIMARY KEY, value INTEGER)"))
+    return sessionmaker(bind=engine)
+
+def insert(value):
+    def job(db):
+        db.execute(text("INSERT INTO counters (value) VALUES (:value)"), {"value": value})
+        return value
+    return job
+
+def failing_job(db):
+    raise ValueError("bad write")
+
+# Concurrent writes are committed together in fewer transactions
+def test_writes_are_batched(session_factory):
+    batcher = WriteBatcher(session_factory, max_batch=50, max_wait=0.05, enabled=True)
+    gate = threading.Event()
+    futures = []
+
+    def submit(value):
+        gate.wait()
+        futures.append(batcher.submit(insert(value)))
+
+    threads = [threading.Thread(target=submit, args=(value,)) for value in range(40)]
+    for thread in threads:
+        thread.start()
+    gate.set()
+    for thread in threads:
+        thread.join()
+
+    assert sorted(future.result(timeout=5) for future in futures) == list(range(40))
+    assert batcher.writes == 40
+    assert batcher.batches < 40
+    with session_factory() as db:
+        assert db.execute(text("SELECT COUNT(*) FROM counters")).scalar() == 40
+
+# A failing job is reported to its caller only; the rest of its batch still commits
+def test_failed_job_is_isolated(session_factory):
+    batcher = WriteBatcher(session_factory, max_batch=10, max_wait=0.2, enabled=True)
+    ok = batcher.submit(insert(1))
+    bad = batcher.submit(failing_job)
+    also_ok = batcher.submit(insert(2))
+
+    assert ok.result(timeout=5) == 1
+    assert also_ok.result(timeout=5) == 2
+    with pytest.raises(ValueError):
+        bad.result(timeout=5)
+    with session_factory() as db:
+        assert db.execute(text("SELECT COUNT(*) FROM counters")).scalar() == 2
+
+# Block/unblock go through the writer thread when batching is switched on
+def test_block_with_batching(client, monkeypatch):
+    monkeypatch.setattr("api.services.write_batcher.enabled", True)
+    response = client.post("/block/1/")
+    assert response.status_code == 200
+    assert response.json()["data"]["is_blocked"] == 1
+
+    response = client.post("/unblock/1/")
+    assert response.json()["data"]["is_blocked"] == 0
+    client.post("/block/1/")
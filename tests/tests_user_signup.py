@@ -7,7 +7,7 @@ from api.models import User
 from api.dependencies import get_db
 from api.schemas import UserCreate
 from sqlalchemy.orm import Session
-from api.models import SessionLocal  # Adjust this import based on your project structure
+from api.models import SessionLocal, AsyncSessionLocal  # Adjust this import based on your project structure
 from api.services import generate_unique_string
 # Create a test client
 client = TestClient(app)
@@ -20,12 +20,9 @@ def test_db():
     db.close()  # Close the session after the test
 
 # Override the default get_db dependency to use the test database
-def override_get_db():
-    db = SessionLocal()  # Create a new session for the test
-    try:
+async def override_get_db():
+    async with AsyncSessionLocal() as db:  # Create a new session for the test
         yield db
-    finally:
-        db.close()  # Close the session after the test
 
 # Set the dependency override
 app.dependency_overrides[get_db] = override_get_db